@@ -0,0 +1,124 @@
+import dataclasses
+import re
+from typing import Iterator
+from sandbox.data import CommandResult, ResourceUsage, StreamEvent, StreamType
+
+# 资源用量尾部的起始标记，由包装脚本在命令结束后写到 stderr 末尾，宿主机侧剥离；
+# 标记后紧跟每次运行随机生成的 nonce（ExecutionRequest.usage_nonce），程序输出无法伪造
+USAGE_MARKER = "\x1esandbox-usage:"
+# 尾部（标记、用量与 times 的输出）的最大长度，超出的不是尾部，作为普通 stderr 产出
+_MAX_TRAILER = 4096
+
+# 只使用 shell 内建命令与 /proc、cgroup 文件，不依赖镜像中的 python 或 GNU time；
+# 命令作为子进程运行（不 exec），结束后 times 的第二行即为其 CPU 用量
+_ACCOUNTING_SCRIPT = r"""
+nonce=$1; shift
+read u0 _ < /proc/uptime
+read _ _ _ _ p0 < /proc/loadavg
+"$@"
+rc=$?
+read u1 _ < /proc/uptime
+read _ _ _ _ p1 < /proc/loadavg
+w=-
+if [ -r /proc/$$/io ]; then
+  while read k v; do [ "$k" = wchar: ] && w=$v; done < /proc/$$/io
+fi
+r=-
+for f in /sys/fs/cgroup/memory.peak /sys/fs/cgroup/memory/memory.max_usage_in_bytes; do
+  if [ -r $f ]; then read r < $f; break; fi
+done
+printf '\036sandbox-usage:%s %s %s %s %s %s %s\n' "$nonce" "$u0" "$u1" "$p0" "$p1" "$w" "$r" >&2
+times >&2
+exit $rc
+"""
+
+_TIMES = re.compile(r"(\d+)m\s*([\d.]+)s")
+
+
+def usage_marker(nonce: str) -> str:
+    """带 nonce 的尾部标记"""
+    return f"{USAGE_MARKER}{nonce}"
+
+
+def account_command(command: str | list[str], nonce: str) -> list[str]:
+    """包装运行命令，结束后在 stderr 末尾输出本次运行的资源用量，标记中带 nonce"""
+    if isinstance(command, str):
+        command = ["/bin/sh", "-c", command]
+    return ["sh", "-c", _ACCOUNTING_SCRIPT, "sh", nonce, *command]
+
+
+def parse_usage(text: str) -> ResourceUsage | None:
+    """解析标记之后的尾部文本，格式不符时返回 None"""
+    fields = text.split()
+    times = _TIMES.findall(text)
+    if len(fields) < 6 or len(times) < 2:
+        return None
+    try:
+        wall_time = float(fields[1]) - float(fields[0])
+        first_pid, last_pid = int(fields[2]), int(fields[3])
+    except ValueError:
+        return None
+    # times 第二行为子进程的 user / system 时间
+    (user_m, user_s), (sys_m, sys_s) = times[-2:]
+    return ResourceUsage(
+        wall_time=round(max(wall_time, 0.0), 2),
+        cpu_user=int(user_m) * 60 + float(user_s),
+        cpu_system=int(sys_m) * 60 + float(sys_s),
+        peak_rss=_optional_int(fields[5]),
+        bytes_written=_optional_int(fields[4]),
+        # pid 回绕时无法计算
+        processes=last_pid - first_pid if last_pid >= first_pid else None,
+    )
+
+
+def _optional_int(value: str) -> int | None:
+    return int(value) if value.isdigit() else None
+
+
+def strip_usage(result: CommandResult, nonce: str) -> CommandResult:
+    """从已收集的结果中剥离 stderr 末尾的资源用量尾部，写入 usage；只解析最后一个标记"""
+    marker = usage_marker(nonce)
+    index = result.stderr.rfind(marker)
+    if index < 0:
+        return result
+    usage = parse_usage(result.stderr[index + len(marker):])
+    if usage is None:
+        return result
+    return dataclasses.replace(result, stderr=result.stderr[:index], usage=usage)
+
+
+def attach_usage(events: Iterator[StreamEvent], nonce: str) -> Iterator[StreamEvent]:
+    """
+    从事件流中剥离资源用量尾部，并附加到 EXIT 事件上
+
+    尾部是 stderr 的最后一段输出：从最后一个标记开始的 stderr 暂存到 EXIT 时才解析，
+    之后又出现标记则释放前面暂存的内容；暂存超过 _MAX_TRAILER 或解析失败时作为普通 stderr 产出。
+    可能是标记开头的 stderr 末尾同样暂存到下一个事件再判断。
+    """
+    marker = usage_marker(nonce)
+    pending = ""
+    for event in events:
+        if event.stream == StreamType.STDERR:
+            data = pending + event.data
+            index = data.rfind(marker)
+            if index < 0 or len(data) - index > _MAX_TRAILER:
+                index = len(data) - _partial_marker(data, marker)
+            data, pending = data[:index], data[index:]
+            if data:
+                yield StreamEvent(stream=StreamType.STDERR, data=data)
+        elif event.stream == StreamType.EXIT:
+            usage = parse_usage(pending[len(marker):]) if pending.startswith(marker) else None
+            if usage is None and pending:
+                yield StreamEvent(stream=StreamType.STDERR, data=pending)
+            pending = ""
+            yield dataclasses.replace(event, usage=usage)
+        else:
+            yield event
+
+
+def _partial_marker(data: str, marker: str) -> int:
+    """data 末尾与标记开头重合的长度"""
+    for size in range(min(len(data), len(marker) - 1), 0, -1):
+        if data.endswith(marker[:size]):
+            return size
+    return 0
@@ -0,0 +1,157 @@
+import base64
+import itertools
+import threading
+from dataclasses import dataclass, field
+from typing import Any
+from sandbox.data import CommandResult, OutputCapture
+from sandbox.errors import BackendError
+from sandbox.runtime import FrameChannel, script_command
+from sandbox.transfer import resolve_path
+from sandbox.util import logger
+
+
+@dataclass(frozen=True)
+class AgentResult:
+    r"""Represents the reply of one exec agent request.
+
+    Attributes:
+        result (CommandResult): The result of the run command.
+        install (CommandResult | None): The result of the install command, None if nothing was installed.
+        files (list[tuple[bytes, dict]]): (tar archive, stat) of each collected file, in the same
+            format as docker ``get_archive``; files that could not be read are skipped.
+        too_large (bool): Whether the collected files exceed ``max_bytes``; no file is returned in that case.
+    """
+
+    result: CommandResult
+    install: CommandResult | None = None
+    files: list[tuple[bytes, dict]] = field(default_factory=list)
+    too_large: bool = False
+
+
+class ExecAgent:
+    """
+    容器内的执行代理
+
+    每个容器只附着一次常驻的代理进程，之后一个请求即可完成写文件、安装依赖、运行代码、
+    收集生成文件，省去每一步单独的 exec create/start/inspect（K8s 上为单独的 websocket）。
+    同一个代理上的请求串行处理。
+
+    :param backend: DockerBackend / K8sBackend（需实现 open_channel）
+    :param container: 运行代理的容器
+    """
+
+    def __init__(self, backend: Any, container: Any):
+        self.backend = backend
+        self.container = container
+        self.pid: int | None = None
+        self._channel: FrameChannel | None = None
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    @property
+    def alive(self) -> bool:
+        return self._channel is not None
+
+    def start(self, timeout: float = 30.0) -> "ExecAgent":
+        """启动代理进程，等待其就绪"""
+        with self._lock:
+            if self._channel is not None:
+                return self
+            channel = FrameChannel(self.backend.open_channel(self.container, script_command("agent")))
+            try:
+                ready = channel.recv(timeout)
+            except Exception:
+                channel.close()
+                raise
+            self.pid = ready.get("pid")
+            self._channel = channel
+            logger.info(f"Exec agent started (pid={self.pid})")
+        return self
+
+    def run(
+            self,
+            command: list[str],
+            files: dict[str, bytes | str] | None = None,
+            install: list[str] | None = None,
+            collect: list[str] | None = None,
+            workdir: str | None = None,
+            capture: OutputCapture | None = None,
+            max_bytes: int | None = None) -> AgentResult:
+        """
+        在一次往返中完成：写入 files -> 执行 install -> 执行 command -> 收集 collect 中的文件
+
+        :param command: 运行命令
+        :param files: {容器内路径: 内容}，相对路径放到 /sandbox 下
+        :param install: 依赖安装命令，失败时仍会继续运行 command（与逐条 exec 的行为一致）
+        :param collect: 运行结束后需要取回的文件路径
+        :param capture: 每个输出流保留的开头与结尾字节数，在容器内截断，回复大小与输出总量无关
+        :param max_bytes: 收集文件的总大小上限，代理在读取前 stat 检查，超出时不返回任何文件（too_large 为 True）
+        """
+        capture = capture or OutputCapture()
+        message = {
+            "op": "run",
+            "command": command,
+            "install": install,
+            "workdir": workdir,
+            "files": {resolve_path(path): base64.b64encode(_to_bytes(content)).decode("ascii")
+                      for path, content in (files or {}).items()},
+            "collect": [resolve_path(path) for path in collect or []],
+            "capture": [capture.head_bytes, capture.tail_bytes],
+            "max_bytes": max_bytes,
+        }
+        reply = self._request(message)
+        install_reply = reply.get("install")
+        collected = []
+        for item in reply.get("files", []):
+            if "error" in item:
+                logger.error(f"从容器收集文件失败: {item['path']}, 错误: {item['error']}")
+                continue
+            collected.append((base64.b64decode(item["archive"]), item["stat"]))
+        return AgentResult(
+            result=_to_result(reply),
+            install=_to_result(install_reply) if install_reply else None,
+            files=collected,
+            too_large=reply.get("too_large", False),
+        )
+
+    def shutdown(self) -> None:
+        """关闭代理进程"""
+        with self._lock:
+            if self._channel is None:
+                return
+            try:
+                self._channel.send({"op": "shutdown"})
+            except Exception as e:
+                logger.warning(f"Failed to shutdown exec agent: {e}")
+            self._channel.close()
+            self._channel = None
+            self.pid = None
+
+    def _request(self, message: dict) -> dict:
+        self.start()
+        with self._lock:
+            message["id"] = next(self._ids)
+            try:
+                reply = self._channel.request(message)
+            except BackendError:
+                # 代理进程已退出，下次请求时重新启动
+                self._channel.close()
+                self._channel = None
+                raise
+        if "error" in reply:
+            raise BackendError(f"exec agent error: {reply['error']}")
+        return reply
+
+
+def _to_bytes(content: bytes | str) -> bytes:
+    return content.encode("utf-8") if isinstance(content, str) else content
+
+
+def _to_result(reply: dict) -> CommandResult:
+    return CommandResult(
+        exit_code=reply.get("exit_code", 0),
+        stdout=reply.get("stdout", ""),
+        stderr=reply.get("stderr", ""),
+        stdout_dropped=reply.get("stdout_dropped", 0),
+        stderr_dropped=reply.get("stderr_dropped", 0),
+    )
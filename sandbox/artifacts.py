@@ -0,0 +1,256 @@
+import hashlib
+import os
+import posixpath
+import re
+import shutil
+import tarfile
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import BinaryIO
+from sandbox.data import Artifact
+from sandbox.util import logger
+
+# 从 tar 成员写入磁盘时每次读取的块大小
+COPY_CHUNK_SIZE = 1024 * 1024
+_DIGEST = re.compile(r"[0-9a-f]{64}")
+# 内容文件写入后的保护期（秒）：其他进程可能刚写入内容、尚未链接到会话目录，此时硬链接数仍为 1
+COLLECT_GRACE = 60.0
+
+# 同一根目录的仓库实例共享一把锁，链接内容文件与回收内容文件互斥
+_root_locks: dict[Path, threading.Lock] = {}
+_root_locks_lock = threading.Lock()
+_default_stores: dict[Path, "ArtifactStore"] = {}
+_default_lock = threading.Lock()
+
+
+def _root_lock(root: Path) -> threading.Lock:
+    with _root_locks_lock:
+        return _root_locks.setdefault(root.resolve(), threading.Lock())
+
+
+def default_artifact_store(root: str | os.PathLike = "./output") -> "ArtifactStore":
+    """进程内按根目录共享的仓库，淘汰的计数与间隔在所有会话之间共用"""
+    key = Path(root).resolve()
+    with _default_lock:
+        store = _default_stores.get(key)
+        if store is None:
+            store = _default_stores[key] = ArtifactStore(root)
+        return store
+
+
+class ArtifactStore:
+    """
+    按内容寻址的本地文件仓库
+
+    生成的文件从容器 tar 流中逐块写入磁盘，同时计算 sha256，内容保存在 objects/<digest[:2]>/<digest>，
+    相同内容只保存一份；每个会话在 sessions/<namespace>/ 下以容器内的相对路径硬链接到内容文件。
+    内容文件是只读的（0444），返回的文件被多个会话共享，需要修改时先复制；无法硬链接时复制到会话目录，
+    摘要记录在 copies/<namespace> 中，内容文件在会话删除前不会被回收。
+    超过 max_age 的会话目录被删除，总大小超过 max_bytes 时从最旧的会话开始删除，不再被引用的内容随之删除；
+    淘汰需要扫描整个仓库，只在新写入的内容使总大小超过 max_bytes、或距上次淘汰超过 evict_interval 时进行。
+
+    :param root: 仓库根目录
+    :param max_bytes: 内容文件总大小上限（字节）
+    :param max_age: 会话目录的最长保留时间（秒）
+    :param evict_interval: 两次按时间淘汰之间的最短间隔（秒）
+    """
+
+    def __init__(self, root: str | os.PathLike = "./output", max_bytes: int = 1024 ** 3,
+                 max_age: float = 7 * 24 * 3600.0, evict_interval: float = 600.0):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.evict_interval = evict_interval
+        self._lock = _root_lock(self.root)
+        # 上次淘汰后内容文件的总大小加上之后新写入的内容，仓库首次写入时扫描一次
+        self._total_bytes = 0
+        self._evicted_bytes = 0
+        self._last_evict = 0.0
+
+    @property
+    def objects_dir(self) -> Path:
+        return self.root / "objects"
+
+    @property
+    def sessions_dir(self) -> Path:
+        return self.root / "sessions"
+
+    @property
+    def copies_dir(self) -> Path:
+        return self.root / "copies"
+
+    def session_dir(self, namespace: str) -> Path:
+        return self.sessions_dir / namespace
+
+    def object_path(self, digest: str) -> Path:
+        """内容文件的路径，digest 必须是 sha256 的十六进制摘要"""
+        if not _DIGEST.fullmatch(digest):
+            raise ValueError(f"invalid artifact digest: {digest!r}")
+        return self.objects_dir / digest[:2] / digest
+
+    def open(self, digest: str) -> BinaryIO:
+        """
+        按摘要打开内容文件，供只拿到句柄（名称、大小、摘要）的调用方按需读取
+
+        :raises FileNotFoundError: 内容不存在或已被淘汰
+        """
+        return open(self.object_path(digest), "rb")
+
+    def save(self, namespace: str, archive: BinaryIO) -> list[Artifact]:
+        """
+        以流模式读取 tar，把其中的普通文件保存到会话目录下
+
+        :param namespace: 会话命名空间
+        :param archive: 只读 tar 流，成员路径相对于容器根目录
+        :return: 保存的文件句柄，按 tar 中的顺序
+        """
+        artifacts = []
+        try:
+            with tarfile.open(fileobj=archive, mode="r|") as tar:
+                for member in tar:
+                    if not member.isfile():
+                        continue
+                    artifacts.append(self._put(namespace, _artifact_name(member.name), tar.extractfile(member)))
+        except tarfile.ReadError as e:
+            # 没有匹配到任何文件时 tar 为空
+            if artifacts:
+                raise
+            logger.info(f"No generated files to save: {e}")
+        if artifacts:
+            self._maybe_evict(keep=namespace)
+        return artifacts
+
+    def put(self, namespace: str, name: str, src: BinaryIO) -> Artifact:
+        """保存单个文件"""
+        artifact = self._put(namespace, _artifact_name(name), src)
+        self._maybe_evict(keep=namespace)
+        return artifact
+
+    def _put(self, namespace: str, name: str, src: BinaryIO) -> Artifact:
+        tmp_dir = self.root / "tmp"
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+        tmp = tmp_dir / uuid.uuid4().hex
+        digest, size = hashlib.sha256(), 0
+        try:
+            with open(tmp, "wb") as f:
+                while chunk := src.read(COPY_CHUNK_SIZE):
+                    digest.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+            hexdigest = digest.hexdigest()
+            obj = self.object_path(hexdigest)
+            with self._lock:
+                if obj.exists():
+                    # 相同内容已保存，刷新访问时间
+                    os.utime(obj)
+                else:
+                    # 会话文件与内容文件是同一个 inode，只读以免调用方原地修改影响其他会话
+                    os.chmod(tmp, 0o444)
+                    obj.parent.mkdir(parents=True, exist_ok=True)
+                    os.replace(tmp, obj)
+                    self._total_bytes += size
+                dest = self.session_dir(namespace) / name
+                dest.parent.mkdir(parents=True, exist_ok=True)
+                dest.unlink(missing_ok=True)
+                try:
+                    os.link(obj, dest)
+                except OSError:
+                    shutil.copyfile(obj, dest)
+                    os.chmod(dest, 0o444)
+                    self.copies_dir.mkdir(parents=True, exist_ok=True)
+                    with open(self.copies_dir / namespace, "a") as f:
+                        f.write(hexdigest + "\n")
+        finally:
+            tmp.unlink(missing_ok=True)
+        logger.info(f"文件已保存: {dest} (大小: {size} bytes)")
+        return Artifact(name=name, path=str(dest), size=size, digest=hexdigest)
+
+    def _maybe_evict(self, keep: str, now: float | None = None) -> int:
+        """
+        写入后调用：新写入的内容使总大小超出预算，或到了淘汰间隔时才扫描仓库
+
+        刚写入的会话单独超出预算时淘汰后仍超出，之后只有再写入新内容才会再次扫描。
+        """
+        now = time.time() if now is None else now
+        over_budget = self._total_bytes > max(self.max_bytes, self._evicted_bytes)
+        if not over_budget and now - self._last_evict < self.evict_interval:
+            return 0
+        return self.evict(keep=keep, now=now)
+
+    def evict(self, keep: str | None = None, now: float | None = None) -> int:
+        """
+        删除过期与超出预算的会话目录及不再被引用的内容，返回删除的会话数
+
+        :param keep: 不删除的会话（刚写入的会话）
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            sessions = []
+            for path in self.sessions_dir.glob("*") if self.sessions_dir.is_dir() else []:
+                if path.name == keep:
+                    continue
+                try:
+                    sessions.append((path.stat().st_mtime, path))
+                except OSError:
+                    continue
+            sessions.sort()
+            removed = 0
+            while sessions and now - sessions[0][0] > self.max_age:
+                self._remove_session(sessions.pop(0)[1])
+                removed += 1
+            total = self._collect_objects()
+            while sessions and total > self.max_bytes:
+                self._remove_session(sessions.pop(0)[1])
+                removed += 1
+                total = self._collect_objects()
+            self._total_bytes = self._evicted_bytes = total
+            self._last_evict = now
+            if removed:
+                logger.info(f"Evicted {removed} artifact sessions, {total} bytes left")
+            return removed
+
+    def _remove_session(self, path: Path) -> None:
+        shutil.rmtree(path, ignore_errors=True)
+        (self.copies_dir / path.name).unlink(missing_ok=True)
+
+    def _copied_digests(self) -> set[str]:
+        """以复制方式被会话引用的内容摘要"""
+        digests: set[str] = set()
+        for path in self.copies_dir.glob("*") if self.copies_dir.is_dir() else []:
+            try:
+                digests.update(path.read_text().split())
+            except OSError:
+                continue
+        return digests
+
+    def _collect_objects(self) -> int:
+        """
+        删除没有会话引用的内容文件（硬链接数为 1），返回剩余内容的总大小
+
+        保护期内刚写入的内容文件与以复制方式被引用的内容文件不删除。
+        """
+        total = 0
+        copied = self._copied_digests()
+        now = time.time()
+        for obj in self.objects_dir.glob("*/*") if self.objects_dir.is_dir() else []:
+            try:
+                st = obj.stat()
+            except OSError:
+                continue
+            if st.st_nlink <= 1 and obj.name not in copied and now - st.st_mtime >= COLLECT_GRACE:
+                obj.unlink(missing_ok=True)
+            else:
+                total += st.st_size
+        return total
+
+def _artifact_name(member: str) -> str:
+    """tar 成员路径 -> 会话目录下的相对路径：去掉 sandbox/ 前缀，拒绝绝对路径与 .."""
+    name = posixpath.normpath(member.lstrip("/"))
+    if name.startswith("sandbox/"):
+        name = name[len("sandbox/"):]
+    if name in (".", "..") or name.startswith("../"):
+        name = posixpath.basename(member.rstrip("/"))
+        name = name if name not in ("", ".", "..") else "artifact"
+    return name
@@ -0,0 +1,135 @@
+import asyncio
+import threading
+import uuid
+from typing import Any, AsyncIterator
+from sandbox.const import BackendType, SupportedLanguage
+from sandbox.data import Artifact, CommandResult, StreamEvent
+from sandbox.session import SandboxSession
+from sandbox.util import logger
+
+
+class AsyncSandboxSession:
+    """
+    asyncio 版本的沙箱会话
+
+    async with AsyncSandboxSession(...) as session:
+        result = await session.run_code("print(1)")
+
+    docker / kubernetes 客户端本身是阻塞的，执行委托给 SandboxSession 并通过 asyncio.to_thread 移出事件循环，
+    结果缓存、图表、生成文件、有状态 kernel 与 fork server 等模式与同步会话一致。
+    每次执行都带有 run_id，任务被取消时通过 SandboxSession.kill_run 结束对应的运行（执行代理模式下同样有效），
+    而不是让它在后台继续运行。其他参数与 SandboxSession 相同。
+    """
+
+    def __init__(
+            self,
+            backend_type: BackendType = BackendType.DOCKER,
+            language: SupportedLanguage = SupportedLanguage.PYTHON,
+            **kwargs: Any):
+        self.language = language
+        self._session = SandboxSession(backend_type=backend_type, language=language, **kwargs)
+
+    @property
+    def backend(self):
+        return self._session.backend
+
+    @property
+    def container(self):
+        return self._session.container
+
+    async def __aenter__(self):
+        await asyncio.to_thread(self._session.__enter__)
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        # 即使外层任务已被取消，也要把资源释放完
+        await asyncio.shield(asyncio.to_thread(self._session.__exit__, exc_type, exc_val, exc_tb))
+
+    async def run_code(
+            self,
+            code: str,
+            dependencies: list[str] | None = None,
+            files: dict[str, bytes | str] | None = None,
+            **kwargs: Any) -> CommandResult | list[Artifact] | None:
+        """执行代码，任务取消时结束对应的运行；其余参数（file_path、plots、timeout 等）与返回值同 SandboxSession.run_code"""
+        run_id = uuid.uuid4().hex
+        return await self._cancellable(run_id, self._session.kill_run, self._session.run_code, code,
+                                       dependencies=dependencies, files=files, run_id=run_id, **kwargs)
+
+    async def exe_command(self, command: str, **kwargs: Any) -> CommandResult:
+        """执行命令，任务取消时结束容器内进程"""
+        run_id = uuid.uuid4().hex
+        return await self._cancellable(
+            run_id, self._kill_process, self.backend.execute_command, self.container, command, run_id=run_id, **kwargs
+        )
+
+    async def upload_files(self, files: dict[str, bytes | str]) -> None:
+        """以单个 tar 上传文件"""
+        await asyncio.to_thread(self.backend.upload_files, self.container, files)
+
+    async def run_code_stream(
+            self,
+            code: str,
+            dependencies: list[str] | None = None,
+            files: dict[str, bytes | str] | None = None,
+            **limits: Any) -> AsyncIterator[StreamEvent]:
+        """
+        执行代码并以异步迭代器的形式返回输出
+
+        后台线程消费阻塞的输出流并投递到 asyncio.Queue，迭代提前结束或任务被取消时结束容器内进程。
+        """
+        run_id = uuid.uuid4().hex
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        stop = threading.Event()
+        done = object()
+
+        def pump():
+            try:
+                for event in self._session.run_code_stream(code, dependencies, files, run_id=run_id, **limits):
+                    loop.call_soon_threadsafe(queue.put_nowait, event)
+                    if stop.is_set():
+                        break
+            except BaseException as e:
+                loop.call_soon_threadsafe(queue.put_nowait, e)
+            finally:
+                loop.call_soon_threadsafe(queue.put_nowait, done)
+
+        worker = loop.run_in_executor(None, pump)
+        finished = False
+        try:
+            while True:
+                item = await queue.get()
+                if item is done:
+                    finished = True
+                    break
+                if isinstance(item, BaseException):
+                    finished = True
+                    raise item
+                yield item
+        finally:
+            if not finished:
+                stop.set()
+                await asyncio.shield(self._kill(run_id, self._kill_process))
+            await asyncio.shield(worker)
+
+    async def _cancellable(self, run_id: str, kill, func, /, *args, **kwargs):
+        task = asyncio.ensure_future(asyncio.to_thread(func, *args, **kwargs))
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            await asyncio.shield(self._kill(run_id, kill))
+            # 进程被结束后阻塞的 exec 很快返回，等待线程收尾
+            await asyncio.gather(task, return_exceptions=True)
+            raise
+
+    def _kill_process(self, run_id: str) -> None:
+        """命令与流式执行总是在容器内以 run_id 启动进程，不经过 kernel / fork server"""
+        self.backend.kill_run(self.container, run_id)
+
+    async def _kill(self, run_id: str, kill) -> None:
+        try:
+            await asyncio.to_thread(kill, run_id)
+            logger.info(f"Killed cancelled run {run_id}")
+        except Exception as e:
+            logger.error(f"Failed to kill cancelled run {run_id}: {e}")
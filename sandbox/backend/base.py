@@ -1,5 +1,214 @@
-from typing import Any
-from sandbox.data import ExecutionRequest
+import dataclasses
+import posixpath
+import queue
+import threading
+import time
+import uuid
+from typing import Any, Iterator
+from sandbox.accounting import account_command, attach_usage, strip_usage
+from sandbox.compile import BUILD_ROOT
+from sandbox.data import ExecutionRequest, CommandResult, RunStatus, StreamEvent, StreamType
+from sandbox.util import logger
+
+# 记录运行中进程 pid 的文件，用于取消时在容器内结束进程
+RUN_PID_FILE = "/tmp/.sandbox_run_{run_id}.pid"
+# 取消标记：进程尚未启动（如仍在安装依赖）时收到的取消，在启动时生效
+RUN_CANCEL_FILE = "/tmp/.sandbox_run_{run_id}.cancel"
+RUN_FILES_GLOB = "/tmp/.sandbox_run_*"
+# RunLimiter 后台读取线程结束的标记
+_EVENTS_DONE = object()
+
+
+def scrub_command(keep_build: bool = False) -> str:
+    """
+    清空 /sandbox 工作目录的命令；keep_build 时保留编译目录，容器内已编译的产物可继续复用
+
+    同时删除 /tmp 下残留的 pid 文件与取消标记（运行结束后才到达的取消会留下标记），避免在复用的容器中堆积。
+    """
+    clean_runs = f"rm -f {RUN_FILES_GLOB}"
+    if keep_build:
+        return (f"find /sandbox -mindepth 1 -maxdepth 1 ! -name {posixpath.basename(BUILD_ROOT)} -exec rm -rf {{}} + "
+                f"&& mkdir -p /sandbox/output && {clean_runs}")
+    return f"rm -rf /sandbox/* /sandbox/.[!.]* /sandbox/..?* && mkdir -p /sandbox/output && {clean_runs}"
+
+
+def wrap_run_command(command: str | list[str], run_id: str) -> list[str]:
+    """
+    包装命令，使其可以被 kill_run_command 结束
+
+    目标进程通过 setsid 运行在新的进程组中（在子 shell 中调用，子 shell 不是进程组组长，setsid 不会 fork，pid 不变），
+    pid 文件记录的即是进程组 id，结束时连同继承了 stdout/stderr 的子进程一起结束。
+    已被取消时直接以 137 退出；外层 shell 不在该进程组中，运行结束（包括被结束）后删除 pid 文件与取消标记。
+    """
+    pid_file = RUN_PID_FILE.format(run_id=run_id)
+    cancel_file = RUN_CANCEL_FILE.format(run_id=run_id)
+    if isinstance(command, str):
+        command = ["/bin/sh", "-c", command]
+    inner = f'echo $$ > {pid_file}; [ -f {cancel_file} ] && exit 137; exec "$@"'
+    outer = f'inner=$1; shift; (exec setsid sh -c "$inner" sh "$@"); rc=$?; rm -f {pid_file} {cancel_file}; exit $rc'
+    return ["sh", "-c", outer, "sh", inner, *command]
+
+
+def kill_run_command(run_id: str) -> list[str]:
+    """
+    结束 wrap_run_command 启动的进程组
+
+    先写取消标记再读 pid 文件，与 wrap_run_command 的顺序相反：进程要么在启动时看到标记，要么已写入 pid 被结束。
+    运行结束后 pid 文件已被删除，迟到的取消不会结束 pid 被复用的其他进程。
+    负数 pid 表示进程组；dash 的 kill 不支持 "--"，因此直接写 -9 -pgid。
+    """
+    pid_file = RUN_PID_FILE.format(run_id=run_id)
+    cancel_file = RUN_CANCEL_FILE.format(run_id=run_id)
+    return ["sh", "-c", f'touch {cancel_file}; [ -f {pid_file} ] && kill -9 -$(cat {pid_file}) 2>/dev/null; '
+                        f'rm -f {pid_file}']
+
+
+def with_run_id(req: ExecutionRequest) -> ExecutionRequest:
+    """设置了超时或输出上限的请求需要 run_id 才能在运行中结束进程，缺失时补一个"""
+    if req.limited and not req.run_id:
+        return dataclasses.replace(req, run_id=uuid.uuid4().hex)
+    return req
+
+
+def wrap_run(command: str | list[str], req: ExecutionRequest, accounting: bool = False) -> list[str]:
+    """
+    包装运行命令：设置了 run_id 时记录 pid 以便结束进程；accounting 时统计资源用量
+
+    用量统计在最外层，运行的进程被 kill_run 结束后仍能输出用量。
+    """
+    if req.run_id:
+        command = wrap_run_command(command, req.run_id)
+    return account_command(command, req.usage_nonce) if accounting else command
+
+
+def collect_run(backend: Any, container: Any, command: list[str], req: ExecutionRequest) -> CommandResult:
+    """执行 wrap_run 包装的命令，施加超时与输出上限，资源用量写入结果的 usage，输出按 req.capture 只保留开头与结尾"""
+    if req.limited:
+        return RunLimiter(backend, container, req).collect(
+            attach_usage(backend.exec_stream(container, command), req.usage_nonce))
+    return strip_usage(CommandResult.from_stream(backend.exec_stream(container, command), req.capture), req.usage_nonce)
+
+
+def stream_run(backend: Any, container: Any, command: list[str], req: ExecutionRequest) -> Iterator[StreamEvent]:
+    """流式执行 wrap_run 包装的命令，资源用量附加在 EXIT 事件上"""
+    events = attach_usage(backend.exec_stream(container, command), req.usage_nonce)
+    return RunLimiter(backend, container, req).stream(events) if req.limited else events
+
+
+class RunLimiter:
+    """
+    在宿主机侧监控一次运行的墙钟超时与输出大小
+
+    超时或输出超过上限时通过 backend.kill_run 结束容器内以 run_id 启动的进程组，
+    之后的输出被丢弃，结果 status 记录结束原因。
+    事件在后台线程中读取：结束进程后 KILL_GRACE 秒内输出流仍未关闭（如逃出进程组的进程继承了输出）时不再等待，
+    直接以 137 结束，超时后也最多再等待 KILL_GRACE 秒。
+
+    :param backend: 实现 kill_run 的后端
+    :param container: 运行所在的容器
+    :param req: 带有 run_id 的执行请求
+    """
+
+    # 结束进程后等待输出流关闭（以及资源用量尾部到达）的秒数
+    KILL_GRACE = 2.0
+
+    def __init__(self, backend: Any, container: Any, req: ExecutionRequest):
+        self.backend = backend
+        self.container = container
+        self.req = req
+        self.status = RunStatus.COMPLETED
+        self._lock = threading.Lock()
+        self._output_bytes = 0
+        self._finished = False
+        self._started = time.monotonic()
+        self._killed_at: float | None = None
+
+    def stream(self, events: Iterator[StreamEvent]) -> Iterator[StreamEvent]:
+        """透传事件并施加限制；被结束时 EXIT 事件的退出码为 137"""
+        timer = None
+        if self.req.timeout is not None:
+            timer = threading.Timer(self.req.timeout, self._kill, (RunStatus.TIMED_OUT,))
+            timer.daemon = True
+            timer.start()
+        pending: queue.Queue = queue.Queue()
+        threading.Thread(target=self._read, args=(events, pending), daemon=True).start()
+        try:
+            while True:
+                try:
+                    event = pending.get(timeout=self._wait_time())
+                except queue.Empty:
+                    self._kill(RunStatus.TIMED_OUT)
+                    logger.warning(f"Run {self.req.run_id} output still open after kill, giving up")
+                    with self._lock:
+                        self._finished = True
+                    yield StreamEvent(stream=StreamType.EXIT, exit_code=137)
+                    return
+                if event is _EVENTS_DONE:
+                    return
+                if isinstance(event, BaseException):
+                    raise event
+                if event.stream == StreamType.EXIT:
+                    with self._lock:
+                        self._finished = True
+                    if self.status != RunStatus.COMPLETED:
+                        event = dataclasses.replace(event, exit_code=event.exit_code or 137)
+                    yield event
+                    return
+                if self.status != RunStatus.COMPLETED:
+                    continue
+                limit = self.req.max_output_bytes
+                if limit is not None:
+                    size = len(event.data.encode("utf-8"))
+                    if self._output_bytes + size > limit:
+                        keep = max(0, limit - self._output_bytes)
+                        data = event.data.encode("utf-8")[:keep].decode("utf-8", errors="ignore")
+                        if data:
+                            yield StreamEvent(stream=event.stream, data=data)
+                        self._output_bytes = limit
+                        self._kill(RunStatus.OUTPUT_LIMIT_EXCEEDED)
+                        continue
+                    self._output_bytes += size
+                yield event
+        finally:
+            if timer is not None:
+                timer.cancel()
+
+    def collect(self, events: Iterator[StreamEvent]) -> CommandResult:
+        result = CommandResult.from_stream(self.stream(events), self.req.capture)
+        return dataclasses.replace(result, status=self.status)
+
+    @staticmethod
+    def _read(events: Iterator[StreamEvent], pending: queue.Queue) -> None:
+        try:
+            for event in events:
+                pending.put(event)
+        except BaseException as e:
+            pending.put(e)
+        finally:
+            pending.put(_EVENTS_DONE)
+
+    def _wait_time(self) -> float | None:
+        """下一个事件最多等待的秒数：未结束进程且没有超时时一直等待"""
+        if self._killed_at is not None:
+            deadline = self._killed_at + self.KILL_GRACE
+        elif self.req.timeout is not None:
+            deadline = self._started + self.req.timeout + self.KILL_GRACE
+        else:
+            return None
+        return max(0.0, deadline - time.monotonic())
+
+    def _kill(self, status: RunStatus) -> None:
+        with self._lock:
+            if self._finished or self.status != RunStatus.COMPLETED:
+                return
+            self.status = status
+            self._killed_at = time.monotonic()
+        logger.warning(f"Run {self.req.run_id} {status}, killing")
+        try:
+            self.backend.kill_run(self.container, self.req.run_id)
+        except Exception as e:
+            logger.error(f"Failed to kill run {self.req.run_id}: {e}")
+
 
 class Backend:
     def create_container(self, lang: str,  **kwargs):
@@ -16,9 +225,46 @@ class Backend:
     def run_code(self,container:Any , req:ExecutionRequest):
         ...
 
+    def run_code_stream(self, container: Any, req: ExecutionRequest) -> Iterator[StreamEvent]:
+        """运行代码并按到达顺序产出 stdout/stderr 事件，最后产出 EXIT 事件"""
+        ...
+
     def remove_container (self,container :Any):
         pass
 
+    def execute_with_limits(self, container: Any, command: list[str], req: ExecutionRequest,
+                            phase: str = "execute") -> CommandResult:
+        """按请求的 run_id、超时与输出上限执行命令，耗时记入 phase 阶段"""
+        ...
+
+    def teardown(self, container: Any) -> None:
+        """尽快结束并删除容器"""
+        self.stop_container(container)
+        self.remove_container(container)
+
+    def kill_run(self, container: Any, run_id: str) -> None:
+        """结束以 run_id 启动的容器内进程"""
+        ...
+
+    def health_check(self, container: Any) -> bool:
+        """检查容器是否仍可用（供容器池复用前调用）"""
+        return True
+
+    def scrub_workspace(self, container: Any, keep_build: bool = False) -> bool:
+        """清理容器工作目录，返回是否可以继续复用；keep_build 时保留编译目录（同一会话内的批量执行使用）"""
+        return False
+
+    def prime_manifest(self, container: Any, language: str) -> None:
+        """
+        在刚创建、尚未运行任何用户代码的容器中列出镜像的已安装包清单（按镜像 digest 缓存）
+
+        清单只能在这时生成：之后用户代码或上一个租户可能已经装过包，列出的结果不再代表镜像本身。
+        """
+
+    def image_digest(self, container: Any) -> str:
+        """容器实际运行的镜像 digest，无法获取时返回空字符串"""
+        return ""
+
 class BackendFactory:
     _backends = {}
     
@@ -1,25 +1,86 @@
+import codecs
+import dataclasses
 import docker
-from typing import Any
-from pathlib import Path
+import io
+from typing import Any, Iterator
+import time
 import uuid
-import base64
-from sandbox.const import DefaultImage,SupportedLanguage
-from sandbox.data import ExecutionRequest,ExeGenFileRequest
+from concurrent.futures import ThreadPoolExecutor
+from sandbox.const import BackendType,DefaultImage,SupportedLanguage
+from sandbox import metrics
+from sandbox.data import ExecutionRequest,ExeGenFileRequest,CommandResult,PlotCapture,StreamEvent,StreamType
+from sandbox.backend.base import scrub_command, wrap_run_command, wrap_run, kill_run_command, with_run_id, collect_run, stream_run
+from sandbox.accounting import strip_usage
+from sandbox.plots import plot_command
+from sandbox.errors import ArtifactTooLargeError, BackendError
+from sandbox.transfer import ArchiveDecoder, ChunkReader, artifact_path, build_tar, collect_command
+from sandbox.runtime import DockerExecChannel
+from sandbox.agent import ExecAgent, AgentResult
+from sandbox.compile import ArtifactCache, Compiler, build_failure_events
 from sandbox.util import logger
+from sandbox.snapshot import SnapshotStore
+from sandbox.manifest import ManifestCache, missing_dependencies
+from sandbox.volumes import cache_volumes_for
+from sandbox.lifecycle import SandboxResource, owner_id, parse_float
+
+# 沙箱容器的标签：所属会话、所有者进程、创建时间与可选的存活时间，供 GarbageCollector 回收泄漏的容器
+SESSION_LABEL = "sandbox.session"
+OWNER_LABEL = "sandbox.owner"
+CREATED_LABEL = "sandbox.created"
+TTL_LABEL = "sandbox.ttl"
+# cpus 换算为 CFS 配额时使用的周期（微秒）
+CPU_PERIOD = 100000
+# (cpus, memory, pids) 均不限制，新建容器的初始状态
+UNLIMITED = (None, None, None)
 
 # 实现Docker容器子类
 
 class DockerBackend:
+    name = BackendType.DOCKER
+
     def __init__(
             self,
             client:docker.DockerClient,
-            stream : bool = False
-            # default_lifecycle: ContainerLifePolicy = ContainerLifePolicy.ON_COMPLETION_REMOVE,
-            # max_execution_time: int = 600  # 最大运行时间（秒），默认10分钟
+            stream : bool = False,
+            snapshot_store: SnapshotStore | None = None,
+            manifest_cache: ManifestCache | None = None,
+            cache_volumes: bool = False,
+            ccache: bool = False,
+            agent: bool = False,
+            artifact_cache: ArtifactCache | None = None,
+            ttl: float | None = None,
+            accounting: bool = True
     ):
         # client = docker.from_env()
         self.client = client
+        # 保留参数以兼容旧调用：execute_command 总是流式读取输出
         self.stream = stream
+        # 依赖快照：安装成功后 commit 为派生镜像，相同依赖集合的会话直接从快照启动
+        self.snapshot_store = snapshot_store
+        # 容器 id -> 在该容器中额外安装的依赖集合（快照中已包含的依赖由清单覆盖）
+        self._installed: dict[str, set[str]] = {}
+        # 容器 id -> 快照的依赖集合：启动时所用快照中的依赖，加上本容器中请求过的全部依赖（含镜像中已有的），
+        # 与 create_container 按请求的依赖列表查找快照时的键一致
+        self._snapshot_deps: dict[str, set[str]] = {}
+        # 镜像已安装包清单，只安装清单中缺失的依赖；清单在容器启动后、运行用户代码前生成
+        self.manifest_cache = manifest_cache or ManifestCache()
+        # 容器 id -> 语言：已创建但尚未启动的容器，启动时为其镜像生成清单
+        self._unstarted: dict[str, str] = {}
+        # 挂载跨容器共享的包管理器/工具链缓存卷
+        self.cache_volumes = cache_volumes
+        self.ccache = ccache
+        # 容器内执行代理：一次往返完成写文件、安装依赖、运行、收集文件
+        self.agent = agent
+        # 容器 id -> 已启动的代理，None 表示该容器无法启动代理（如镜像中没有 python），改走逐条 exec
+        self._agents: dict[str, ExecAgent | None] = {}
+        # C++/Java/Go 先编译再运行，编译产物按 (镜像 digest, 编译参数, 源码哈希) 缓存
+        self.compiler = Compiler(self, cache=artifact_cache)
+        # 容器的存活时间（秒），写入标签，无法判断所有者是否存活时，超时后由 GarbageCollector 删除
+        self.ttl = ttl
+        # 容器 id -> 当前生效的 (cpus, memory, pids) 限制
+        self._limits: dict[str, tuple] = {}
+        # 统计每次运行的墙钟时间、CPU 时间、内存峰值、写入字节数与进程数（CommandResult.usage）
+        self.accounting = accounting
         # 语言到镜像的映射关系
         self.lang_to_image = {
             SupportedLanguage.PYTHON: DefaultImage.PYTHON,
@@ -31,11 +92,12 @@ class DockerBackend:
             SupportedLanguage.R: DefaultImage.R
         }
     # 对于container 的增删改查
-    def create_container(self, lang: str,  **kwargs):
+    def create_container(self, lang: str, dependencies: list[str] | None = None, **kwargs):
         """
         根据语言创建对应的容器
 
         :param lang: 编程语言名称（如"python"、"java"）
+        :param dependencies: 预期需要的依赖，配置了快照仓库且存在对应快照时从快照镜像启动
         :param lifecycle : 容器生命管理策略
         :param kwargs: 传递给docker client的其他参数（如command、ports等）
         :return: 创建的容器对象
@@ -49,13 +111,34 @@ class DockerBackend:
 
         # 获取对应的镜像
         image = self.lang_to_image[lang_lower]
+        snapshot = None
+        if self.snapshot_store is not None and dependencies:
+            snapshot = self.snapshot_store.lookup(image, lang_lower, dependencies)
+
+        if self.cache_volumes:
+            self._apply_cache_volumes(lang_lower, kwargs)
+        labels = dict(kwargs.get("labels") or {})
+        labels.update({
+            SESSION_LABEL: uuid.uuid4().hex,
+            OWNER_LABEL: owner_id(),
+            CREATED_LABEL: str(int(time.time())),
+        })
+        if self.ttl is not None:
+            labels[TTL_LABEL] = str(int(self.ttl))
+        kwargs["labels"] = labels
+        # tail 作为 PID 1 会忽略 SIGTERM，stop 需等满 10 秒超时；由 docker-init 做 PID 1 转发信号
+        kwargs.setdefault("init", True)
 
         # 创建并返回容器
-        container = self.client.containers.create(
-            image=image,
-            command="tail -f /dev/null",
-            **kwargs
-        )
+        with metrics.phase("create", self.name, lang_lower):
+            container = self.client.containers.create(
+                image=snapshot or image,
+                command="tail -f /dev/null",
+                **kwargs
+            )
+        if snapshot:
+            self._snapshot_deps[container.id] = set(dependencies)
+        self._unstarted[container.id] = lang_lower
         # 后续考虑添加容器管理
         # with self._container_lock:
         #     self.managed_containers.append({
@@ -65,44 +148,75 @@ class DockerBackend:
         #         "id":container.id
         #     })
         return container
+    def _apply_cache_volumes(self, lang: str, kwargs: dict) -> None:
+        """将语言对应的缓存命名卷和环境变量合并进 containers.create 的参数"""
+        volumes = dict(kwargs.get("volumes") or {})
+        environment = kwargs.get("environment") or {}
+        if isinstance(environment, list):
+            environment = dict(item.split("=", 1) for item in environment)
+        environment = dict(environment)
+        for volume in cache_volumes_for(lang, ccache=self.ccache):
+            volumes.setdefault(volume.name, {"bind": volume.mount_path, "mode": "rw"})
+            for key, value in volume.env.items():
+                environment.setdefault(key, value)
+        if volumes:
+            kwargs["volumes"] = volumes
+        if environment:
+            kwargs["environment"] = environment
+
     def start_container(self, container: Any) -> None:
-        """Start Docker container."""
-        container.start()
+        """Start Docker container. 由 create_container 创建的容器启动后立即生成镜像清单"""
+        with metrics.phase("start", self.name):
+            container.start()
+        language = self._unstarted.pop(container.id, None)
+        if language is not None:
+            self.prime_manifest(container, language)
 
     def stop_container(self, container: Any) -> None:
         """Stop Docker container."""
-        container.stop()
+        with metrics.phase("stop", self.name):
+            container.stop()
 
     def execute_command(self, container: Any, command: str, **kwargs: Any) -> 'CommandResult':
-        """Execute command in Docker container."""
-        from sandbox.data import CommandResult
-        
+        """Execute command in Docker container.
+
+        输出总是以流的形式增量解码，按 capture（OutputCapture）只保留每个流的开头与结尾。
+        """
         workdir = kwargs.get("workdir")
-        exec_kwargs: dict[str, Any] = {
-            "cmd": command,
-            "stream": self.stream,
-            "tty": False,
-            "stderr": True,
-            "stdout": True,
-            "demux": True,
+        run_id = kwargs.get("run_id")
+        if run_id:
+            command = wrap_run_command(command, run_id)
+        result = CommandResult.from_stream(self.exec_stream(container, command, workdir=workdir), kwargs.get("capture"))
+        logger.info(f"exit code {result.exit_code}")
+        return result
+
+    def exec_stream(self, container: Any, command: str | list[str], workdir: str | None = None) -> Iterator[StreamEvent]:
+        """
+        执行命令并以流的形式返回输出
+
+        stdout/stderr 分别按到达顺序产出 StreamEvent，最后产出一个携带退出码的 EXIT 事件。
+        """
+        api = self.client.api
+        exec_id = api.exec_create(
+            container.id, cmd=command, stdout=True, stderr=True, tty=False, workdir=workdir
+        )["Id"]
+        decoders = {
+            StreamType.STDOUT: codecs.getincrementaldecoder("utf-8")(errors="replace"),
+            StreamType.STDERR: codecs.getincrementaldecoder("utf-8")(errors="replace"),
         }
-        if workdir:
-            exec_kwargs["workdir"] = workdir
-
-        result = container.exec_run(cmd = command)
-        # 获取退出码
-        exit_code = result.exit_code or 0
-        logger.info(f"res {result}")
-        if exit_code == 0 :
-            stdout = result.output.decode('utf-8')
-            stderr = ""
-        else :
-            stderr = result.output.decode('utf-8')
-            stdout = ""
-        print(f"退出码: {exit_code}")
-        print(f"标准输出:\n{stdout}")
-        print(f"标准错误:\n{stderr}")
-        return CommandResult(exit_code=exit_code, stdout=stdout, stderr=stderr)
+        for out, err in api.exec_start(exec_id, stream=True, demux=True):
+            for stream, chunk in ((StreamType.STDOUT, out), (StreamType.STDERR, err)):
+                if chunk:
+                    text = decoders[stream].decode(chunk)
+                    if text:
+                        yield StreamEvent(stream=stream, data=text)
+        for stream, decoder in decoders.items():
+            text = decoder.decode(b"", final=True)
+            if text:
+                yield StreamEvent(stream=stream, data=text)
+        exit_code = api.exec_inspect(exec_id).get("ExitCode") or 0
+        yield StreamEvent(stream=StreamType.EXIT, exit_code=exit_code)
+
     def _get_install_command(self,language:SupportedLanguage = SupportedLanguage.PYTHON ,libraries : list[str]=None)-> list[str]:
         match language:
             case SupportedLanguage.PYTHON:
@@ -132,8 +246,14 @@ class DockerBackend:
                 return []
 
 
-    def _create_file(self,container:Any,code:str,language: SupportedLanguage= SupportedLanguage.PYTHON)-> str:
-        file_path =""
+    def _create_file(self,container:Any,code:str,language: SupportedLanguage= SupportedLanguage.PYTHON,files: dict[str, bytes | str] | None = None)-> str:
+        """将代码文件和辅助文件打包成一个 tar，通过 put_archive 一次上传"""
+        file_path = self._code_file_path(language)
+        self.upload_files(container, {**(files or {}), file_path: code})
+        return file_path
+
+    def _code_file_path(self, language: SupportedLanguage) -> str:
+        """生成容器内唯一的代码文件路径"""
         file_ext = {
             SupportedLanguage.PYTHON: ".py",
             SupportedLanguage.GO: ".go",
@@ -144,22 +264,40 @@ class DockerBackend:
             SupportedLanguage.R: ".R",
         }.get(language, ".txt")
         unique_id = uuid.uuid4().hex  # 生成32位随机字符串
-        file_path = f"/sandbox/code_{unique_id}{file_ext}"
-        # 对代码进行base64编码，避免所有特殊字符
-        encoded_code = base64.b64encode(code.encode()).decode()
-
-        # 在容器内解码并写入文件
-        command = [
-            "sh", "-c",
-            f'echo "{encoded_code}" | base64 -d > {file_path}'
-        ]
-        container.exec_run(command)
-        return file_path
-    def _get_run_command(self,file_path :str,language:SupportedLanguage=SupportedLanguage.PYTHON)->list[str]:
+        return f"/sandbox/code_{unique_id}{file_ext}"
+
+    def upload_files(self, container: Any, files: dict[str, bytes | str]) -> None:
+        """
+        以单个 tar 流上传多个文件，不受命令行长度限制
+
+        :param files: {容器内路径: 内容}，相对路径放到 /sandbox 下
+        """
+        if not files:
+            return
+        with metrics.phase("upload", self.name):
+            uploaded = container.put_archive(path="/", data=build_tar(files))
+        if not uploaded:
+            raise BackendError(f"Failed to upload files to container: {list(files)}")
+
+    def upload_archive(self, container: Any, data: bytes) -> None:
+        """在容器根目录解包一个 tar（成员路径相对于 /）"""
+        with metrics.phase("upload", self.name):
+            uploaded = container.put_archive(path="/", data=data)
+        if not uploaded:
+            raise BackendError("Failed to upload archive to container")
+
+    def download_archive(self, container: Any, path: str) -> bytes:
+        """以 tar 形式取回容器内的文件或目录，成员路径以 path 的最后一级开头"""
+        with metrics.phase("artifact_copy", self.name):
+            data, _ = container.get_archive(path)
+            return b"".join(data)
+
+    def _get_run_command(self,file_path :str,language:SupportedLanguage=SupportedLanguage.PYTHON,
+                         plots: PlotCapture | None = None)->list[str]:
         """生成代码执行命令"""
         match language:
             case SupportedLanguage.PYTHON:
-                return ["python", file_path]
+                return plot_command(file_path, plots) if plots else ["python", file_path]
             case SupportedLanguage.GO:
                 return ["go", "run", file_path]
             case SupportedLanguage.JAVA:
@@ -177,90 +315,335 @@ class DockerBackend:
 
     def run_code(self,container:Any , req:ExecutionRequest) -> 'CommandResult':
         """ run code in docker container."""
-        code = req.code
+        req = with_run_id(req)
+        self._apply_limits(container, req)
+        if self.compiler.supports(req.language):
+            return self.compiler.run(container, req)
+        # 执行代理的请求不能中途截断，有超时或输出上限的请求改走 exec
+        agent = None if req.limited else self._get_agent(container)
+        if agent is not None:
+            return self._run_with_agent(container, agent, req).result
+        command = self._prepare_run(container, req)
+        with metrics.phase("execute", self.name, req.language):
+            return collect_run(self, container, command, req)
+
+    def run_code_stream(self, container: Any, req: ExecutionRequest) -> Iterator[StreamEvent]:
+        """run code in docker container and stream stdout/stderr as they arrive."""
+        req = with_run_id(req)
+        self._apply_limits(container, req)
+        if self.compiler.supports(req.language):
+            build = self.compiler.build(container, req)
+            if build.command is None:
+                yield from build_failure_events(build.result)
+                return
+            command = wrap_run(build.command, req, self.accounting)
+        else:
+            command = self._prepare_run(container, req)
+        yield from stream_run(self, container, command, req)
+
+    def execute_with_limits(self, container: Any, command: list[str], req: ExecutionRequest,
+                            phase: str = "execute") -> CommandResult:
+        """按请求的 run_id、超时与输出上限执行命令，并统计资源用量；耗时记入 phase 阶段"""
+        command = wrap_run(command, req, self.accounting)
+        with metrics.phase(phase, self.name, req.language):
+            return collect_run(self, container, command, req)
+
+    def _apply_limits(self, container: Any, req: ExecutionRequest) -> None:
+        """把请求的 CPU / 内存 / 进程数限制更新到容器的 cgroup 上，未设置的项恢复为不限制"""
+        self._set_limits(container, (req.cpus, req.memory, req.pids))
+
+    def _set_limits(self, container: Any, limits: tuple) -> None:
+        """每次都写入全部三项，避免上一次运行（或上一次租用）的限制残留；与当前限制相同时跳过"""
+        if self._limits.get(container.id, UNLIMITED) == limits:
+            return
+        cpus, memory, pids = limits
+        # -1 表示不限制
+        container.update(
+            cpu_period=CPU_PERIOD,
+            cpu_quota=int(cpus * CPU_PERIOD) if cpus is not None else -1,
+            mem_limit=memory if memory is not None else -1,
+            memswap_limit=memory if memory is not None else -1,
+        )
+        # docker SDK 的 update 不支持 PidsLimit，只有这一项通过 APIClient（requests.Session）直接请求 Engine API
+        api = self.client.api
+        resp = api.post(f"{api.base_url}/v{api.api_version}/containers/{container.id}/update",
+                        json={"PidsLimit": pids if pids is not None else -1})
+        resp.raise_for_status()
+        self._limits[container.id] = limits
+
+    def _prepare_run(self, container: Any, req: ExecutionRequest) -> list[str]:
+        """安装依赖、上传代码，返回执行命令"""
         language = req.language
         libraries = req.dependencies
         # 处理包依赖
-        if libraries is not  None:
-            install_command = self._get_install_command(language = language,libraries=libraries)
-            logger.info(f"install command is {install_command}")
-            container.exec_run(cmd = install_command)
-        file_path = self._create_file(container =container,code = code,language=language)
+        if libraries:
+            self.install_dependencies(container, language, libraries)
         # 将代码保存为对应的文件后执行
-        # res = container.exec_run(["ls","/tmp/sandbox"])
-        # logger.info(f"{res.output.decode('utf-8')}")
-        command = self._get_run_command(file_path = file_path, language=language)
-        result = container.exec_run(command)
-        # return result.output.decode('utf-8')
-        # 获取退出码
-        exit_code = result.exit_code or 0
-        if exit_code == 0 :
-            stdout = result.output.decode('utf-8')
-            stderr = ""
-        else :
-            stderr = result.output.decode('utf-8')
-            stdout = ""
-        from sandbox.data import CommandResult
-        return CommandResult(exit_code=exit_code, stdout=stdout, stderr=stderr)
+        file_path = self._create_file(container =container,code = req.code,language=language,files=req.files)
+        return wrap_run(self._get_run_command(file_path = file_path, language=language, plots=req.plots), req, self.accounting)
 
-    def run_code_get_file(self, container: Any, req: ExeGenFileRequest):
+    def _get_agent(self, container: Any) -> ExecAgent | None:
+        """获取容器内的执行代理，首次使用时启动；启动失败时该容器退回逐条 exec"""
+        if not self.agent:
+            return None
+        if container.id not in self._agents:
+            try:
+                self._agents[container.id] = ExecAgent(self, container).start()
+            except Exception as e:
+                logger.warning(f"Exec agent unavailable in container {container.id[:12]}, fall back to exec: {e}")
+                self._agents[container.id] = None
+        return self._agents[container.id]
+
+    def _run_with_agent(self, container: Any, agent: ExecAgent, req: ExecutionRequest,
+                        collect: list[str] | None = None, max_bytes: int | None = None) -> AgentResult:
+        """通过执行代理在一次往返中完成上传、安装、运行与文件收集"""
+        language = req.language
+        missing = self._dependencies_to_install(container, language, req.dependencies or [])
+        install = self._get_install_command(language=language, libraries=missing) if missing else None
+        file_path = self._code_file_path(language)
+        command = wrap_run(self._get_run_command(file_path=file_path, language=language, plots=req.plots), req, self.accounting)
+        with metrics.phase("agent_run", self.name, language):
+            result = agent.run(command, files={**(req.files or {}), file_path: req.code},
+                               install=install, collect=collect, capture=req.capture, max_bytes=max_bytes)
+        result = dataclasses.replace(result, result=strip_usage(result.result, req.usage_nonce))
+        if result.install is not None and result.install.exit_code == 0:
+            self._record_installed(container, language, missing, req.dependencies)
+        return result
+
+    def open_channel(self, container: Any, command: list[str], environment: dict | None = None) -> DockerExecChannel:
+        """启动容器内常驻进程并附着其 stdin/stdout"""
+        return DockerExecChannel(self.client, container, command, environment=environment)
+
+    def kill_run(self, container: Any, run_id: str) -> None:
+        """结束以 run_id 启动的容器内进程"""
+        container.exec_run(kill_run_command(run_id))
+
+    def install_dependencies(self, container: Any, language: SupportedLanguage, libraries: list[str]) -> None:
+        """安装容器中尚未安装的依赖，成功后按需提交依赖快照"""
+        missing = self._dependencies_to_install(container, language, libraries)
+        if not missing:
+            logger.info(f"dependencies {libraries} already installed, skip install")
+            return
+        install_command = self._get_install_command(language = language,libraries=missing)
+        logger.info(f"install command is {install_command}")
+        with metrics.phase("install", self.name, language):
+            result = container.exec_run(cmd = install_command)
+        if result.exit_code:
+            return
+        self._record_installed(container, language, missing, libraries)
+
+    def _dependencies_to_install(self, container: Any, language: SupportedLanguage, libraries: list[str]) -> list[str]:
+        """过滤掉本容器已安装以及镜像清单中已有的依赖"""
+        installed = self._installed.get(container.id, set())
+        missing = [lib for lib in libraries if lib not in installed]
+        if missing:
+            missing = missing_dependencies(language, missing, self._image_manifest(container, language))
+        return missing
+
+    def _record_installed(self, container: Any, language: SupportedLanguage, libraries: list[str],
+                          requested: list[str]) -> None:
         """
-        run code in docker container and return generated files' content and stat
+        记录安装成功的依赖，并按需提交依赖快照
+
+        :param libraries: 实际安装的依赖（过滤掉了镜像清单中已有的）
+        :param requested: 本次请求的全部依赖，快照以完整的请求集合为键，请求中含有镜像已有的包时也能命中
         """
-        ret = self.run_code(
-            container=container,
-            req=ExecutionRequest(
-                code=req.code,
-                language=req.language,
-                dependencies=req.dependencies
-            )
-        )
-        logger.info(f"run output is {ret}")
+        self._installed[container.id] = self._installed.get(container.id, set()) | set(libraries)
+        requested_deps = self._snapshot_deps.get(container.id, set()) | set(requested)
+        self._snapshot_deps[container.id] = requested_deps
+        if self.snapshot_store is not None:
+            # 快照在基础镜像的临时容器中重新安装完整的依赖集合（含启动时快照中的依赖），不提交会话容器
+            dependencies = sorted(requested_deps)
+            self.snapshot_store.build_async(self.lang_to_image[language], language, dependencies,
+                                            self._get_install_command(language=language, libraries=dependencies))
+
+    def prime_manifest(self, container: Any, language: str) -> None:
+        """在刚启动的容器中生成镜像清单，清单已缓存时不执行命令"""
+        def loader(command: str) -> str:
+            return container.exec_run(["sh", "-c", command]).output.decode("utf-8", errors="replace")
+
+        self.manifest_cache.get(self.image_digest(container), language, loader)
+
+    def _image_manifest(self, container: Any, language: SupportedLanguage) -> dict[str, str]:
+        """
+        获取容器镜像的已安装包清单（按镜像 digest 缓存）
 
+        只使用 prime_manifest 生成的清单，不在已运行过用户代码的容器中列包；没有清单时安装全部依赖。
+        """
+        return self.manifest_cache.get(self.image_digest(container), language, None)
+
+    def image_digest(self, container: Any) -> str:
+        """容器实际运行的镜像 id（来自容器创建时的元数据，无需 exec）"""
+        return container.attrs.get("Image", "")
+
+    def run_code_get_file(self, container: Any, req: ExeGenFileRequest):
+        """
+        run code in docker container and return generated files' archives and stat
+
+        file_path 支持通配符（如 /sandbox/*.png），所有文件在一次请求中以单个 tar 取回。
+        返回的 tar 为只读流，边从容器接收边读取，需在下一次操作该容器之前读完。
+        """
         file_paths = req.file_path
         if isinstance(file_paths, str):
             file_paths = [file_paths]
 
+        run_req = ExecutionRequest(
+            code=req.code,
+            language=req.language,
+            dependencies=req.dependencies,
+            files=req.files,
+            run_id=req.run_id,
+            timeout=req.timeout,
+            max_output_bytes=req.max_output_bytes,
+        )
+        # 执行代理的请求不能中途截断，有超时或输出上限的请求改走 exec；
+        # 代理通道不压缩也不流式返回，要求压缩时改用 stream_artifacts 取回文件
+        agent = None if run_req.limited or req.compression else self._get_agent(container)
+        if agent is not None and isinstance(file_paths, list) and file_paths:
+            # 通过执行代理在同一个请求中运行代码并取回文件，max_bytes 由代理在读取文件前检查
+            ret = self._run_with_agent(container, agent, run_req, collect=[artifact_path(path) for path in file_paths],
+                                       max_bytes=req.max_bytes)
+            logger.info(f"run output is {ret.result}")
+            if ret.too_large:
+                raise ArtifactTooLargeError(req.max_bytes)
+            return [io.BytesIO(archive) for archive, _ in ret.files], [stat for _, stat in ret.files]
+
+        ret = self.run_code(container=container, req=run_req)
+        logger.info(f"run output is {ret}")
+
         if not isinstance(file_paths, list) or not file_paths:
             logger.warning("未提供有效的文件路径列表")
             return None, None
 
-        files_content, files_stat = [], []
-        for container_file_path in file_paths:
+        chunks = self.stream_artifacts(container, [artifact_path(path) for path in file_paths],
+                                       compression=req.compression, max_bytes=req.max_bytes)
+        return [ChunkReader(chunks)], [{"name": "artifacts.tar"}]
+
+    def download_artifacts(self, container: Any, patterns: list[str], compression: str | None = None,
+                           max_bytes: int | None = None) -> bytes:
+        """一次 exec 以单个 tar 取回多个文件，返回未压缩的 tar，见 stream_artifacts"""
+        return b"".join(self.stream_artifacts(container, patterns, compression, max_bytes))
+
+    def stream_artifacts(self, container: Any, patterns: list[str], compression: str | None = None,
+                         max_bytes: int | None = None) -> Iterator[bytes]:
+        """
+        一次 exec 以单个 tar 取回多个文件，边接收边解压，产出未压缩的 tar 数据块
+
+        :param patterns: 文件、目录或通配符（在容器内展开），没有匹配的模式被忽略
+        :param compression: 传输时的压缩方式（None / gzip / zstd）
+        :param max_bytes: 解压后 tar 的大小上限，超出时抛出 ArtifactTooLargeError
+        :return: tar 成员路径相对于容器根目录；没有匹配任何文件时不产出数据
+        """
+        api = self.client.api
+        exec_id = api.exec_create(
+            container.id, cmd=collect_command(patterns, compression), stdout=True, stderr=True, tty=False
+        )["Id"]
+        decoder = ArchiveDecoder(max_bytes)
+        stderr = bytearray()
+
+        def stdout() -> Iterator[bytes]:
+            for out, err in api.exec_start(exec_id, stream=True, demux=True):
+                if err:
+                    stderr.extend(err)
+                if out:
+                    yield out
+
+        with metrics.phase("artifact_copy", self.name):
+            yield from decoder.decode(stdout())
+        exit_code = api.exec_inspect(exec_id).get("ExitCode") or 0
+        if exit_code:
+            logger.warning(f"collect artifacts exited with {exit_code}: {stderr.decode('utf-8', errors='replace')}")
+        logger.info(f"Collected {decoder.decoded} bytes of artifacts ({decoder.received} bytes transferred)")
+
+    def remove_container (self,container :Any, force: bool = False):
+        self._installed.pop(container.id, None)
+        self._unstarted.pop(container.id, None)
+        self._snapshot_deps.pop(container.id, None)
+        self._limits.pop(container.id, None)
+        self.compiler.forget(container)
+        agent = self._agents.pop(container.id, None)
+        if agent is not None:
+            agent.shutdown()
+        with metrics.phase("remove", self.name):
+            return container.remove(v = True, force = force)
+
+    def teardown(self, container: Any) -> None:
+        """强制删除：一次 API 调用完成 kill 与删除，不等待停止的宽限期"""
+        self.remove_container(container, force=True)
+
+    def list_sandbox_resources(self) -> list[SandboxResource]:
+        """列出所有带沙箱标签的容器（包括已停止的）"""
+        resources = []
+        for container in self.client.containers.list(all=True, filters={"label": SESSION_LABEL}):
+            labels = container.labels or {}
+            resources.append(SandboxResource(
+                kind="container",
+                name=container.name,
+                session_id=labels.get(SESSION_LABEL, ""),
+                owner=labels.get(OWNER_LABEL, ""),
+                created=parse_float(labels.get(CREATED_LABEL)),
+                ttl=parse_float(labels.get(TTL_LABEL)),
+                handle=container,
+            ))
+        return resources
+
+    def remove_resources(self, resources: list[SandboxResource]) -> int:
+        """并发强制删除容器，返回成功删除的数量"""
+        def remove(resource: SandboxResource) -> bool:
             try:
-                if not container_file_path.startswith("/sandbox/"):
-                    container_file_path = f"/sandbox/{container_file_path.lstrip('/')}"
-
-                logger.info(f"🎉 开始复制文件{container_file_path}")
-                res = container.exec_run(["pwd"])
-                logger.info(f"当前工作目录: {res.output.decode()}")
-
-                res = container.exec_run(["ls"])
-                logger.info(f"当前目录内容{res.output.decode('utf-8')}")
-                content, stat = self.copy_from_container(container, container_file_path)
-                files_content.append(content)
-                files_stat.append(stat)
+                resource.handle.remove(v=True, force=True)
+            except docker.errors.NotFound:
+                pass
             except Exception as e:
-                logger.error(f"从容器复制文件失败: {container_file_path}, 错误: {e}")
+                logger.warning(f"Failed to remove container {resource.name}: {e}")
+                return False
+            self._installed.pop(resource.handle.id, None)
+            self._snapshot_deps.pop(resource.handle.id, None)
+            return True
 
-        return files_content, files_stat
+        with ThreadPoolExecutor(max_workers=8, thread_name_prefix="sandbox-gc") as executor:
+            return sum(executor.map(remove, resources))
 
-    def remove_container (self,container :Any):
-        return container.remove(v = True)
+    def health_check(self, container: Any) -> bool:
+        """检查容器是否仍在运行且能正常执行命令"""
+        try:
+            container.reload()
+            if container.status != "running":
+                return False
+            return container.exec_run(["true"]).exit_code == 0
+        except Exception as e:
+            logger.warning(f"Container health check failed: {e}")
+            return False
+
+    def scrub_workspace(self, container: Any, keep_build: bool = False) -> bool:
+        """
+        清空 /sandbox 工作目录，供容器池在两次租用之间复用容器
+
+        keep_build 时保留编译目录与容器内的编译记录，同一会话中依次执行的批量请求不必重新编译。
+        """
+        command = ["sh", "-c", scrub_command(keep_build)]
+        if not keep_build:
+            self.compiler.forget(container)
+        result = container.exec_run(command)
+        if result.exit_code:
+            logger.warning(f"scrub workspace failed: {result.output.decode('utf-8', errors='replace')}")
+            return False
+        # 恢复为不限制，上一次租用的资源限制不带给下一个会话
+        try:
+            self._set_limits(container, UNLIMITED)
+        except Exception as e:
+            logger.warning(f"reset limits failed: {e}")
+            return False
+        return True
 
 
     def copy_to_container(self, container: Any, src: str, dest: str, **_kwargs: Any) -> None:
         """Copy file to Docker container."""
-        import io
-        import tarfile
-
-        tar_stream = io.BytesIO()
-        with tarfile.open(fileobj=tar_stream, mode='w') as tar:
-            tar.add(src, arcname=Path(dest).name)
-        tar_stream.seek(0)
-        container.put_archive(path=Path(dest).parent.as_posix(), data=tar_stream.getvalue())
+        with open(src, "rb") as f:
+            self.upload_files(container, {dest: f.read()})
 
     def copy_from_container(self, container: Any, src: str) -> tuple[bytes, dict]:
         """Copy file from Docker container."""
-        data, stat = container.get_archive(src)
-        return b"".join(data), stat
+        with metrics.phase("artifact_copy", self.name):
+            data, stat = container.get_archive(src)
+            return b"".join(data), stat
@@ -1,15 +1,72 @@
-from typing import Any
-from sandbox.backend.base import Backend
-from sandbox.data import ExecutionRequest
-from sandbox.const import DefaultImage, SupportedLanguage
+import codecs
+import dataclasses
+import io
+import posixpath
+import time
+from typing import Any, Iterator
+from sandbox.backend.base import Backend, scrub_command, wrap_run_command, wrap_run, kill_run_command, with_run_id, collect_run, stream_run
+from sandbox.accounting import strip_usage
+from sandbox.plots import plot_command
+from sandbox.data import ExecutionRequest, ExeGenFileRequest, CommandResult, PlotCapture, StreamEvent, StreamType
+from sandbox.const import BackendType, DefaultImage, SupportedLanguage
+from sandbox import metrics
 import kubernetes
-from kubernetes import client, config
+from kubernetes import client, config, watch
 import uuid
-import base64
+from sandbox.errors import ArtifactTooLargeError, BackendError
+from sandbox.snapshot import SnapshotStore
+from sandbox.manifest import ManifestCache, missing_dependencies
+from sandbox.volumes import cache_volumes_for
+from sandbox.lifecycle import SandboxResource, owner_id, parse_float
+from sandbox.transfer import ArchiveDecoder, ChunkReader, artifact_path, build_tar, collect_command, iter_chunks
+from sandbox.runtime import K8sExecChannel
+from sandbox.agent import ExecAgent, AgentResult
+from sandbox.compile import ArtifactCache, Compiler, build_failure_events
 from sandbox.util import logger
 
+# 每个会话独有的 Pod 标签，以及记录所属 Deployment 的标签
+SESSION_LABEL = "sandbox-session"
+DEPLOYMENT_LABEL = "sandbox-deployment"
+# 预热池 Pod 的标签：所属语言池与当前状态（idle / claimed）
+POOL_LABEL = "sandbox-pool"
+STATE_LABEL = "sandbox-state"
+# 所有者进程、创建（或租用）时间与可选的存活时间，供 GarbageCollector 回收泄漏的资源
+OWNER_LABEL = "sandbox-owner"
+CREATED_LABEL = "sandbox-created"
+TTL_LABEL = "sandbox-ttl"
+# 曾被租用过的池 Pod，其中可能残留上一个租户安装的包，不能用来生成镜像清单
+USED_LABEL = "sandbox-used"
+# 批量删除时 label selector 中每批的会话数
+DELETE_BATCH_SIZE = 50
+
 class K8sBackend(Backend):
-    def __init__(self, namespace: str = "default"):
+    name = BackendType.KUBERNETES
+
+    def __init__(
+            self,
+            namespace: str = "default",
+            snapshot_store: SnapshotStore | None = None,
+            manifest_cache: ManifestCache | None = None,
+            cache_volumes: bool = False,
+            cache_host_root: str | None = None,
+            ccache: bool = False,
+            agent: bool = False,
+            artifact_cache: ArtifactCache | None = None,
+            ttl: float | None = None,
+            resources: dict[str, str] | None = None,
+            accounting: bool = True):
+        """
+        :param cache_volumes: 是否挂载跨 Pod 共享的包管理器/工具链缓存卷
+        :param cache_host_root: 设置时使用节点上的 hostPath 子目录作为缓存卷，
+            否则挂载与卷同名的 PVC（跨节点共享需为 ReadWriteMany）
+        :param ccache: C++ 是否额外挂载 ccache 目录
+        :param agent: 是否使用 Pod 内常驻的执行代理，一次往返完成写文件、安装依赖与运行
+        :param artifact_cache: C++/Java/Go 编译产物的宿主机缓存，命中时跳过编译
+        :param ttl: 资源的存活时间（秒），写入标签，无法判断所有者是否存活时，超时后由 GarbageCollector 删除
+        :param resources: Pod 的资源上限（如 {"cpu": "1", "memory": "512Mi"}），同时作为 requests；
+            运行中的 Pod 无法按请求调整 CPU / 内存 / 进程数，单次请求的这些限制需落在 Pod 上限之内
+        :param accounting: 是否统计每次运行的墙钟时间、CPU 时间、内存峰值、写入字节数与进程数（CommandResult.usage）
+        """
         # 加载kubeconfig
         try:
             config.load_kube_config()
@@ -18,6 +75,23 @@ class K8sBackend(Backend):
             config.load_incluster_config()
         
         self.namespace = namespace
+        # 依赖快照：引用 SnapshotStore 已推送到 registry 的快照镜像
+        self.snapshot_store = snapshot_store
+        # Pod 名称 -> 在该 Pod 中额外安装的依赖集合（快照中已包含的依赖由清单覆盖）
+        self._installed: dict[str, set[str]] = {}
+        # 镜像已安装包清单，只安装清单中缺失的依赖
+        self.manifest_cache = manifest_cache or ManifestCache()
+        self.cache_volumes = cache_volumes
+        self.cache_host_root = cache_host_root.rstrip("/") if cache_host_root else None
+        self.ccache = ccache
+        self.agent = agent
+        # Pod 名称 -> 已启动的执行代理，None 表示该 Pod 无法启动代理，改走逐条 exec
+        self._agents: dict[str, ExecAgent | None] = {}
+        # C++/Java/Go 先编译再运行，编译产物按 (镜像 digest, 编译参数, 源码哈希) 缓存
+        self.compiler = Compiler(self, cache=artifact_cache)
+        self.ttl = ttl
+        self.resources = resources
+        self.accounting = accounting
         self.apps_v1_api = client.AppsV1Api()
         self.core_v1_api = client.CoreV1Api()
         # 语言到镜像的映射关系
@@ -31,63 +105,92 @@ class K8sBackend(Backend):
             SupportedLanguage.R: DefaultImage.R
         }
     
-    def create_container(self, lang: str, **kwargs):
-        """根据语言创建对应的Deployment"""
+    def create_container(self, lang: str, dependencies: list[str] | None = None, **kwargs):
+        """根据语言创建对应的Deployment，存在依赖快照时直接使用快照镜像"""
         # 这里需要根据语言选择合适的镜像
         image = self._get_image_for_language(lang)
+        snapshot = None
+        if self.snapshot_store is not None and dependencies:
+            snapshot = self.snapshot_store.lookup(image, lang.lower(), dependencies, remote=True)
         
-        # 生成唯一的Deployment名称
-        deployment_name = f'sandbox-{lang.lower()}-{uuid.uuid4().hex[:8]}'
+        # 生成唯一的Deployment名称，session_id 同时作为 Pod 的专属标签，避免不同会话拿到彼此的 Pod
+        session_id = uuid.uuid4().hex[:8]
+        deployment_name = f'sandbox-{lang.lower()}-{session_id}'
         app_label = f'sandbox-{lang.lower()}'
+        labels = {
+            "app": app_label,
+            SESSION_LABEL: session_id,
+            DEPLOYMENT_LABEL: deployment_name,
+            **self._lifecycle_labels(),
+        }
         
         # 定义容器
+        volumes, mounts, env = self._cache_volume_specs(lang)
         container = client.V1Container(
             name="sandbox-container",
-            image=image,
-            command=["tail", "-f", "/dev/null"]
+            image=snapshot or image,
+            command=["tail", "-f", "/dev/null"],
+            volume_mounts=mounts or None,
+            env=env or None,
+            resources=self._resource_requirements(),
         )
 
         # 定义Pod模板
         pod_spec = client.V1PodSpec(
-            containers=[container]
+            containers=[container],
+            volumes=volumes or None,
+            # tail 不处理 SIGTERM，删除时无需等待宽限期
+            termination_grace_period_seconds=0,
         )
 
         # 定义Deployment
         deployment = client.V1Deployment(
             api_version="apps/v1",
             kind="Deployment",
-            metadata=client.V1ObjectMeta(name=deployment_name),
+            metadata=client.V1ObjectMeta(name=deployment_name, labels=labels),
             spec=client.V1DeploymentSpec(
                 replicas=1,
                 selector=client.V1LabelSelector(
-                    match_labels={"app": app_label}
+                    match_labels={"app": app_label, SESSION_LABEL: session_id}
                 ),
                 template=client.V1PodTemplateSpec(
-                    metadata=client.V1ObjectMeta(labels={"app": app_label}),
+                    metadata=client.V1ObjectMeta(labels=labels),
                     spec=pod_spec
                 )
             )
         )
 
-        try:
-            # 先尝试删除旧的 Deployment
-            self.apps_v1_api.delete_namespaced_deployment(
-                name=deployment_name, namespace=self.namespace
+        # Deployment 名称唯一，无需先删除旧的 Deployment；create 阶段包含等待 Pod 就绪
+        with metrics.phase("create", self.name, lang.lower()):
+            self.apps_v1_api.create_namespaced_deployment(
+                namespace=self.namespace,
+                body=deployment
             )
-        except client.exceptions.ApiException as e:
-            if e.status != 404:
-                raise e
-
-        # 创建新的 Deployment
-        resp = self.apps_v1_api.create_namespaced_deployment(
-            namespace=self.namespace,
-            body=deployment
-        )
-        
-        # 等待Deployment创建完成并获取Pod
-        pod = self._wait_for_pod_running(app_label)
+            try:
+                pod = self._wait_for_pod_running(session_id)
+            except Exception:
+                self._delete_deployment(deployment_name)
+                raise
+        self.prime_manifest(pod, lang.lower())
         return pod
     
+    def _cache_volume_specs(self, lang: str) -> tuple[list, list, list]:
+        """生成语言对应缓存卷的 (volumes, volume_mounts, env)"""
+        if not self.cache_volumes:
+            return [], [], []
+        volumes, mounts, env = [], [], []
+        for volume in cache_volumes_for(lang.lower(), ccache=self.ccache):
+            if self.cache_host_root:
+                source = {"host_path": client.V1HostPathVolumeSource(
+                    path=f"{self.cache_host_root}/{volume.name}", type="DirectoryOrCreate")}
+            else:
+                source = {"persistent_volume_claim": client.V1PersistentVolumeClaimVolumeSource(
+                    claim_name=volume.name)}
+            volumes.append(client.V1Volume(name=volume.name, **source))
+            mounts.append(client.V1VolumeMount(name=volume.name, mount_path=volume.mount_path))
+            env.extend(client.V1EnvVar(name=k, value=v) for k, v in volume.env.items())
+        return volumes, mounts, env
+
     def start_container(self, container: Any) -> None:
         """启动容器（Deployment已经在运行）"""
         # Deployment在创建时就已经启动，这里可以添加等待Pod就绪的逻辑
@@ -95,97 +198,465 @@ class K8sBackend(Backend):
     
     def stop_container(self, container: Any) -> None:
         """停止容器（删除Deployment）"""
-        # 从Pod信息中获取Deployment名称
-        deployment_name = container.metadata.labels.get('app', '').replace('sandbox-', 'sandbox-')
-        if deployment_name:
-            try:
-                self.apps_v1_api.delete_namespaced_deployment(name=deployment_name, namespace=self.namespace)
-            except client.exceptions.ApiException as e:
-                if e.status != 404:
-                    raise e
+        with metrics.phase("stop", self.name):
+            self._delete_deployment(self._deployment_name(container))
     
-    def execute_command(self, container: Any, command: str, **kwargs: Any) -> 'CommandResult':
+    def execute_command(self, container: Any, command: str | list[str], **kwargs: Any) -> 'CommandResult':
         """在Pod中执行命令"""
-        from sandbox.data import CommandResult
-        
-        name = container.metadata.name
-        
-        # 执行命令
-        exec_command = [
-            '/bin/sh',
-            '-c',
-            command
-        ]
-        
+        run_id = kwargs.get("run_id")
+        if run_id:
+            command = wrap_run_command(command, run_id)
+        result = CommandResult.from_stream(self.exec_stream(container, command), kwargs.get("capture"))
+        logger.info(f'exit code {result.exit_code}')
+        return result
+
+    def exec_stream(self, container: Any, command: str | list[str], timeout: float = 1.0) -> Iterator[StreamEvent]:
+        """
+        在Pod中执行命令并以流的形式返回输出
+
+        stdout/stderr 通过 websocket 的不同 channel 分别到达，按到达顺序产出 StreamEvent，
+        最后产出一个携带退出码的 EXIT 事件。字符串命令通过 /bin/sh -c 执行。
+        """
+        exec_command = ['/bin/sh', '-c', command] if isinstance(command, str) else command
         resp = kubernetes.stream.stream(
             self.core_v1_api.connect_get_namespaced_pod_exec,
-            name,
+            container.metadata.name,
             self.namespace,
             command=exec_command,
             stderr=True,
             stdin=False,
             stdout=True,
             tty=False,
+            binary=True,
             _preload_content=False
         )
-        
-        # 等待命令执行完成
-        resp.run_forever()
-        # 获取执行结果
-        exit_code = resp.returncode or 0
-        logger.info(f'{exit_code}')
-        stdout = resp.read_stdout()
-        stderr = resp.read_stderr()
-        logger.info(f'stderr {stderr}')
-        return CommandResult(exit_code=exit_code, stdout=stdout, stderr=stderr)
+        decoders = {
+            StreamType.STDOUT: codecs.getincrementaldecoder("utf-8")(errors="replace"),
+            StreamType.STDERR: codecs.getincrementaldecoder("utf-8")(errors="replace"),
+        }
+        try:
+            while True:
+                resp.update(timeout=timeout)
+                for stream, read in ((StreamType.STDOUT, resp.read_stdout), (StreamType.STDERR, resp.read_stderr)):
+                    chunk = read(timeout=0)
+                    if chunk:
+                        text = decoders[stream].decode(chunk)
+                        if text:
+                            yield StreamEvent(stream=stream, data=text)
+                if not resp.is_open():
+                    break
+            for stream, decoder in decoders.items():
+                text = decoder.decode(b"", final=True)
+                if text:
+                    yield StreamEvent(stream=stream, data=text)
+            yield StreamEvent(stream=StreamType.EXIT, exit_code=resp.returncode or 0)
+        finally:
+            resp.close()
     
     def run_code(self, container: Any, req: ExecutionRequest) -> 'CommandResult':
         """在Kubernetes容器中运行代码"""
-        code = req.code
+        req = with_run_id(req)
+        self._check_limits(req)
+        if self.compiler.supports(req.language):
+            return self.compiler.run(container, req)
+        # 执行代理的请求不能中途截断，有超时或输出上限的请求改走 exec
+        agent = None if req.limited else self._get_agent(container)
+        if agent is not None:
+            return self._run_with_agent(container, agent, req).result
+        command = self._prepare_run(container, req)
+        with metrics.phase("execute", self.name, req.language):
+            return collect_run(self, container, command, req)
+
+    def run_code_stream(self, container: Any, req: ExecutionRequest) -> Iterator[StreamEvent]:
+        """在Kubernetes容器中运行代码，并以流的形式返回输出"""
+        req = with_run_id(req)
+        self._check_limits(req)
+        if self.compiler.supports(req.language):
+            build = self.compiler.build(container, req)
+            if build.command is None:
+                yield from build_failure_events(build.result)
+                return
+            command = wrap_run(build.command, req, self.accounting)
+        else:
+            command = self._prepare_run(container, req)
+        yield from stream_run(self, container, command, req)
+
+    def execute_with_limits(self, container: Any, command: list[str], req: ExecutionRequest,
+                            phase: str = "execute") -> CommandResult:
+        """按请求的 run_id、超时与输出上限执行命令，并统计资源用量；耗时记入 phase 阶段"""
+        command = wrap_run(command, req, self.accounting)
+        with metrics.phase(phase, self.name, req.language):
+            return collect_run(self, container, command, req)
+
+    def run_code_get_file(self, container: Any, req: ExeGenFileRequest):
+        """
+        运行代码并以单个 tar 取回生成的文件（file_path 支持通配符），返回 (tar 流列表, 元信息列表)
+
+        返回的 tar 为只读流，边从Pod接收边读取，需在下一次操作该Pod之前读完。
+        """
+        file_paths = [req.file_path] if isinstance(req.file_path, str) else req.file_path
+        run_req = ExecutionRequest(code=req.code, language=req.language, dependencies=req.dependencies, files=req.files,
+                                   run_id=req.run_id, timeout=req.timeout, max_output_bytes=req.max_output_bytes)
+        # 执行代理的请求不能中途截断，有超时或输出上限的请求改走 exec；
+        # 代理通道不压缩也不流式返回，要求压缩时改用 stream_artifacts 取回文件
+        agent = self._get_agent(container) if file_paths and not run_req.limited and not req.compression else None
+        if agent is not None:
+            # 通过执行代理在同一个请求中运行代码并取回文件，max_bytes 由代理在读取文件前检查
+            ret = self._run_with_agent(container, agent, run_req, collect=[artifact_path(p) for p in file_paths],
+                                       max_bytes=req.max_bytes)
+            logger.info(f"run output is {ret.result}")
+            if ret.too_large:
+                raise ArtifactTooLargeError(req.max_bytes)
+            return [io.BytesIO(archive) for archive, _ in ret.files], [stat for _, stat in ret.files]
+
+        ret = self.run_code(container, run_req)
+        logger.info(f"run output is {ret}")
+        if not file_paths:
+            logger.warning("未提供有效的文件路径列表")
+            return None, None
+        chunks = self.stream_artifacts(container, [artifact_path(p) for p in file_paths],
+                                       compression=req.compression, max_bytes=req.max_bytes)
+        return [ChunkReader(chunks)], [{"name": "artifacts.tar"}]
+
+    def _resource_requirements(self) -> Any:
+        if not self.resources:
+            return None
+        return client.V1ResourceRequirements(limits=dict(self.resources), requests=dict(self.resources))
+
+    def _check_limits(self, req: ExecutionRequest) -> None:
+        if req.cpus is not None or req.memory is not None or req.pids is not None:
+            # 运行中 Pod 的资源无法调整，不能在没有限制的情况下返回看似正常的结果
+            raise ValueError(
+                f"per-request cpus/memory/pids are not adjustable on a running pod, "
+                f"configure K8sBackend(resources=...) instead (current: {self.resources})"
+            )
+
+    def _prepare_run(self, container: Any, req: ExecutionRequest) -> list[str]:
+        """安装依赖、上传代码，返回执行命令"""
         language = req.language
         libraries = req.dependencies
         
         # 处理包依赖
-        if libraries is not None:
-            install_command = self._get_install_command(language=language, libraries=libraries)
-            self.execute_command(container, " ".join(install_command))
+        if libraries:
+            self.install_dependencies(container, language, libraries)
         
         # 创建代码文件
-        file_path = self._create_file(container, code, language)
-        
-        # 执行代码
-        command = self._get_run_command(file_path=file_path, language=language)
-        result = self.execute_command(container, " ".join(command))
+        file_path = self._create_file(container, req.code, language, files=req.files)
         
+        return wrap_run(self._get_run_command(file_path=file_path, language=language, plots=req.plots), req, self.accounting)
+
+    def _get_agent(self, container: Any) -> ExecAgent | None:
+        """获取Pod内的执行代理，首次使用时启动；启动失败时该Pod退回逐条 exec"""
+        if not self.agent:
+            return None
+        name = container.metadata.name
+        if name not in self._agents:
+            try:
+                self._agents[name] = ExecAgent(self, container).start()
+            except Exception as e:
+                logger.warning(f"Exec agent unavailable in pod {name}, fall back to exec: {e}")
+                self._agents[name] = None
+        return self._agents[name]
+
+    def _run_with_agent(self, container: Any, agent: ExecAgent, req: ExecutionRequest,
+                        collect: list[str] | None = None, max_bytes: int | None = None) -> AgentResult:
+        """通过执行代理在一次往返中完成上传、安装、运行与文件收集"""
+        language = req.language
+        missing = self._dependencies_to_install(container, language, req.dependencies or [])
+        install = self._get_install_command(language=language, libraries=missing) if missing else None
+        file_path = self._code_file_path(language)
+        command = wrap_run(self._get_run_command(file_path=file_path, language=language, plots=req.plots), req, self.accounting)
+        with metrics.phase("agent_run", self.name, language):
+            result = agent.run(command, files={**(req.files or {}), file_path: req.code},
+                               install=install, collect=collect, capture=req.capture, max_bytes=max_bytes)
+        result = dataclasses.replace(result, result=strip_usage(result.result, req.usage_nonce))
+        if result.install is not None and result.install.exit_code == 0:
+            self._installed[container.metadata.name] = \
+                self._installed.get(container.metadata.name, set()) | set(missing)
         return result
+
+    def open_channel(self, container: Any, command: list[str], environment: dict | None = None) -> K8sExecChannel:
+        """启动Pod内常驻进程并附着其 stdin/stdout"""
+        if environment:
+            command = ["env", *[f"{k}={v}" for k, v in environment.items()], *command]
+        resp = kubernetes.stream.stream(
+            self.core_v1_api.connect_get_namespaced_pod_exec,
+            container.metadata.name,
+            self.namespace,
+            command=command,
+            stderr=True,
+            stdin=True,
+            stdout=True,
+            tty=False,
+            binary=True,
+            _preload_content=False
+        )
+        return K8sExecChannel(resp)
+
+    def kill_run(self, container: Any, run_id: str) -> None:
+        """结束以 run_id 启动的容器内进程"""
+        self.execute_command(container, kill_run_command(run_id))
     
+    def install_dependencies(self, container: Any, language: SupportedLanguage, libraries: list[str]) -> None:
+        """安装Pod中尚未安装的依赖，镜像（或快照）清单中已有的依赖不再安装"""
+        missing = self._dependencies_to_install(container, language, libraries)
+        if not missing:
+            return
+        install_command = self._get_install_command(language=language, libraries=missing)
+        with metrics.phase("install", self.name, language):
+            result = self.execute_command(container, install_command)
+        if result.exit_code == 0:
+            self._installed[container.metadata.name] = \
+                self._installed.get(container.metadata.name, set()) | set(missing)
+
+    def _dependencies_to_install(self, container: Any, language: SupportedLanguage, libraries: list[str]) -> list[str]:
+        """过滤掉本Pod已安装以及镜像清单中已有的依赖"""
+        installed = self._installed.get(container.metadata.name, set())
+        missing = [lib for lib in libraries if lib not in installed]
+        if missing:
+            missing = missing_dependencies(language, missing, self._image_manifest(container, language))
+        return missing
+
+    def prime_manifest(self, container: Any, language: str) -> None:
+        """在新建、从未被租用过的 Pod 中生成镜像清单，清单已缓存或 Pod 曾被租用时不执行命令"""
+        if (container.metadata.labels or {}).get(USED_LABEL):
+            return
+
+        def loader(command: str) -> str:
+            return self.execute_command(container, command).stdout
+
+        self.manifest_cache.get(self.image_digest(container), language, loader)
+
+    def _image_manifest(self, container: Any, language: SupportedLanguage) -> dict[str, str]:
+        """
+        获取Pod镜像的已安装包清单（按镜像 digest 缓存）
+
+        只使用 prime_manifest 生成的清单，不在已运行过用户代码的 Pod 中列包；没有清单时安装全部依赖。
+        """
+        return self.manifest_cache.get(self.image_digest(container), language, None)
+
+    def image_digest(self, container: Any) -> str:
+        """Pod 容器实际运行的镜像 digest（来自 Pod 状态，无需 exec）"""
+        statuses = container.status.container_statuses if container.status else None
+        return statuses[0].image_id if statuses else ""
+
     def remove_container(self, container: Any):
         """删除容器（删除Deployment）"""
-        # 从Pod信息中获取Deployment名称
-        app_label = container.metadata.labels.get('app', '')
-        deployment_name = app_label
-        if deployment_name:
-            try:
-                self.apps_v1_api.delete_namespaced_deployment(name=deployment_name, namespace=self.namespace)
-            except client.exceptions.ApiException as e:
-                if e.status != 404:
-                    raise e
+        self._installed.pop(container.metadata.name, None)
+        self.compiler.forget(container)
+        agent = self._agents.pop(container.metadata.name, None)
+        if agent is not None:
+            agent.shutdown()
+        with metrics.phase("remove", self.name):
+            self._delete_deployment(self._deployment_name(container))
+
+    def teardown(self, container: Any) -> None:
+        """删除 Deployment 即可（Pod 在后台级联删除），无需先 stop"""
+        self.remove_container(container)
+
+    def _deployment_name(self, container: Any) -> str:
+        """从Pod标签中获取所属Deployment名称"""
+        return (container.metadata.labels or {}).get(DEPLOYMENT_LABEL, '')
+
+    def _delete_deployment(self, deployment_name: str) -> None:
+        if not deployment_name:
+            return
+        try:
+            self.apps_v1_api.delete_namespaced_deployment(
+                name=deployment_name, namespace=self.namespace,
+                grace_period_seconds=0, propagation_policy="Background",
+            )
+        except client.exceptions.ApiException as e:
+            if e.status != 404:
+                raise e
     
+    def health_check(self, container: Any) -> bool:
+        """检查Pod是否仍在运行且能正常执行命令"""
+        try:
+            pod = self.core_v1_api.read_namespaced_pod(name=container.metadata.name, namespace=self.namespace)
+            if not self._is_pod_ready(pod):
+                return False
+            return self.execute_command(container, "true").exit_code == 0
+        except Exception as e:
+            logger.warning(f"Pod health check failed: {e}")
+            return False
+
+    def scrub_workspace(self, container: Any, keep_build: bool = False) -> bool:
+        """清空 /sandbox 工作目录，供预热池在两次租用之间复用Pod；keep_build 时保留编译目录与编译记录"""
+        if not keep_build:
+            self.compiler.forget(container)
+        result = self.execute_command(container, scrub_command(keep_build))
+        return result.exit_code == 0
+
+    # 预热池相关：Pod 直接创建（不经过 Deployment），状态通过标签记录在集群中，
+    # 多个工作进程可以共享同一个池
+    def create_pool_pod(self, lang: str, state: str = "idle", session_id: str | None = None) -> Any:
+        """为语言池创建一个Pod，state 为 claimed 时直接归属于 session_id"""
+        labels = {
+            "app": f'sandbox-{lang.lower()}',
+            POOL_LABEL: lang.lower(),
+            STATE_LABEL: state,
+            **self._lifecycle_labels(),
+        }
+        if session_id:
+            labels[SESSION_LABEL] = session_id
+        volumes, mounts, env = self._cache_volume_specs(lang)
+        pod = client.V1Pod(
+            api_version="v1",
+            kind="Pod",
+            metadata=client.V1ObjectMeta(
+                name=f'sandbox-pool-{lang.lower()}-{uuid.uuid4().hex[:8]}',
+                labels=labels,
+            ),
+            spec=client.V1PodSpec(
+                containers=[client.V1Container(
+                    name="sandbox-container",
+                    image=self._get_image_for_language(lang),
+                    command=["tail", "-f", "/dev/null"],
+                    volume_mounts=mounts or None,
+                    env=env or None,
+                    resources=self._resource_requirements(),
+                )],
+                volumes=volumes or None,
+                restart_policy="Never",
+                termination_grace_period_seconds=0,
+            )
+        )
+        return self.core_v1_api.create_namespaced_pod(namespace=self.namespace, body=pod)
+
+    def list_pool_pods(self, lang: str, state: str | None = None) -> list:
+        """列出语言池中的Pod，可按状态过滤"""
+        selector = f"{POOL_LABEL}={lang.lower()}"
+        if state:
+            selector += f",{STATE_LABEL}={state}"
+        pods = self.core_v1_api.list_namespaced_pod(namespace=self.namespace, label_selector=selector)
+        return [p for p in pods.items
+                if p.metadata.deletion_timestamp is None and p.status.phase not in ("Failed", "Succeeded")]
+
+    def claim_pod(self, pod: Any, session_id: str) -> Any | None:
+        """
+        原子地认领一个空闲Pod
+
+        patch 中携带读取时的 resourceVersion，API Server 会据此做乐观并发检查：
+        如果其他工作进程已先一步修改了该Pod，返回 409，本次认领失败并返回 None。
+        """
+        body = {
+            "metadata": {
+                "resourceVersion": pod.metadata.resource_version,
+                # 认领后所有者与租用时间记录为当前进程
+                "labels": {STATE_LABEL: "claimed", SESSION_LABEL: session_id, **self._lifecycle_labels()},
+            }
+        }
+        try:
+            return self.core_v1_api.patch_namespaced_pod(
+                name=pod.metadata.name, namespace=self.namespace, body=body
+            )
+        except client.exceptions.ApiException as e:
+            if e.status in (404, 409):
+                return None
+            raise e
+
+    def return_pod(self, pod: Any) -> None:
+        """将Pod重新标记为空闲"""
+        body = {"metadata": {"labels": {STATE_LABEL: "idle", SESSION_LABEL: None, USED_LABEL: "1"}}}
+        self.core_v1_api.patch_namespaced_pod(name=pod.metadata.name, namespace=self.namespace, body=body)
+
+    def _lifecycle_labels(self) -> dict[str, str]:
+        labels = {OWNER_LABEL: owner_id(), CREATED_LABEL: str(int(time.time()))}
+        if self.ttl is not None:
+            labels[TTL_LABEL] = str(int(self.ttl))
+        return labels
+
+    def list_sandbox_resources(self) -> list[SandboxResource]:
+        """列出会话 Deployment 与已被认领的预热池 Pod（空闲的池 Pod 由多个工作进程共享，不参与回收）"""
+        deployments = self.apps_v1_api.list_namespaced_deployment(
+            namespace=self.namespace, label_selector=SESSION_LABEL
+        ).items
+        pods = self.core_v1_api.list_namespaced_pod(
+            namespace=self.namespace, label_selector=f"{POOL_LABEL},{STATE_LABEL}=claimed"
+        ).items
+        resources = []
+        for kind, items in (("deployment", deployments), ("pod", pods)):
+            for item in items:
+                labels = item.metadata.labels or {}
+                created = parse_float(labels.get(CREATED_LABEL))
+                if created is None and item.metadata.creation_timestamp is not None:
+                    created = item.metadata.creation_timestamp.timestamp()
+                resources.append(SandboxResource(
+                    kind=kind,
+                    name=item.metadata.name,
+                    session_id=labels.get(SESSION_LABEL, ""),
+                    owner=labels.get(OWNER_LABEL, ""),
+                    created=created,
+                    ttl=parse_float(labels.get(TTL_LABEL)),
+                    handle=item,
+                ))
+        return resources
+
+    def remove_resources(self, resources: list[SandboxResource]) -> int:
+        """按会话标签批量删除，每批一次 deletecollection 请求"""
+        removed = 0
+        for kind, delete, prefix in (
+                ("deployment", self.apps_v1_api.delete_collection_namespaced_deployment, ""),
+                ("pod", self.core_v1_api.delete_collection_namespaced_pod, f"{POOL_LABEL},")):
+            sessions = [r.session_id for r in resources if r.kind == kind and r.session_id]
+            for i in range(0, len(sessions), DELETE_BATCH_SIZE):
+                batch = sessions[i:i + DELETE_BATCH_SIZE]
+                label_selector = f"{prefix}{SESSION_LABEL} in ({','.join(batch)})"
+                try:
+                    delete(namespace=self.namespace, label_selector=label_selector,
+                           grace_period_seconds=0, propagation_policy="Background")
+                    removed += len(batch)
+                except client.exceptions.ApiException as e:
+                    logger.warning(f"Failed to delete {kind}s {batch}: {e}")
+        return removed
+
+    def delete_pod(self, pod: Any) -> None:
+        try:
+            self.core_v1_api.delete_namespaced_pod(
+                name=pod.metadata.name, namespace=self.namespace, grace_period_seconds=0
+            )
+        except client.exceptions.ApiException as e:
+            if e.status != 404:
+                raise e
+
     def _get_image_for_language(self, lang: str) -> str:
         """根据语言获取对应的镜像"""
         # 使用const.py中定义的镜像配置
         return self.lang_to_image.get(lang.lower(), "ubuntu:latest")
     
-    def _wait_for_pod_running(self, app_label: str):
-        """等待Pod运行"""
-        import time
-        for _ in range(100):  # 最多等待30秒
-            pods = self.core_v1_api.list_namespaced_pod(namespace=self.namespace, label_selector=f"app={app_label}")
-            running_pods = [p for p in pods.items if p.status.phase == "Running"]
-            if running_pods:
-                return running_pods[0]
-            time.sleep(1)
-        raise Exception(f"Pod with label {app_label} did not start in time")
+    def _wait_for_pod_running(self, session_id: str, timeout: int = 100):
+        """
+        通过 watch API 等待本会话的 Pod 进入 Running 且 Ready 状态
+
+        不带 resourceVersion 的 watch 会先为已存在的 Pod 推送 ADDED 事件，
+        因此不会错过在 watch 建立前就已就绪的 Pod。
+        """
+        label_selector = f"{SESSION_LABEL}={session_id}"
+        w = watch.Watch()
+        try:
+            for event in w.stream(
+                    self.core_v1_api.list_namespaced_pod,
+                    namespace=self.namespace,
+                    label_selector=label_selector,
+                    timeout_seconds=timeout):
+                pod = event["object"]
+                if event["type"] == "DELETED":
+                    continue
+                if pod.status.phase in ("Failed", "Succeeded"):
+                    raise BackendError(f"Pod {pod.metadata.name} exited with phase {pod.status.phase}")
+                if self._is_pod_ready(pod):
+                    return pod
+        finally:
+            w.stop()
+        raise BackendError(f"Pod with label {label_selector} did not start in time")
+
+    @staticmethod
+    def _is_pod_ready(pod: Any) -> bool:
+        if pod.status is None or pod.status.phase != "Running":
+            return False
+        conditions = pod.status.conditions or []
+        return any(c.type == "Ready" and c.status == "True" for c in conditions)
     
     def _get_install_command(self, language: SupportedLanguage = SupportedLanguage.PYTHON, libraries: list[str] = None) -> list[str]:
         match language:
@@ -214,7 +685,14 @@ class K8sBackend(Backend):
             case _:
                 raise ValueError(f"不支持的语言: {language}")
 
-    def _create_file(self, container: Any, code: str, language: SupportedLanguage = SupportedLanguage.PYTHON) -> str:
+    def _create_file(self, container: Any, code: str, language: SupportedLanguage = SupportedLanguage.PYTHON, files: dict[str, bytes | str] | None = None) -> str:
+        """将代码文件和辅助文件打包成一个 tar，通过 exec stdin 一次上传"""
+        file_path = self._code_file_path(language)
+        self.upload_files(container, {**(files or {}), file_path: code})
+        return file_path
+
+    def _code_file_path(self, language: SupportedLanguage) -> str:
+        """生成Pod内唯一的代码文件路径"""
         file_ext = {
             SupportedLanguage.PYTHON: ".py",
             SupportedLanguage.GO: ".go",
@@ -225,23 +703,128 @@ class K8sBackend(Backend):
             SupportedLanguage.R: ".R",
         }.get(language, ".txt")
         unique_id = uuid.uuid4().hex  # 生成32位随机字符串
-        file_path = f"/sandbox/code_{unique_id}{file_ext}"
-        # 对代码进行base64编码，避免所有特殊字符
-        encoded_code = base64.b64encode(code.encode()).decode()
-
-        # 在容器内解码并写入文件
-        command = [
-            "sh", "-c",
-            f'echo "{encoded_code}" | base64 -d > {file_path}'
-        ]
-        self.execute_command(container, " ".join(command))
-        return file_path
+        return f"/sandbox/code_{unique_id}{file_ext}"
+
+    def upload_files(self, container: Any, files: dict[str, bytes | str], timeout: int = 300) -> None:
+        """
+        以单个 tar 流通过 exec stdin 上传多个文件，不受命令行长度限制
+
+        :param files: {容器内路径: 内容}，相对路径放到 /sandbox 下
+        """
+        if not files:
+            return
+        self.upload_archive(container, build_tar(files), timeout=timeout)
+
+    def upload_archive(self, container: Any, data: bytes, timeout: int = 300) -> None:
+        """通过 exec stdin 在Pod根目录解包一个 tar（成员路径相对于 /）"""
+        with metrics.phase("upload", self.name):
+            resp = kubernetes.stream.stream(
+                self.core_v1_api.connect_get_namespaced_pod_exec,
+                container.metadata.name,
+                self.namespace,
+                command=["tar", "xf", "-", "-C", "/"],
+                stderr=True,
+                stdin=True,
+                stdout=True,
+                tty=False,
+                binary=True,
+                _preload_content=False
+            )
+            try:
+                for chunk in iter_chunks(data):
+                    resp.write_stdin(chunk)
+                # tar 读到归档结束块后自行退出
+                resp.run_forever(timeout=timeout)
+                stderr = resp.read_stderr()
+                if resp.returncode:
+                    raise BackendError(f"Failed to upload files to pod: {stderr.decode('utf-8', errors='replace')}")
+            finally:
+                resp.close()
+
+    def download_archive(self, container: Any, path: str, timeout: float = 1.0) -> bytes:
+        """以 tar 形式取回Pod内的文件或目录，成员路径以 path 的最后一级开头"""
+        with metrics.phase("artifact_copy", self.name):
+            parent, name = posixpath.split(path.rstrip("/"))
+            resp = kubernetes.stream.stream(
+                self.core_v1_api.connect_get_namespaced_pod_exec,
+                container.metadata.name,
+                self.namespace,
+                command=["tar", "cf", "-", "-C", parent or "/", name],
+                stderr=True,
+                stdin=False,
+                stdout=True,
+                tty=False,
+                binary=True,
+                _preload_content=False
+            )
+            data, stderr = bytearray(), bytearray()
+            try:
+                while True:
+                    resp.update(timeout=timeout)
+                    data.extend(resp.read_stdout(timeout=0) or b"")
+                    stderr.extend(resp.read_stderr(timeout=0) or b"")
+                    if not resp.is_open():
+                        break
+                if resp.returncode:
+                    raise BackendError(f"Failed to download {path} from pod: {stderr.decode('utf-8', errors='replace')}")
+            finally:
+                resp.close()
+            return bytes(data)
+
+    def download_artifacts(self, container: Any, patterns: list[str], compression: str | None = None,
+                           max_bytes: int | None = None) -> bytes:
+        """一次 exec 以单个 tar 取回多个文件，返回未压缩的 tar，见 stream_artifacts"""
+        return b"".join(self.stream_artifacts(container, patterns, compression, max_bytes))
+
+    def stream_artifacts(self, container: Any, patterns: list[str], compression: str | None = None,
+                         max_bytes: int | None = None, timeout: float = 1.0) -> Iterator[bytes]:
+        """
+        一次 exec 以单个 tar 取回多个文件，边接收边解压，产出未压缩的 tar 数据块
+
+        :param patterns: 文件、目录或通配符（在Pod内展开），没有匹配的模式被忽略
+        :param compression: 传输时的压缩方式（None / gzip / zstd）
+        :param max_bytes: 解压后 tar 的大小上限，超出时抛出 ArtifactTooLargeError
+        :return: tar 成员路径相对于容器根目录；没有匹配任何文件时不产出数据
+        """
+        resp = kubernetes.stream.stream(
+            self.core_v1_api.connect_get_namespaced_pod_exec,
+            container.metadata.name,
+            self.namespace,
+            command=collect_command(patterns, compression),
+            stderr=True,
+            stdin=False,
+            stdout=True,
+            tty=False,
+            binary=True,
+            _preload_content=False
+        )
+        decoder, stderr = ArchiveDecoder(max_bytes), bytearray()
+
+        def stdout() -> Iterator[bytes]:
+            while True:
+                resp.update(timeout=timeout)
+                stderr.extend(resp.read_stderr(timeout=0) or b"")
+                data = resp.read_stdout(timeout=0)
+                if data:
+                    yield data
+                if not resp.is_open():
+                    break
+
+        try:
+            with metrics.phase("artifact_copy", self.name):
+                yield from decoder.decode(stdout())
+            if resp.returncode:
+                logger.warning(f"collect artifacts exited with {resp.returncode}: {stderr.decode('utf-8', errors='replace')}")
+        finally:
+            resp.close()
+        logger.info(f"Collected {decoder.decoded} bytes of artifacts ({decoder.received} bytes transferred)")
     
-    def _get_run_command(self, file_path: str, language: SupportedLanguage = SupportedLanguage.PYTHON) -> list[str]:
+    def _get_run_command(self, file_path: str, language: SupportedLanguage = SupportedLanguage.PYTHON,
+                         plots: PlotCapture | None = None) -> list[str]:
         """生成代码执行命令"""
         match language:
             case SupportedLanguage.PYTHON:
-                return ["python", file_path]
+                return plot_command(file_path, plots) if plots else ["python", file_path]
             case SupportedLanguage.GO:
                 return ["go", "run", file_path]
             case SupportedLanguage.JAVA:
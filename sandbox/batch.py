@@ -0,0 +1,290 @@
+import queue
+import statistics
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Iterable, Iterator
+from sandbox.const import BackendType, SupportedLanguage
+from sandbox.data import CommandResult, ExecutionRequest
+from sandbox.session import SandboxSession
+from sandbox.util import logger
+
+
+# 工作线程退出时放入结果队列的标记
+_WORKER_DONE = object()
+
+
+@dataclass(frozen=True)
+class BatchItemResult:
+    """
+    批量执行中单个请求的结果
+
+    index: 请求在输入中的位置
+    result: 执行结果，执行出错时为 None
+    error: 出错信息（会话创建失败、后端异常等）
+    latency: 该请求的执行耗时（秒）
+    """
+
+    index: int
+    request: ExecutionRequest
+    result: CommandResult | None = None
+    error: str | None = None
+    latency: float = 0.0
+
+    def success(self) -> bool:
+        return self.error is None and self.result is not None and not self.result.exit_code
+
+
+@dataclass(frozen=True)
+class BatchStats:
+    """批量执行的吞吐与延迟统计（延迟单位：秒）"""
+
+    total: int
+    succeeded: int
+    failed: int
+    errors: int
+    wall_time: float
+    throughput: float
+    latency_mean: float
+    latency_p50: float
+    latency_p95: float
+    latency_max: float
+
+    @classmethod
+    def from_items(cls, items: list[BatchItemResult], wall_time: float) -> "BatchStats":
+        latencies = sorted(item.latency for item in items)
+
+        def percentile(p: float) -> float:
+            if not latencies:
+                return 0.0
+            return latencies[min(len(latencies) - 1, int(round(p * (len(latencies) - 1))))]
+
+        succeeded = sum(1 for item in items if item.success())
+        errors = sum(1 for item in items if item.error is not None)
+        return cls(
+            total=len(items),
+            succeeded=succeeded,
+            failed=len(items) - succeeded,
+            errors=errors,
+            wall_time=wall_time,
+            throughput=len(items) / wall_time if wall_time > 0 else 0.0,
+            latency_mean=statistics.fmean(latencies) if latencies else 0.0,
+            latency_p50=percentile(0.5),
+            latency_p95=percentile(0.95),
+            latency_max=latencies[-1] if latencies else 0.0,
+        )
+
+
+@dataclass(frozen=True)
+class BatchResult:
+    """按输入顺序排列的结果与统计"""
+
+    items: list[BatchItemResult]
+    stats: BatchStats
+
+
+class _Group:
+    """(语言, 依赖集合) 相同的一组请求，共享容器"""
+
+    def __init__(self, language: SupportedLanguage, dependencies: list[str] | None):
+        self.language = language
+        self.dependencies = dependencies
+        self.pending: deque[tuple[int, ExecutionRequest]] = deque()
+        self.active = 0
+
+
+class _Scheduler:
+    def __init__(self, requests: Iterable[ExecutionRequest]):
+        self._lock = threading.Lock()
+        groups: dict[tuple, _Group] = {}
+        for index, req in enumerate(requests):
+            deps = sorted(set(req.dependencies)) if req.dependencies else None
+            key = (req.language, tuple(deps or ()))
+            group = groups.get(key)
+            if group is None:
+                group = groups[key] = _Group(req.language, deps)
+            group.pending.append((index, req))
+        self.groups = list(groups.values())
+        self.total = sum(len(g.pending) for g in self.groups)
+        # 正在执行的请求 {run_id: 会话}，取消时据此结束容器内的进程
+        self.running: dict[str, SandboxSession] = {}
+        self.cancelled = False
+
+    def next_group(self) -> _Group | None:
+        """选择剩余请求最多、且已分配会话最少的组"""
+        with self._lock:
+            candidates = [g for g in self.groups if g.pending]
+            if not candidates:
+                return None
+            group = max(candidates, key=lambda g: len(g.pending) / (g.active + 1))
+            group.active += 1
+            return group
+
+    def next_item(self, group: _Group) -> tuple[int, ExecutionRequest] | None:
+        with self._lock:
+            if group.pending:
+                return group.pending.popleft()
+            return None
+
+    def leave(self, group: _Group) -> None:
+        with self._lock:
+            group.active -= 1
+
+    def start_run(self, run_id: str, session: SandboxSession) -> bool:
+        """登记即将开始的请求，已取消时返回 False"""
+        with self._lock:
+            if self.cancelled:
+                return False
+            self.running[run_id] = session
+            return True
+
+    def finish_run(self, run_id: str) -> None:
+        with self._lock:
+            self.running.pop(run_id, None)
+
+    def cancel(self) -> None:
+        """丢弃尚未开始的请求，并结束正在执行的请求"""
+        with self._lock:
+            self.cancelled = True
+            for group in self.groups:
+                group.pending.clear()
+            running = list(self.running.items())
+        for run_id, session in running:
+            try:
+                session.kill_run(run_id)
+            except Exception as e:
+                logger.warning(f"Failed to kill batch run {run_id}: {e}")
+
+
+def _run_group(group: _Group, scheduler: _Scheduler, backend_type: BackendType,
+               session_kwargs: dict, emit) -> None:
+    try:
+        with SandboxSession(
+                backend_type=backend_type,
+                language=group.language,
+                dependencies=group.dependencies,
+                **session_kwargs) as session:
+            first = True
+            while (item := scheduler.next_item(group)) is not None:
+                index, req = item
+                if not first:
+                    # 同一容器中依次执行，清理上一请求留下的文件；保留编译目录，相同源码与参数不重新编译
+                    try:
+                        session.backend.scrub_workspace(session.container, keep_build=True)
+                    except Exception as e:
+                        logger.warning(f"Failed to scrub workspace between batch items: {e}")
+                first = False
+                run_id = req.run_id or uuid.uuid4().hex
+                if not scheduler.start_run(run_id, session):
+                    break
+                start = time.perf_counter()
+                try:
+                    result = _run_request(session, req, run_id)
+                    emit(BatchItemResult(index, req, result=result, latency=time.perf_counter() - start))
+                except Exception as e:
+                    emit(BatchItemResult(index, req, error=f"{type(e).__name__}: {e}",
+                                         latency=time.perf_counter() - start))
+                finally:
+                    scheduler.finish_run(run_id)
+    except Exception as e:
+        # 会话创建失败：只让一个请求失败，其余请求留给后续重试的会话
+        logger.error(f"Batch session for {group.language} failed: {e}")
+        item = scheduler.next_item(group)
+        if item is not None:
+            emit(BatchItemResult(item[0], item[1], error=f"{type(e).__name__}: {e}"))
+
+
+def _run_request(session: SandboxSession, req: ExecutionRequest, run_id: str) -> CommandResult:
+    """经由会话执行请求，与直接调用 session.run_code 一样使用结果缓存并记录指标"""
+    return session.run_code(
+        req.code,
+        dependencies=req.dependencies,
+        files=req.files,
+        timeout=req.timeout,
+        plots=req.plots or False,
+        run_id=run_id,
+        compile_flags=req.compile_flags,
+        cpus=req.cpus,
+        memory=req.memory,
+        pids=req.pids,
+        max_output_bytes=req.max_output_bytes,
+        capture=req.capture,
+    )
+
+
+def _worker(scheduler: _Scheduler, backend_type: BackendType, session_kwargs: dict, emit) -> None:
+    try:
+        while (group := scheduler.next_group()) is not None:
+            try:
+                _run_group(group, scheduler, backend_type, session_kwargs, emit)
+            finally:
+                scheduler.leave(group)
+    finally:
+        # 无论正常结束还是异常退出都通知消费者，避免其一直等待不会到来的结果
+        emit(_WORKER_DONE)
+
+
+def run_batch_as_completed(
+        requests: Iterable[ExecutionRequest],
+        concurrency: int = 4,
+        backend_type: BackendType = BackendType.DOCKER,
+        **session_kwargs: Any) -> Iterator[BatchItemResult]:
+    """
+    并发执行一批请求，按完成顺序产出结果
+
+    请求按 (语言, 依赖集合) 分组，同组请求复用同一个会话的容器，最多同时打开 concurrency 个会话。
+    单个请求出错不会影响其他请求。session_kwargs 透传给 SandboxSession（如 pool）。
+    每个请求经由 session.run_code 执行，使用会话的结果缓存与指标。
+    调用方提前结束迭代（break 或异常）时立即返回：未开始的请求被丢弃，正在执行的请求被结束。
+    """
+    if concurrency < 1:
+        raise ValueError(f"concurrency must be >= 1, got {concurrency}")
+    scheduler = _Scheduler(requests)
+    results: queue.Queue = queue.Queue()
+    executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="sandbox-batch")
+    finished = False
+    try:
+        futures = [
+            executor.submit(_worker, scheduler, backend_type, session_kwargs, results.put)
+            for _ in range(min(concurrency, scheduler.total))
+        ]
+        remaining, running = scheduler.total, len(futures)
+        while remaining and running:
+            item = results.get()
+            if item is _WORKER_DONE:
+                running -= 1
+                continue
+            remaining -= 1
+            yield item
+        finished = True
+        # 工作线程中的异常（包括 BaseException）在这里抛出
+        for future in futures:
+            future.result()
+        if remaining:
+            raise RuntimeError(f"batch workers exited with {remaining} requests unfinished")
+    finally:
+        if not finished:
+            scheduler.cancel()
+        # 提前退出时不等待工作线程，其会话在后台关闭
+        executor.shutdown(wait=finished, cancel_futures=True)
+
+
+def run_batch(
+        requests: Iterable[ExecutionRequest],
+        concurrency: int = 4,
+        backend_type: BackendType = BackendType.DOCKER,
+        **session_kwargs: Any) -> BatchResult:
+    """
+    并发执行一批请求，返回按输入顺序排列的结果以及吞吐/延迟统计
+
+    参数同 run_batch_as_completed。
+    """
+    start = time.perf_counter()
+    items = sorted(
+        run_batch_as_completed(requests, concurrency=concurrency, backend_type=backend_type, **session_kwargs),
+        key=lambda item: item.index,
+    )
+    return BatchResult(items=items, stats=BatchStats.from_items(items, time.perf_counter() - start))
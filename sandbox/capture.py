@@ -0,0 +1,54 @@
+from collections import deque
+
+# 插入在保留的开头与结尾之间，标明中间被丢弃的字节数
+TRUNCATION_MARKER = "\n[... {dropped} bytes truncated ...]\n"
+
+
+class OutputBuffer:
+    """
+    只保留一个输出流的前 head_bytes 与后 tail_bytes 字节，中间的输出只计数
+
+    内存占用不超过 head_bytes + tail_bytes 加一个数据块，与程序的输出总量无关。
+    写入的文本已由增量解码器解码（非法字节替换为 U+FFFD），截断处被切开的字符在取值时丢弃。
+
+    :param head_bytes: 保留的开头字节数
+    :param tail_bytes: 保留的结尾字节数
+    """
+
+    def __init__(self, head_bytes: int, tail_bytes: int):
+        self.head_bytes = head_bytes
+        self.tail_bytes = tail_bytes
+        self.dropped = 0
+        self._head: list[bytes] = []
+        self._head_size = 0
+        self._tail: deque[bytes] = deque()
+        self._tail_size = 0
+
+    def write(self, text: str) -> None:
+        data = text.encode("utf-8")
+        room = self.head_bytes - self._head_size
+        if room > 0:
+            self._head.append(data[:room])
+            self._head_size += min(room, len(data))
+            data = data[room:]
+        if not data:
+            return
+        self._tail.append(data)
+        self._tail_size += len(data)
+        while self._tail and self._tail_size - len(self._tail[0]) >= self.tail_bytes:
+            self._drop(len(self._tail.popleft()))
+        excess = self._tail_size - self.tail_bytes
+        if excess > 0:
+            self._tail[0] = self._tail[0][excess:]
+            self._drop(excess)
+
+    def _drop(self, size: int) -> None:
+        self._tail_size -= size
+        self.dropped += size
+
+    def getvalue(self) -> str:
+        head, tail = b"".join(self._head), b"".join(self._tail)
+        if not self.dropped:
+            return (head + tail).decode("utf-8", errors="replace")
+        marker = TRUNCATION_MARKER.format(dropped=self.dropped)
+        return head.decode("utf-8", errors="ignore") + marker + tail.decode("utf-8", errors="ignore")
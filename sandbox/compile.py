@@ -0,0 +1,256 @@
+import hashlib
+import io
+import json
+import os
+import re
+import tarfile
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Iterator
+from sandbox.const import SupportedLanguage
+from sandbox.data import ExecutionRequest, CommandResult, CompiledResult, StreamEvent, StreamType
+from sandbox.util import logger
+
+# 容器内的编译目录：/sandbox/.build/<key>/src 放源码，out 放编译产物
+BUILD_ROOT = "/sandbox/.build"
+
+
+@dataclass(frozen=True)
+class CompileSpec:
+    """
+    编译型语言的编译与运行命令模板
+
+    模板中的 {src} 为源码文件，{out} 为产物目录，{main} 为 Java 主类名
+    """
+
+    source_name: str
+    compile: list[str]
+    run: list[str]
+    default_flags: tuple[str, ...] = ()
+
+
+COMPILE_SPECS: dict[SupportedLanguage, CompileSpec] = {
+    SupportedLanguage.CPP: CompileSpec(
+        source_name="main.cpp",
+        compile=["g++", "{flags}", "-o", "{out}/main", "{src}"],
+        run=["{out}/main"],
+        default_flags=("-O2", "-std=c++17"),
+    ),
+    SupportedLanguage.JAVA: CompileSpec(
+        source_name="{main}.java",
+        compile=["javac", "{flags}", "-d", "{out}", "{src}"],
+        run=["java", "-cp", "{out}", "{main}"],
+    ),
+    SupportedLanguage.GO: CompileSpec(
+        source_name="main.go",
+        compile=["go", "build", "{flags}", "-o", "{out}/main", "{src}"],
+        run=["{out}/main"],
+    ),
+}
+
+_JAVA_CLASS = re.compile(r"public\s+(?:final\s+|abstract\s+)*class\s+(\w+)")
+
+
+def compile_key(image_digest: str, language: SupportedLanguage, flags: list[str], source: str) -> str:
+    """编译产物的内容地址：(编译器镜像 digest, 语言, 编译参数, 源码哈希)"""
+    payload = json.dumps([image_digest, str(language), list(flags), hashlib.sha256(source.encode("utf-8")).hexdigest()])
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _expand(template: list[str], flags: list[str], **values: str) -> list[str]:
+    command = []
+    for part in template:
+        if part == "{flags}":
+            command.extend(flags)
+        else:
+            command.append(part.format(**values))
+    return command
+
+
+def _rebase_tar(data: bytes, prefix: str) -> bytes:
+    """把 tar 成员重新放到 prefix 之下（prefix 相对于容器根目录）"""
+    src, dst = io.BytesIO(data), io.BytesIO()
+    with tarfile.open(fileobj=src, mode="r:") as tin, tarfile.open(fileobj=dst, mode="w") as tout:
+        for member in tin.getmembers():
+            fileobj = tin.extractfile(member) if member.isfile() else None
+            member.name = f"{prefix.strip('/')}/{member.name}"
+            tout.addfile(member, fileobj)
+    return dst.getvalue()
+
+
+def build_failure_events(result: CommandResult) -> Iterator[StreamEvent]:
+    """编译失败时以流式事件产出编译器输出与退出码"""
+    if result.stdout:
+        yield StreamEvent(stream=StreamType.STDOUT, data=result.stdout)
+    if result.stderr:
+        yield StreamEvent(stream=StreamType.STDERR, data=result.stderr)
+    yield StreamEvent(stream=StreamType.EXIT, exit_code=result.exit_code, usage=result.usage)
+
+
+class ArtifactCache:
+    """
+    宿主机上的编译产物缓存
+
+    每个产物是编译目录 out 的 tar，按最近访问时间做 LRU 淘汰，总大小不超过 disk_budget。
+
+    :param cache_dir: 缓存目录
+    :param disk_budget: 总大小上限（字节）
+    """
+
+    def __init__(self, cache_dir: str | os.PathLike | None = None, disk_budget: int = 2 * 1024 ** 3):
+        self.cache_dir = Path(cache_dir or Path.home() / ".cache" / "sandbox" / "artifacts")
+        self.disk_budget = disk_budget
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> bytes | None:
+        path = self.cache_dir / f"{key}.tar"
+        with self._lock:
+            try:
+                data = path.read_bytes()
+                os.utime(path)
+            except OSError:
+                return None
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        with self._lock:
+            try:
+                self.cache_dir.mkdir(parents=True, exist_ok=True)
+                path = self.cache_dir / f"{key}.tar"
+                tmp = path.with_suffix(".tmp")
+                tmp.write_bytes(data)
+                os.replace(tmp, path)
+                self._evict()
+            except OSError as e:
+                logger.warning(f"Failed to save compiled artifact: {e}")
+
+    def _evict(self) -> None:
+        entries = []
+        for path in self.cache_dir.glob("*.tar"):
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries, key=lambda entry: entry[0]):
+            if total <= self.disk_budget:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+
+@dataclass(frozen=True)
+class Build:
+    """编译阶段的结果：command 为 None 表示编译失败（含编译超时或输出超限），result 为编译器输出"""
+
+    command: list[str] | None
+    result: CommandResult
+    compile_time: float = 0.0
+    cached: bool = False
+
+
+class Compiler:
+    """
+    编译型语言（C++/Java/Go）的编译阶段
+
+    编译一次后运行产物；产物按 (编译器镜像 digest, 编译参数, 源码哈希) 缓存在容器内与宿主机上，
+    命中时跳过编译，直接运行已有的二进制或 class 文件。
+
+    :param backend: DockerBackend / K8sBackend（需实现 execute_with_limits、upload_files、
+        upload_archive、download_archive、image_digest、install_dependencies）
+    :param cache: 宿主机产物缓存，为 None 时只复用容器内已编译的产物
+    """
+
+    def __init__(self, backend: Any, cache: ArtifactCache | None = None):
+        self.backend = backend
+        self.cache = cache
+        # 容器 id / Pod 名称 -> 容器内已存在的产物 key
+        self._built: dict[str, set[str]] = {}
+
+    @staticmethod
+    def supports(language: SupportedLanguage) -> bool:
+        return language in COMPILE_SPECS
+
+    def build(self, container: Any, req: ExecutionRequest) -> Build:
+        """上传源码并编译（或复用缓存的产物），返回运行命令（未按 run_id 包装）"""
+        spec = COMPILE_SPECS[req.language]
+        if req.dependencies:
+            self.backend.install_dependencies(container, req.language, req.dependencies)
+        flags = list(spec.default_flags if req.compile_flags is None else req.compile_flags)
+        match = _JAVA_CLASS.search(req.code)
+        main = match.group(1) if match else "Main"
+        digest = self.backend.image_digest(container)
+        key = compile_key(digest, req.language, flags, req.code)
+        build_dir = f"{BUILD_ROOT}/{key[:32]}"
+        values = {"src": f"{build_dir}/src/{spec.source_name.format(main=main)}", "out": f"{build_dir}/out", "main": main}
+        command = _expand(spec.run, flags, **values)
+
+        built = self._built.setdefault(_container_key(container), set())
+        if key in built:
+            self.backend.upload_files(container, req.files or {})
+            return Build(command=command, result=CommandResult(), cached=True)
+
+        archive = self.cache.get(key) if self.cache is not None and digest else None
+        if archive is not None:
+            self.backend.upload_archive(container, _rebase_tar(archive, build_dir))
+            self.backend.upload_files(container, req.files or {})
+            built.add(key)
+            logger.info(f"Compiled artifact cache hit: {key[:12]}")
+            return Build(command=command, result=CommandResult(), cached=True)
+
+        self.backend.upload_files(container, {**(req.files or {}), values["src"]: req.code})
+        start = time.monotonic()
+        compile_command = ["sh", "-c", 'mkdir -p "$0" && exec "$@"', values["out"], *_expand(spec.compile, flags, **values)]
+        # 编译与运行使用同一请求的 run_id、超时与输出上限，编译卡住或输出过多时同样会被结束
+        result = self.backend.execute_with_limits(container, compile_command, req, phase="compile")
+        compile_time = time.monotonic() - start
+        if result.exit_code:
+            return Build(command=None, result=result, compile_time=compile_time)
+        built.add(key)
+        if self.cache is not None and digest:
+            try:
+                self.cache.put(key, self.backend.download_archive(container, values["out"]))
+            except Exception as e:
+                logger.warning(f"Failed to cache compiled artifact: {e}")
+        return Build(command=command, result=result, compile_time=compile_time)
+
+    def run(self, container: Any, req: ExecutionRequest) -> CompiledResult:
+        """编译（或命中缓存）后运行，编译耗时与运行耗时分别返回"""
+        build = self.build(container, req)
+        if build.command is None:
+            return CompiledResult(
+                exit_code=build.result.exit_code,
+                stdout=build.result.stdout,
+                stderr=build.result.stderr,
+                status=build.result.status,
+                usage=build.result.usage,
+                stdout_dropped=build.result.stdout_dropped,
+                stderr_dropped=build.result.stderr_dropped,
+                compile_time=build.compile_time,
+            )
+        start = time.monotonic()
+        result = self.backend.execute_with_limits(container, build.command, req)
+        return CompiledResult(
+            exit_code=result.exit_code,
+            stdout=result.stdout,
+            stderr=result.stderr,
+            status=result.status,
+            usage=result.usage,
+            stdout_dropped=result.stdout_dropped,
+            stderr_dropped=result.stderr_dropped,
+            compile_time=build.compile_time,
+            run_time=time.monotonic() - start,
+            compile_cached=build.cached,
+        )
+
+    def forget(self, container: Any) -> None:
+        """容器被删除或清理工作目录后调用"""
+        self._built.pop(_container_key(container), None)
+
+
+def _container_key(container: Any) -> str:
+    # docker 容器以 id 区分，K8s Pod 以名称区分
+    return getattr(container, "id", None) or container.metadata.name
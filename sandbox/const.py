@@ -34,7 +34,8 @@ class DefaultImage(StrEnum):
     # TODO 添加更多语言
     PYTHON = "ghcr.io/advanture917/sandbox/python:latest"
     GO = "golang:1.17-alpine"
-    JAVA = "openjdk:11-jre-slim"
+    # 编译型语言在容器内编译，需要 JDK 而不是 JRE
+    JAVA = "openjdk:11-jdk-slim"
     JAVASCRIPT = "node:16-alpine"
     CPP = "gcc:latest"
     RUBY = "ruby:3.0-alpine"
@@ -1,9 +1,13 @@
 # data.py
+import base64
 from enum import StrEnum
 import json
+import uuid
 import warnings
-from dataclasses import dataclass, field
+from dataclasses import asdict, dataclass, field
+from typing import BinaryIO, Iterable
 from sandbox.const import SupportedLanguage
+from sandbox.capture import OutputBuffer
 class FileType(StrEnum):
     # 定义返回的文件类型
     PNG = "png"
@@ -16,20 +20,79 @@ class FileType(StrEnum):
     HTML = "html"
 
 
+@dataclass(frozen=True)
+class Artifact:
+    r"""Represents a generated file saved in the local artifact store.
+
+    Attributes:
+        name (str): Path of the file relative to /sandbox in the container.
+        path (str): Local path of the file, under the session's directory of the store.
+        size (int): Size in bytes.
+        digest (str): SHA-256 hex digest of the content; files with the same digest share storage.
+    """
+
+    name: str
+    path: str
+    size: int
+    digest: str
+
+    def __fspath__(self) -> str:
+        return self.path
+
+    def open(self) -> BinaryIO:
+        r"""Open the local copy for reading; the content is only read when requested."""
+        return open(self.path, "rb")
+
+    def read(self) -> bytes:
+        with self.open() as f:
+            return f.read()
+
+    def handle(self) -> dict:
+        r"""The wire representation: name, size and digest, without the host-local path."""
+        return {"name": self.name, "size": self.size, "digest": self.digest}
+
+
 @dataclass(frozen=True)
 class PlotOutput:
     """
     定义绘图代码的返回
     format: FileType 返回的图表类型 : PNG JPEG SVG等
-    img_base64: str encode img by base64
+    img_base64: str encode img by base64，超过内联大小的图表为空字符串
     width: int | None = None
     height: int | None = None
+    artifact: Artifact | None 超过内联大小的图表保存到本地文件仓库后的句柄，内容在 read 时才读取
     """
 
     format: FileType
     img_base64: str
     width: int | None = None
     height: int | None = None
+    artifact: Artifact | None = None
+
+    def read(self) -> bytes:
+        """图片内容，内联的图表解码 base64，否则读取本地文件"""
+        if self.img_base64 or self.artifact is None:
+            return base64.b64decode(self.img_base64)
+        return self.artifact.read()
+
+
+@dataclass(frozen=True)
+class PlotCapture:
+    """
+    运行结束时自动捕获图表（目前支持 matplotlib）的配置
+    format: 图片格式
+    dpi: DPI 上限
+    max_width / max_height: 图片的最大像素宽高，超出时按比例降低 DPI
+    inline_bytes: 不超过该大小的图片以 base64 内联返回，更大的图片保存到文件仓库
+    directory: 容器内保存图片与清单的目录，会话为每次运行生成
+    """
+
+    format: FileType = FileType.PNG
+    dpi: int = 100
+    max_width: int = 2000
+    max_height: int = 2000
+    inline_bytes: int = 256 * 1024
+    directory: str | None = None
 
 
 @dataclass(frozen=True)
@@ -75,28 +138,67 @@ class ConsoleOutput:
         """
         return not self.exit_code
 
-    def to_json(self, include_plots: bool = False) -> str:
+    def to_json(self, include_plots: bool = False, indent: int | None = None) -> str:
         r"""Get the JSON representation of the execution result.
 
         Args:
             include_plots (bool): Whether to include the plots in the JSON representation.
+            indent (int | None): Indentation for human-readable output; compact (no whitespace) by default.
 
         Returns:
             str: The JSON representation of the execution result.
 
         """
-        result = self.__dict__.copy()
+        result = asdict(self)
         if not include_plots and "plots" in result:
             result.pop("plots", None)
 
-        return json.dumps(result, indent=2)
+        if indent is None:
+            return json.dumps(result, separators=(",", ":"), ensure_ascii=False)
+        return json.dumps(result, indent=indent, ensure_ascii=False)
+
+@dataclass(frozen=True)
+class OutputCapture:
+    """
+    收集输出时每个流（stdout、stderr 分别计算）的保留上限，内存占用与程序的输出总量无关
+    head_bytes: 保留的开头字节数
+    tail_bytes: 保留的结尾字节数（资源用量写在 stderr 末尾，需要落在结尾内）
+    """
+
+    head_bytes: int = 4 * 1024 * 1024
+    tail_bytes: int = 1024 * 1024
+
 
 @dataclass
 class ExecutionRequest:
     code: str
     language: SupportedLanguage =SupportedLanguage.PYTHON
     dependencies: list[str] | None = None
-    # timeout: int = 30
+    # 随代码一起上传的辅助文件 {容器内路径: 内容}，相对路径放到 /sandbox 下
+    files: dict[str, bytes | str] | None = None
+    # 运行标识，设置后可通过 backend.kill_run 结束容器内的进程
+    run_id: str | None = None
+    # 编译型语言（C++/Java/Go）的编译参数，为 None 时使用默认参数
+    compile_flags: list[str] | None = None
+    # 墙钟超时（秒），超时后结束进程，结果 status 为 TIMED_OUT
+    timeout: float | None = None
+    # CPU 配额（核数）、内存上限（字节）与进程数上限
+    cpus: float | None = None
+    memory: int | None = None
+    pids: int | None = None
+    # stdout 与 stderr 合计的最大字节数，超出后结束进程，结果 status 为 OUTPUT_LIMIT_EXCEEDED
+    max_output_bytes: int | None = None
+    # 仅 Python：运行结束时捕获未关闭的图表，图片与清单写入 plots.directory，见 sandbox.plots
+    plots: PlotCapture | None = None
+    # stdout / stderr 各自保留的开头与结尾字节数，中间的输出丢弃并计数；为 None 时使用 OutputCapture 的默认值
+    capture: OutputCapture | None = None
+    # 资源用量尾部标记中的随机串，每个请求各不相同，程序输出无法伪造用量
+    usage_nonce: str = field(default_factory=lambda: uuid.uuid4().hex, repr=False, compare=False)
+
+    @property
+    def limited(self) -> bool:
+        """是否设置了需要在运行期间监控的限制"""
+        return self.timeout is not None or self.max_output_bytes is not None
 
 @dataclass
 class ExeGenFileRequest:
@@ -104,6 +206,69 @@ class ExeGenFileRequest:
     language: SupportedLanguage =SupportedLanguage.PYTHON
     dependencies: list[str] | None = None
     file_path :list[str] | str = None
+    files: dict[str, bytes | str] | None = None
+    # 取回文件时的压缩方式（None / gzip / zstd），以及解压后总大小上限（字节）
+    compression: str | None = None
+    max_bytes: int | None = None
+    # 运行标识，可通过 kill_run 结束运行中的进程
+    run_id: str | None = None
+    # 墙钟超时（秒）与 stdout/stderr 合计的输出上限（字节），同 ExecutionRequest
+    timeout: float | None = None
+    max_output_bytes: int | None = None
+class RunStatus(StrEnum):
+    # 执行结束的方式
+    COMPLETED = "completed"
+    TIMED_OUT = "timed_out"
+    OUTPUT_LIMIT_EXCEEDED = "output_limit_exceeded"
+
+
+class StreamType(StrEnum):
+    # 流式输出事件的类型
+    STDOUT = "stdout"
+    STDERR = "stderr"
+    EXIT = "exit"
+
+
+@dataclass(frozen=True)
+class ResourceUsage:
+    r"""Represents the resources consumed by one run.
+
+    Attributes:
+        wall_time (float): Wall-clock seconds of the run (10 ms resolution).
+        cpu_user (float): User CPU seconds of the run and the processes it waited for.
+        cpu_system (float): System CPU seconds of the run and the processes it waited for.
+        peak_rss (int | None): Peak memory of the container cgroup in bytes. This is the peak since
+            the container started, so it is an upper bound for the run. None when the cgroup is not readable.
+        bytes_written (int | None): Bytes passed to write() by the run, including stdout/stderr.
+        processes (int | None): Number of processes spawned by the run, including the main process.
+            Concurrent execs in the same container are counted as well.
+    """
+
+    wall_time: float = 0.0
+    cpu_user: float = 0.0
+    cpu_system: float = 0.0
+    peak_rss: int | None = None
+    bytes_written: int | None = None
+    processes: int | None = None
+
+
+@dataclass(frozen=True)
+class StreamEvent:
+    r"""Represents one chunk of streamed execution output.
+
+    Attributes:
+        stream (StreamType): STDOUT / STDERR for output chunks, EXIT for the final event.
+        data (str): The decoded output chunk, empty for the EXIT event.
+        exit_code (int | None): The exit code, only set on the EXIT event.
+        usage (ResourceUsage | None): Resources used by the run, only set on the EXIT event.
+    """
+
+    stream: StreamType
+    data: str = ""
+    exit_code: int | None = None
+    usage: ResourceUsage | None = None
+
+
 @dataclass(frozen=True)
 class CommandResult:
     r"""Represents the result of a command execution.
@@ -112,11 +277,64 @@ class CommandResult:
         exit_code (int): The exit code of the executed command. 0 typically indicates success.
         stdout (str): The content written to the standard output stream.
         stderr (str): The content written to the standard error stream.
+        status (RunStatus): COMPLETED, or why the command was killed by the sandbox.
+        usage (ResourceUsage | None): Resources used by the run, None when not measured.
+        stdout_dropped (int): Bytes dropped from the middle of stdout by the capture limits;
+                              the kept head and tail are joined by a truncation marker.
+        stderr_dropped (int): Same for stderr.
     """
 
     exit_code: int = 0
     stdout: str = ""
     stderr: str = ""
+    status: RunStatus = RunStatus.COMPLETED
+    usage: ResourceUsage | None = None
+    stdout_dropped: int = 0
+    stderr_dropped: int = 0
+
+    @property
+    def timed_out(self) -> bool:
+        return self.status == RunStatus.TIMED_OUT
+
+    @property
+    def truncated(self) -> bool:
+        return bool(self.stdout_dropped or self.stderr_dropped)
+
+    @classmethod
+    def from_stream(cls, events: Iterable[StreamEvent], capture: OutputCapture | None = None) -> "CommandResult":
+        r"""Collect streamed events into a single CommandResult, keeping only the head and tail of each stream."""
+        capture = capture or OutputCapture()
+        stdout = OutputBuffer(capture.head_bytes, capture.tail_bytes)
+        stderr = OutputBuffer(capture.head_bytes, capture.tail_bytes)
+        exit_code, usage = 0, None
+        for event in events:
+            if event.stream == StreamType.STDOUT:
+                stdout.write(event.data)
+            elif event.stream == StreamType.STDERR:
+                stderr.write(event.data)
+            elif event.stream == StreamType.EXIT:
+                exit_code = event.exit_code or 0
+                usage = event.usage
+        return cls(exit_code=exit_code, stdout=stdout.getvalue(), stderr=stderr.getvalue(), usage=usage,
+                   stdout_dropped=stdout.dropped, stderr_dropped=stderr.dropped)
+
+
+@dataclass(frozen=True)
+class CompiledResult(CommandResult):
+    r"""Represents the result of compiling and running a program in a compiled language.
+
+    When compilation fails, `exit_code`/`stdout`/`stderr` come from the compiler and
+    `run_time` is 0.
+
+    Attributes:
+        compile_time (float): Seconds spent compiling, 0 when the cached artifact was used.
+        run_time (float): Seconds spent running the compiled program.
+        compile_cached (bool): Whether the compiled artifact came from the artifact cache.
+    """
+
+    compile_time: float = 0.0
+    run_time: float = 0.0
+    compile_cached: bool = False
 
 
 @dataclass(frozen=True)
@@ -129,7 +347,23 @@ class ExecutionResult(ConsoleOutput):
     Attributes:
         plots (list[PlotOutput]): A list of `PlotOutput` objects, each representing a
                                     captured plot or visual artifact. Defaults to an empty list.
+        status (RunStatus): COMPLETED, or why the code was killed by the sandbox.
+        usage (ResourceUsage | None): Resources used by the run, None when not measured.
+        stdout_dropped (int): Bytes dropped from the middle of stdout by the capture limits.
+        stderr_dropped (int): Bytes dropped from the middle of stderr by the capture limits.
 
     """
 
     plots: list[PlotOutput] = field(default_factory=list)
+    status: RunStatus = RunStatus.COMPLETED
+    usage: ResourceUsage | None = None
+    stdout_dropped: int = 0
+    stderr_dropped: int = 0
+
+    @property
+    def timed_out(self) -> bool:
+        return self.status == RunStatus.TIMED_OUT
+
+    @property
+    def truncated(self) -> bool:
+        return bool(self.stdout_dropped or self.stderr_dropped)
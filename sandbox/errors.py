@@ -18,4 +18,11 @@ class ImageNotFoundError(SandboxError):
 
     def __init__(self, image: str) -> None:
         """Initialize the ImageNotFoundError."""
-        super().__init__(f"Image {image} not found")
\ No newline at end of file
+        super().__init__(f"Image {image} not found")
+
+class ArtifactTooLargeError(SandboxError):
+    """Raised when the generated files exceed the size limit."""
+
+    def __init__(self, max_bytes: int) -> None:
+        """Initialize the ArtifactTooLargeError."""
+        super().__init__(f"Generated files exceed {max_bytes} bytes")
@@ -0,0 +1,158 @@
+import itertools
+import threading
+import uuid
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Any
+from sandbox.data import CommandResult, OutputCapture, RunStatus
+from sandbox.errors import BackendError
+from sandbox.runtime import FrameChannel, script_command
+from sandbox.util import logger
+
+# fork server 默认预先导入的模块，镜像中不存在的模块会被忽略
+DEFAULT_PRELOAD_MODULES = ["numpy", "pandas", "matplotlib", "matplotlib.pyplot"]
+
+
+class ForkServer:
+    """
+    容器内的 fork server（zygote）运行器
+
+    父进程启动时预先导入 preload 中的模块，每次运行 fork 出一个新的子进程执行代码，
+    子进程之间互相隔离、写时复制共享父进程已导入模块的内存，启动开销只剩一次 fork。
+    支持多个线程并发调用 run。
+
+    :param backend: DockerBackend / K8sBackend（需实现 open_channel、upload_files）
+    :param container: 运行 fork server 的容器
+    :param preload: 预先导入的模块列表
+    """
+
+    def __init__(self, backend: Any, container: Any, preload: list[str] | None = None):
+        self.backend = backend
+        self.container = container
+        self.preload = DEFAULT_PRELOAD_MODULES if preload is None else preload
+        self.preloaded: list[str] = []
+        self._channel: FrameChannel | None = None
+        self._send_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._pending: dict[int, Future] = {}
+        self._ids = itertools.count(1)
+        self._reader: threading.Thread | None = None
+        # run_id -> 运行中的消息 id；_cancelled 为子进程启动前收到的取消，启动时生效
+        self._runs: dict[str, int] = {}
+        self._cancelled: set[str] = set()
+        self._runs_lock = threading.Lock()
+
+    def start(self, timeout: float = 60.0) -> "ForkServer":
+        """启动 fork server，等待模块预导入完成"""
+        with self._start_lock:
+            if self._channel is not None:
+                return self
+            environment = {"SANDBOX_PRELOAD": ",".join(self.preload), "MPLBACKEND": "Agg"}
+            channel = FrameChannel(self.backend.open_channel(
+                self.container, script_command("forkserver"), environment=environment
+            ))
+            try:
+                ready = channel.recv(timeout)
+            except Exception:
+                channel.close()
+                raise
+            self.preloaded = ready.get("preloaded", [])
+            self._channel = channel
+            self._reader = threading.Thread(target=self._read_loop, args=(channel,), daemon=True,
+                                            name="sandbox-forkserver-reader")
+            self._reader.start()
+            logger.info(f"Fork server started, preloaded={self.preloaded}")
+        return self
+
+    def run(self, code: str, files: dict[str, bytes | str] | None = None,
+            timeout: float | None = None, run_id: str | None = None,
+            capture: OutputCapture | None = None) -> CommandResult:
+        """
+        在新 fork 出的子进程中运行代码
+
+        子进程的 stdout/stderr 分别捕获，每个流只保留 capture 指定的开头与结尾，退出码原样返回（被信号结束时为 128+信号值）。
+        超时或以 run_id 调用 kill 后 kill 子进程所在的进程组；kill 在子进程启动前到达时不再运行，直接以 137 返回。
+        """
+        self.start()
+        # 相对路径：上传时放到 /sandbox 下，fork server 的工作目录同样是 /sandbox
+        path = f"code_{uuid.uuid4().hex}.py"
+        self.backend.upload_files(self.container, {**(files or {}), path: code})
+
+        message_id = next(self._ids)
+        future: Future = Future()
+        capture = capture or OutputCapture()
+        # 登记与发送在同一把锁内，kill 要么在此之前被记为取消，要么在运行消息之后发出
+        with self._runs_lock:
+            if run_id in self._cancelled:
+                self._cancelled.discard(run_id)
+                logger.info(f"Fork server run {run_id} cancelled before start")
+                return CommandResult(exit_code=137)
+            self._pending[message_id] = future
+            if run_id:
+                self._runs[run_id] = message_id
+            self._send({"op": "run", "id": message_id, "path": path,
+                        "capture": [capture.head_bytes, capture.tail_bytes]})
+        status = RunStatus.COMPLETED
+        try:
+            reply = future.result(timeout)
+        except FutureTimeoutError:
+            logger.warning(f"Fork server run timed out after {timeout}s, killing child")
+            status = RunStatus.TIMED_OUT
+            self._send({"op": "kill", "target": message_id})
+            reply = future.result(10)
+        finally:
+            if run_id:
+                with self._runs_lock:
+                    self._runs.pop(run_id, None)
+        return CommandResult(
+            exit_code=reply.get("exit_code", 0),
+            stdout=reply.get("stdout", ""),
+            stderr=reply.get("stderr", ""),
+            status=status,
+            stdout_dropped=reply.get("stdout_dropped", 0),
+            stderr_dropped=reply.get("stderr_dropped", 0),
+        )
+
+    def kill(self, run_id: str) -> None:
+        """结束以 run_id 运行的子进程（可在其他线程中调用）；子进程尚未启动时记为取消，以该 run_id 运行时直接返回"""
+        with self._runs_lock:
+            message_id = self._runs.get(run_id)
+            if message_id is None:
+                self._cancelled.add(run_id)
+                return
+            self._send({"op": "kill", "target": message_id})
+
+    def shutdown(self) -> None:
+        """关闭 fork server，仍在运行的子进程会被结束"""
+        channel = self._channel
+        if channel is None:
+            return
+        try:
+            self._send({"op": "shutdown"})
+        except Exception as e:
+            logger.warning(f"Failed to shutdown fork server: {e}")
+        self._channel = None
+        channel.close()
+
+    def _send(self, message: dict) -> None:
+        if self._channel is None:
+            raise BackendError("fork server is not running")
+        with self._send_lock:
+            self._channel.send(message)
+
+    def _read_loop(self, channel: FrameChannel) -> None:
+        """按 id 把回复分发给对应的调用方"""
+        error: Exception | None = None
+        while True:
+            try:
+                reply = channel.recv()
+            except Exception as e:
+                error = e
+                break
+            future = self._pending.pop(reply.get("id"), None)
+            if future is not None:
+                future.set_result(reply)
+        if self._channel is channel:
+            self._channel = None
+        for future in list(self._pending.values()):
+            future.set_exception(BackendError(f"fork server exited: {error}"))
+        self._pending.clear()
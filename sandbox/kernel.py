@@ -0,0 +1,111 @@
+import itertools
+from typing import Any
+from sandbox.data import CommandResult, OutputCapture, RunStatus
+from sandbox.errors import BackendError
+from sandbox.runtime import FrameChannel, script_command
+from sandbox.util import logger
+
+
+class PythonKernel:
+    """
+    容器内常驻的有状态 Python kernel
+
+    kernel 进程在容器内长期运行，代码单元在同一个命名空间中依次执行，变量与已导入的模块
+    在多次执行之间保留，每次执行只需一次消息往返，无需重新启动解释器。
+
+    :param backend: DockerBackend / K8sBackend（需实现 open_channel、execute_command）
+    :param container: 运行 kernel 的容器
+    """
+
+    def __init__(self, backend: Any, container: Any):
+        self.backend = backend
+        self.container = container
+        self.pid: int | None = None
+        self._channel: FrameChannel | None = None
+        self._ids = itertools.count(1)
+
+    @property
+    def alive(self) -> bool:
+        return self._channel is not None
+
+    def start(self, timeout: float = 30.0) -> "PythonKernel":
+        """启动 kernel 进程，等待其就绪"""
+        if self._channel is not None:
+            return self
+        channel = FrameChannel(self.backend.open_channel(self.container, script_command("kernel")))
+        try:
+            ready = channel.recv(timeout)
+        except Exception:
+            channel.close()
+            raise
+        self.pid = ready.get("pid")
+        self._channel = channel
+        logger.info(f"Python kernel started (pid={self.pid})")
+        return self
+
+    def execute(self, code: str, timeout: float | None = None, capture: OutputCapture | None = None) -> CommandResult:
+        """
+        在 kernel 中执行一个代码单元
+
+        超时后先尝试中断；中断后仍无响应则重启 kernel，此时命名空间丢失。
+        每个输出流在容器内只保留 capture 指定的开头与结尾，回复大小与输出总量无关。
+        """
+        self.start()
+        capture = capture or OutputCapture()
+        message_id = next(self._ids)
+        status = RunStatus.COMPLETED
+        try:
+            self._channel.send({"op": "execute", "id": message_id, "code": code,
+                                "capture": [capture.head_bytes, capture.tail_bytes]})
+            reply = self._channel.recv(timeout)
+        except TimeoutError:
+            logger.warning(f"Kernel cell timed out after {timeout}s, interrupting")
+            status = RunStatus.TIMED_OUT
+            self.interrupt()
+            try:
+                reply = self._channel.recv(5.0)
+            except TimeoutError:
+                self.restart()
+                return CommandResult(exit_code=137, stderr=f"cell timed out after {timeout}s, kernel restarted",
+                                     status=status)
+        except BackendError:
+            # kernel 进程已退出（例如用户代码调用了 os._exit），下次执行时重新启动
+            self._close()
+            raise
+        return CommandResult(
+            exit_code=reply.get("exit_code", 0),
+            stdout=reply.get("stdout", ""),
+            stderr=reply.get("stderr", ""),
+            status=status,
+            stdout_dropped=reply.get("stdout_dropped", 0),
+            stderr_dropped=reply.get("stderr_dropped", 0),
+        )
+
+    def interrupt(self) -> None:
+        """向 kernel 发送 SIGINT，中断正在执行的代码单元"""
+        if self.pid is not None:
+            self.backend.execute_command(self.container, ["kill", "-INT", str(self.pid)])
+
+    def restart(self) -> "PythonKernel":
+        """结束当前 kernel 并启动新的 kernel，命名空间被清空"""
+        self.shutdown(force=True)
+        return self.start()
+
+    def shutdown(self, force: bool = False) -> None:
+        """关闭 kernel，force=True 时直接 kill 进程"""
+        if self._channel is None:
+            return
+        try:
+            if force and self.pid is not None:
+                self.backend.execute_command(self.container, ["kill", "-9", str(self.pid)])
+            else:
+                self._channel.send({"op": "shutdown"})
+        except Exception as e:
+            logger.warning(f"Failed to shutdown kernel: {e}")
+        self._close()
+
+    def _close(self) -> None:
+        if self._channel is not None:
+            self._channel.close()
+        self._channel = None
+        self.pid = None
@@ -0,0 +1,133 @@
+import os
+import re
+import socket
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any
+from sandbox.util import logger
+
+
+def owner_id() -> str:
+    """当前进程的所有者标识：<主机名>-<pid>，同时满足 docker 与 K8s 标签值的格式要求"""
+    host = re.sub(r"[^A-Za-z0-9]", "", socket.gethostname())[:40] or "host"
+    return f"{host}-{os.getpid()}"
+
+
+def owner_alive(owner: str) -> bool | None:
+    """
+    判断所有者进程是否仍然存活
+
+    :return: 所有者在本机时返回进程是否存在；在其他主机或无法解析时返回 None（只能依赖 TTL）
+    """
+    host, _, pid = owner.rpartition("-")
+    if not pid.isdigit() or host != owner_id().rpartition("-")[0]:
+        return None
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+@dataclass(frozen=True)
+class SandboxResource:
+    """
+    后端中由沙箱创建的一个资源（docker 容器 / K8s Deployment / 预热池 Pod）
+
+    Attributes:
+        kind: 资源类型
+        name: 资源名称
+        session_id: 所属会话
+        owner: 创建（或租用）该资源的进程，见 owner_id
+        created: 创建时间（unix 时间戳）
+        ttl: 资源自身声明的存活时间（秒），为 None 时使用回收器的默认值
+        handle: 后端删除资源时使用的原始对象
+    """
+
+    kind: str
+    name: str
+    session_id: str = ""
+    owner: str = ""
+    created: float | None = None
+    ttl: float | None = None
+    handle: Any = None
+
+
+def parse_float(value: str | None) -> float | None:
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+class GarbageCollector:
+    """
+    沙箱资源回收器
+
+    定期扫描各后端中带有沙箱标签的资源，所有者进程已不存在的资源被批量删除，
+    用于清理崩溃的工作进程遗留的容器与 Deployment。所有者在其他主机等无法判断存活的资源超过 TTL 后删除；
+    所有者仍存活的资源（包括使用超过 TTL 的会话与预热池容器）不会被删除。
+
+    :param backends: 需要扫描的后端（实现 list_sandbox_resources、remove_resources）
+    :param ttl: 资源未声明 TTL 时的默认存活时间（秒）
+    :param interval: 后台扫描的间隔（秒）
+    :param reap_dead_owners: 是否删除所有者进程（仅能判断本机进程）已退出的资源
+    """
+
+    def __init__(self, backends: list[Any], ttl: float = 3600.0, interval: float = 60.0,
+                 reap_dead_owners: bool = True):
+        self.backends = backends
+        self.ttl = ttl
+        self.interval = interval
+        self.reap_dead_owners = reap_dead_owners
+        self.removed = 0
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def is_garbage(self, resource: SandboxResource, now: float | None = None) -> bool:
+        now = time.time() if now is None else now
+        alive = owner_alive(resource.owner) if resource.owner else None
+        if alive is False:
+            return self.reap_dead_owners
+        # 所有者仍存活时资源可能正被会话或预热池使用，TTL 只用于无法判断所有者的资源（其他主机、无标签）
+        if alive:
+            return False
+        ttl = resource.ttl if resource.ttl is not None else self.ttl
+        return resource.created is not None and now - resource.created > ttl
+
+    def sweep(self) -> int:
+        """扫描一次，返回删除的资源数量"""
+        removed = 0
+        now = time.time()
+        for backend in self.backends:
+            try:
+                garbage = [r for r in backend.list_sandbox_resources() if self.is_garbage(r, now)]
+                if garbage:
+                    logger.info(f"Collecting {len(garbage)} leaked sandbox resources: {[r.name for r in garbage]}")
+                    removed += backend.remove_resources(garbage)
+            except Exception as e:
+                logger.error(f"Garbage collection failed for {type(backend).__name__}: {e}")
+        self.removed += removed
+        return removed
+
+    def start(self) -> "GarbageCollector":
+        """启动后台扫描线程"""
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True, name="sandbox-gc")
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.sweep()
+            self._stop.wait(self.interval)
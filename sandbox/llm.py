@@ -15,9 +15,12 @@ class SandboxLLM:
         base_url: str = "",
         api_key: str = "",
         language: SupportedLanguage = SupportedLanguage.PYTHON,
+        stateful: bool = False,
     ):
         self.backend_type = backend_type
         self.language = language
+        # 重试之间复用同一个 kernel，已导入的模块不必重复导入
+        self.stateful = stateful
         self.llm = ChatOpenAI(
             model_name=model_name, base_url=base_url, api_key=api_key, temperature=0
         )
@@ -100,7 +103,7 @@ class SandboxLLM:
     ) -> CommandResult:
         result = None
         with SandboxSession(
-            backend_type=self.backend_type, language=self.language
+            backend_type=self.backend_type, language=self.language, stateful=self.stateful
         ) as sb:
             for attempt in range(max_retries + 1):
                 raw_output = self._generate_code(task, result, expected_output)
@@ -0,0 +1,173 @@
+import json
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Callable
+from sandbox.const import SupportedLanguage
+from sandbox.util import logger
+
+# 列出镜像中已安装包的命令，输出由 parse_manifest 解析
+MANIFEST_COMMANDS = {
+    SupportedLanguage.PYTHON: "pip list --format=freeze 2>/dev/null",
+    SupportedLanguage.JAVASCRIPT: "{ npm ls -g --depth=0 --parseable --long; npm ls --depth=0 --parseable --long; } 2>/dev/null",
+    SupportedLanguage.RUBY: "gem list --local 2>/dev/null",
+    SupportedLanguage.GO: "go list -m all 2>/dev/null",
+}
+
+
+def _normalize(language: SupportedLanguage, name: str) -> str:
+    if language == SupportedLanguage.PYTHON:
+        # PEP 503 名称规范化
+        return re.sub(r"[-_.]+", "-", name).lower()
+    return name
+
+
+def parse_manifest(language: SupportedLanguage, output: str) -> dict[str, str]:
+    """将 MANIFEST_COMMANDS 的输出解析为 {包名: 版本}"""
+    manifest: dict[str, str] = {}
+    for line in output.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        match language:
+            case SupportedLanguage.PYTHON:
+                name, _, version = line.partition("==")
+            case SupportedLanguage.JAVASCRIPT:
+                # /usr/local/lib/node_modules/lodash:lodash@4.17.21:...
+                parts = line.split(":")
+                if len(parts) < 2:
+                    continue
+                name, _, version = parts[1].rpartition("@")
+            case SupportedLanguage.RUBY:
+                # rake (13.0.3, 12.3.3)
+                m = re.match(r"^(\S+) \(([^)]*)\)", line)
+                if not m:
+                    continue
+                name, version = m.group(1), m.group(2).replace("default: ", "").split(",")[0].strip()
+            case SupportedLanguage.GO:
+                name, _, version = line.partition(" ")
+            case _:
+                continue
+        if name:
+            manifest[_normalize(language, name)] = version.strip()
+    return manifest
+
+
+def split_requirement(language: SupportedLanguage, requirement: str) -> tuple[str, str | None, bool]:
+    """
+    拆分依赖声明
+
+    :return: (规范化包名, 精确版本, 是否带有无法在本地判断的版本约束)
+    """
+    req = requirement.strip()
+    match language:
+        case SupportedLanguage.PYTHON:
+            m = re.match(r"^([A-Za-z0-9][A-Za-z0-9._-]*)(\[[^\]]*\])?\s*(.*)$", req)
+            if not m:
+                return req, None, True
+            name, spec = m.group(1), m.group(3).strip()
+            if not spec:
+                return _normalize(language, name), None, False
+            if spec.startswith("==") and "," not in spec and "*" not in spec:
+                return _normalize(language, name), spec[2:].strip(), False
+            return _normalize(language, name), None, True
+        case SupportedLanguage.JAVASCRIPT | SupportedLanguage.GO:
+            # lodash@4.17.21 / @scope/pkg@1.0.0 / github.com/x/y@v1.2.3
+            name, sep, version = req[1:].rpartition("@") if req.startswith("@") else req.rpartition("@")
+            if not sep:
+                return req, None, False
+            if req.startswith("@"):
+                name = "@" + name
+            if version in ("latest", ""):
+                return name, None, True
+            return name, version, False
+        case SupportedLanguage.RUBY:
+            name, sep, version = req.partition(":")
+            return name, (version or None), False
+        case _:
+            return req, None, True
+
+
+def normalize_requirement(language: SupportedLanguage, requirement: str) -> str:
+    """依赖声明的规范形式（Python 包名按 PEP 503 规范化、去掉空白），写法不同的同一依赖得到相同结果"""
+    req = requirement.strip()
+    if language == SupportedLanguage.PYTHON:
+        m = re.match(r"^([A-Za-z0-9][A-Za-z0-9._-]*)(\[[^\]]*\])?\s*(.*)$", req)
+        if m:
+            return _normalize(language, m.group(1)) + (m.group(2) or "").lower() + re.sub(r"\s+", "", m.group(3))
+    return req
+
+
+def missing_dependencies(language: SupportedLanguage, requested: list[str], manifest: dict[str, str]) -> list[str]:
+    """对比清单，返回仍需安装的依赖（保持原始声明形式）"""
+    missing = []
+    for requirement in requested:
+        name, version, unresolved = split_requirement(language, requirement)
+        installed = manifest.get(name)
+        if installed is None or unresolved:
+            missing.append(requirement)
+        elif version is not None and installed.split(",")[0].strip() != version:
+            missing.append(requirement)
+    return missing
+
+
+class ManifestCache:
+    """
+    镜像已安装包清单缓存
+
+    每个 (镜像 digest, 语言) 只在容器内列出一次已安装包，结果保存在内存与宿主机磁盘上，
+    run_code 据此只安装真正缺失的依赖。
+
+    :param cache_dir: 清单在宿主机上的缓存目录
+    """
+
+    def __init__(self, cache_dir: str | os.PathLike | None = None):
+        self.cache_dir = Path(cache_dir or Path.home() / ".cache" / "sandbox" / "manifests")
+        self._lock = threading.Lock()
+        self._manifests: dict[str, dict[str, str]] = {}
+
+    def get(self, digest: str, language: SupportedLanguage, loader: Callable[[str], str] | None) -> dict[str, str]:
+        """
+        获取镜像的已安装包清单
+
+        :param digest: 镜像 digest
+        :param loader: 缓存未命中时调用，参数为列包命令，返回命令输出；为 None 时未命中直接返回空清单
+        """
+        if language not in MANIFEST_COMMANDS or not digest:
+            return {}
+        key = f"{digest.replace(':', '_').replace('/', '_')}-{language}"
+        with self._lock:
+            manifest = self._manifests.get(key)
+            if manifest is None:
+                manifest = self._load(key)
+            if manifest is None:
+                if loader is None:
+                    return {}
+                try:
+                    manifest = parse_manifest(language, loader(MANIFEST_COMMANDS[language]))
+                except Exception as e:
+                    logger.warning(f"Failed to build package manifest for {digest}: {e}")
+                    return {}
+                self._save(key, manifest)
+                logger.info(f"Built package manifest for {digest} ({language}): {len(manifest)} packages")
+            self._manifests[key] = manifest
+        return manifest
+
+    def _load(self, key: str) -> dict[str, str] | None:
+        try:
+            with open(self.cache_dir / f"{key}.json", "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def _save(self, key: str, manifest: dict[str, str]) -> None:
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            path = self.cache_dir / f"{key}.json"
+            tmp = path.with_suffix(".tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(manifest, f)
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning(f"Failed to save package manifest: {e}")
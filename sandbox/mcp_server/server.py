@@ -1,13 +1,23 @@
+import base64
+import os
 from fastmcp import FastMCP
 from sandbox.util import logger
 from sandbox.errors import BackendError
 from sandbox.session import SandboxSession
 from sandbox.const import SupportedLanguage
+from sandbox.wire import to_wire
+from sandbox.artifacts import default_artifact_store
 from typing import List, Optional
 import sandbox.errors
 # test
 # npx @modelcontextprotocol/inspector python -m sandbox.mcp_server.server
 mcp = FastMCP("LLM-Sandbox")
+# 大的输出与图片保存在这里，由 fetch_artifact 按摘要读取
+store = default_artifact_store()
+# fetch_artifact 单次返回的最大字节数
+FETCH_LIMIT = 1024 * 1024
+
+
 @mcp.tool
 def run_code_in_sandbox(
         code: str,
@@ -28,18 +38,23 @@ def run_code_in_sandbox(
         file_paths (List[str], 可选): 运行过程中需要生成或读取的文件路径。
             - 如果代码写入文件，则传入文件路径数组（如 ["test1.txt"]）
             - 沙箱执行后会自动将这些文件保存到宿主机可访问目录，并返回路径。
+
+    返回:
+        执行结果；超过 64 KB 的 stdout/stderr 为空字符串，句柄（name、size、digest）在 refs 中，
+        大图片在 plots[i].artifact 中，完整内容用 fetch_artifact(digest) 读取。
     """
     import time
     try:
         # 进入沙箱上下文
-        with SandboxSession(language=SupportedLanguage[language]) as sb:
+        with SandboxSession(language=SupportedLanguage[language], artifact_store=store) as sb:
             # 执行代码
             result = sb.run_code(
                 code=code,
                 dependencies=libraries or [],
                 # file_path="test1.txt"
             )
-        return result
+        # 大的输出与图片以句柄（名称、大小、摘要）返回，内容通过 fetch_artifact 按需读取
+        return to_wire(result, store=sb.artifact_store, namespace=sb.session_id)
         # file_paths = "test1.txt"
     except Exception as e:
         raise BackendError(f"backend error {e}")
@@ -50,5 +65,35 @@ def run_code_in_sandbox(
     # }
     return result
 
+
+@mcp.tool
+def fetch_artifact(digest: str, offset: int = 0, length: int = FETCH_LIMIT) -> dict:
+    """
+    读取 run_code_in_sandbox 结果中以句柄返回的内容（refs 中的 stdout/stderr 或图片的 artifact）。
+
+    参数:
+        digest (str): 句柄中的 digest
+        offset (int, 可选): 起始字节偏移，内容较大时分段读取
+        length (int, 可选): 读取的最大字节数，不超过 1 MiB
+    返回:
+        {"digest", "offset", "size": 总大小, "data_base64": 本段内容的 base64, "eof": 是否已读到结尾}
+    """
+    length = max(0, min(length, FETCH_LIMIT))
+    try:
+        f = store.open(digest)
+    except (ValueError, FileNotFoundError) as e:
+        raise BackendError(f"artifact not found: {digest}") from e
+    with f:
+        size = os.fstat(f.fileno()).st_size
+        f.seek(max(0, offset))
+        data = f.read(length)
+    return {
+        "digest": digest,
+        "offset": offset,
+        "size": size,
+        "data_base64": base64.b64encode(data).decode("ascii"),
+        "eof": offset + len(data) >= size,
+    }
+
 if __name__ == "__main__":
     mcp.run(transport= "stdio")
\ No newline at end of file
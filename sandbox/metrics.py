@@ -0,0 +1,201 @@
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Iterator
+
+# 各生命周期阶段耗时直方图的默认分桶（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+PHASE_LABELS = ("phase", "backend", "language")
+
+_NOOP = nullcontext()
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Counter:
+    """按标签值分组的单调递增计数"""
+
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, label_names: tuple[str, ...]):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self._lock = threading.Lock()
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def get(self, *labels: str) -> float:
+        return self._values.get(labels, 0.0)
+
+    def expose(self) -> Iterator[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            yield f"{self.name}{_format_labels(self.label_names, labels)} {value}"
+
+
+class Histogram:
+    """按标签值分组的累积分桶直方图"""
+
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, label_names: tuple[str, ...],
+                 buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # 标签值 -> [各分桶计数..., 总和, 总数]
+        self._values: dict[tuple[str, ...], list[float]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [0.0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                state[index] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def count(self, *labels: str) -> int:
+        state = self._values.get(labels)
+        return int(state[-1]) if state else 0
+
+    def expose(self) -> Iterator[str]:
+        with self._lock:
+            items = sorted((labels, list(state)) for labels, state in self._values.items())
+        for labels, state in items:
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                le = _format_labels(self.label_names, labels, f'le="{bound}"')
+                yield f"{self.name}_bucket{le} {cumulative}"
+            inf = _format_labels(self.label_names, labels, 'le="+Inf"')
+            yield f"{self.name}_bucket{inf} {state[-1]}"
+            yield f"{self.name}_sum{_format_labels(self.label_names, labels)} {state[-2]}"
+            yield f"{self.name}_count{_format_labels(self.label_names, labels)} {state[-1]}"
+
+
+class MetricsRegistry:
+    """
+    进程内的指标注册表
+
+    记录沙箱各生命周期阶段（创建、启动、安装依赖、上传、执行、取回文件、停止、删除等）的耗时直方图与
+    成功/失败计数，标签为阶段、后端与语言。可通过本地 HTTP 端点抓取，或导出为 Prometheus 文本格式文件。
+    默认关闭，关闭时 phase() 直接返回空上下文，几乎没有开销。
+
+    :param enabled: 是否开启记录
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.phase_seconds = Histogram(
+            "sandbox_phase_duration_seconds", "Duration of sandbox lifecycle phases.", PHASE_LABELS
+        )
+        self.phase_total = Counter(
+            "sandbox_phase_total", "Number of sandbox lifecycle phases by outcome.", PHASE_LABELS + ("outcome",)
+        )
+        self._metrics: list[Counter | Histogram] = [self.phase_seconds, self.phase_total]
+        self._server: ThreadingHTTPServer | None = None
+
+    def register(self, metric: Counter | Histogram) -> Counter | Histogram:
+        """注册自定义指标，随注册表一起导出"""
+        self._metrics.append(metric)
+        return metric
+
+    def phase(self, phase: str, backend: str, language: str = ""):
+        """记录一个阶段耗时的上下文管理器"""
+        if not self.enabled:
+            return _NOOP
+        return self._timed(phase, str(backend), str(language or ""))
+
+    @contextmanager
+    def _timed(self, phase: str, backend: str, language: str):
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            yield
+            outcome = "ok"
+        finally:
+            self.phase_seconds.observe(time.perf_counter() - start, phase, backend, language)
+            self.phase_total.inc(phase, backend, language, outcome)
+
+    def expose(self) -> str:
+        """Prometheus 文本格式"""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.expose())
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path: str | os.PathLike) -> None:
+        """原子地写入文本文件（可供 node_exporter textfile collector 读取）"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        tmp.write_text(self.expose(), encoding="utf-8")
+        os.replace(tmp, path)
+
+    def serve(self, port: int = 9464, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+        """在后台线程中启动 /metrics HTTP 端点，port 为 0 时自动分配端口"""
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/metrics", "/"):
+                    self.send_error(404)
+                    return
+                body = registry.expose().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True, name="sandbox-metrics").start()
+        return self._server
+
+    def shutdown(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+# 进程内默认注册表，调用 REGISTRY.enabled = True 或 enable() 开启
+REGISTRY = MetricsRegistry()
+
+
+def enable(enabled: bool = True) -> MetricsRegistry:
+    REGISTRY.enabled = enabled
+    return REGISTRY
+
+
+def phase(name: str, backend: str, language: str = ""):
+    """在默认注册表中记录一个阶段的耗时"""
+    return REGISTRY.phase(name, backend, language)
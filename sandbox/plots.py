@@ -0,0 +1,69 @@
+import base64
+import json
+import posixpath
+import tarfile
+import uuid
+from typing import BinaryIO
+from sandbox.artifacts import ArtifactStore
+from sandbox.data import Artifact, FileType, PlotCapture, PlotOutput
+from sandbox.runtime import load_script
+from sandbox.util import logger
+
+# 容器内保存图表的根目录，每次运行使用其下独立的子目录，取回后由宿主机删除
+PLOTS_ROOT = "/sandbox/.plots"
+# 图表清单的文件名，与 runtime/plots.py 一致
+MANIFEST = "manifest.json"
+
+
+def plot_directory() -> str:
+    """为一次运行生成容器内的图表目录"""
+    return f"{PLOTS_ROOT}/{uuid.uuid4().hex}"
+
+
+def plot_command(file_path: str, capture: PlotCapture) -> list[str]:
+    """运行 Python 代码文件，结束时把未关闭的图表与清单写入 capture.directory"""
+    config = {
+        "format": str(capture.format),
+        "dpi": capture.dpi,
+        "max_width": capture.max_width,
+        "max_height": capture.max_height,
+        "directory": capture.directory or plot_directory(),
+    }
+    return ["python", "-c", load_script("plots"), json.dumps(config), file_path]
+
+
+def read_plots(archive: BinaryIO, capture: PlotCapture, store: ArtifactStore, namespace: str) -> list[PlotOutput]:
+    """
+    从取回的图表目录（tar 流）中读出清单与图片
+
+    不超过 inline_bytes 的图片以 base64 内联，更大的保存到文件仓库；没有生成图表时目录不存在，返回空列表。
+    """
+    manifest, images = [], {}
+    try:
+        with tarfile.open(fileobj=archive, mode="r|") as tar:
+            for member in tar:
+                if not member.isfile():
+                    continue
+                name = posixpath.basename(member.name)
+                f = tar.extractfile(member)
+                if name == MANIFEST:
+                    manifest = json.load(f)
+                elif member.size <= capture.inline_bytes:
+                    images[name] = base64.b64encode(f.read()).decode("ascii")
+                else:
+                    images[name] = store.put(namespace, member.name, f)
+    except tarfile.ReadError as e:
+        logger.info(f"No plots captured: {e}")
+        return []
+    plots = []
+    for entry in manifest:
+        image = images.get(entry["file"])
+        if image is None:
+            logger.warning(f"Plot {entry['file']} listed in manifest but missing")
+            continue
+        plots.append(PlotOutput(format=FileType(entry["format"]),
+                                img_base64=image if isinstance(image, str) else "",
+                                width=entry.get("width"),
+                                height=entry.get("height"),
+                                artifact=image if isinstance(image, Artifact) else None))
+    return plots
@@ -0,0 +1,341 @@
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Any
+from sandbox.backend.base import Backend
+from sandbox.const import SupportedLanguage
+from sandbox.errors import BackendError
+from sandbox.util import logger
+
+
+class ContainerPool:
+    """
+    按语言维护的预热容器池
+
+    池中的容器在创建后立即启动，会话通过 acquire 租用、release 归还，
+    从而避免每次会话都付出创建/启动/停止/删除容器的冷启动开销。
+
+    :param backend: 后端实例（需实现 create/start/stop/remove 以及 health_check、scrub_workspace）
+    :param language: 池中容器对应的语言
+    :param min_size: 空闲容器的目标数量，后台线程会持续补足
+    :param max_size: 池内容器总数上限（空闲 + 已租出 + 创建中）
+    :param refill_interval: 后台补充线程的检查间隔（秒）
+    :param container_kwargs: 透传给 backend.create_container 的其他参数
+    """
+
+    def __init__(
+            self,
+            backend: Backend,
+            language: SupportedLanguage = SupportedLanguage.PYTHON,
+            min_size: int = 1,
+            max_size: int = 4,
+            refill_interval: float = 1.0,
+            **container_kwargs: Any
+    ):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError(f"非法的池大小: min_size={min_size}, max_size={max_size}")
+        self.backend = backend
+        self.language = language
+        self.min_size = min_size
+        self.max_size = max_size
+        self.refill_interval = refill_interval
+        self.container_kwargs = container_kwargs
+
+        self._idle: deque = deque()
+        # 已租出、创建中的容器数量，与空闲容器一起受 max_size 约束
+        self._leased = 0
+        self._creating = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        self._wakeup = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def total(self) -> int:
+        return len(self._idle) + self._leased + self._creating
+
+    @property
+    def idle_count(self) -> int:
+        return len(self._idle)
+
+    def start(self, wait: bool = False) -> "ContainerPool":
+        """启动后台补充线程，wait=True 时同步预热到 min_size"""
+        if wait:
+            self._refill()
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._refill_loop,
+                name=f"sandbox-pool-{self.language}",
+                daemon=True,
+            )
+            self._thread.start()
+        return self
+
+    def acquire(self, timeout: float | None = 30.0) -> Any:
+        """
+        租用一个可用容器
+
+        优先复用空闲容器（健康检查不通过的直接丢弃）；没有空闲容器且未达上限时
+        同步创建一个；已达上限时等待其他会话归还，超时抛出 BackendError。
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._cond:
+                if self._closed:
+                    raise BackendError("container pool is closed")
+                container = None
+                if self._idle:
+                    container = self._idle.popleft()
+                    self._leased += 1
+                elif self.total < self.max_size:
+                    self._creating += 1
+                else:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise BackendError(f"acquire container timeout for language={self.language}")
+                    self._cond.wait(remaining)
+                    continue
+            # 池里空了，提醒后台线程补充
+            self._wakeup.set()
+
+            if container is None:
+                # 冷启动路径
+                try:
+                    container = self._new_container()
+                except Exception:
+                    with self._cond:
+                        self._creating -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self._creating -= 1
+                    self._leased += 1
+                return container
+
+            if self.backend.health_check(container):
+                return container
+            logger.warning(f"Discarding unhealthy pooled container for language={self.language}")
+            self._destroy(container)
+            with self._cond:
+                self._leased -= 1
+                self._cond.notify()
+
+    def release(self, container: Any, discard: bool = False) -> None:
+        """归还容器：清理 /sandbox 工作目录后放回池中，清理失败或池已关闭时销毁"""
+        keep = not discard and not self._closed
+        if keep:
+            try:
+                keep = self.backend.scrub_workspace(container)
+            except Exception as e:
+                logger.error(f"Failed to scrub container workspace: {e}")
+                keep = False
+        with self._cond:
+            self._leased -= 1
+            if keep and not self._closed:
+                self._idle.append(container)
+                container = None
+            self._cond.notify()
+        if container is not None:
+            self._destroy(container)
+            self._wakeup.set()
+
+    def close(self) -> None:
+        """关闭池并销毁所有空闲容器，已租出的容器在归还时销毁"""
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._cond.notify_all()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.refill_interval + 5)
+            self._thread = None
+        for container in idle:
+            self._destroy(container)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _refill_loop(self) -> None:
+        while not self._closed:
+            try:
+                self._refill()
+            except Exception as e:
+                logger.error(f"Container pool refill failed: {e}")
+            self._wakeup.wait(self.refill_interval)
+            self._wakeup.clear()
+
+    def _refill(self) -> None:
+        """补足空闲容器到 min_size，同时不超过 max_size"""
+        with self._cond:
+            deficit = min(self.min_size - len(self._idle) - self._creating,
+                          self.max_size - self.total)
+            if deficit <= 0 or self._closed:
+                return
+            self._creating += deficit
+        for _ in range(deficit):
+            container = None
+            try:
+                container = self._new_container()
+            except Exception as e:
+                logger.error(f"Failed to create pooled container: {e}")
+            with self._cond:
+                self._creating -= 1
+                if container is not None and not self._closed:
+                    self._idle.append(container)
+                    self._cond.notify()
+                    container = None
+            if container is not None:
+                self._destroy(container)
+
+    def _new_container(self) -> Any:
+        container = self.backend.create_container(lang=self.language, **self.container_kwargs)
+        try:
+            self.backend.start_container(container)
+        except Exception:
+            self._destroy(container)
+            raise
+        return container
+
+    def _destroy(self, container: Any) -> None:
+        try:
+            self.backend.teardown(container)
+        except Exception as e:
+            logger.error(f"Failed to remove pooled container: {e}")
+
+
+class K8sPodPool:
+    """
+    Kubernetes 的预热 Pod 池
+
+    空闲 Pod 的状态以标签形式保存在集群中，多个工作进程可以共享同一个池。
+    会话通过带 resourceVersion 的重新打标签原子地认领空闲 Pod，
+    同一个 Pod 不会被两个工作进程同时认领。
+
+    :param backend: K8sBackend 实例
+    :param language: 池中 Pod 对应的语言
+    :param target_size: 空闲 Pod（含启动中的）目标数量
+    :param recycle: 归还时是否清理后复用；为 False 时删除 Pod 并由后台补充
+    :param refill_interval: 后台补充线程的检查间隔（秒）
+    """
+
+    def __init__(
+            self,
+            backend: Backend,
+            language: SupportedLanguage = SupportedLanguage.PYTHON,
+            target_size: int = 2,
+            recycle: bool = True,
+            refill_interval: float = 2.0,
+    ):
+        if target_size < 0:
+            raise ValueError(f"非法的池大小: target_size={target_size}")
+        self.backend = backend
+        self.language = language
+        self.target_size = target_size
+        self.recycle = recycle
+        self.refill_interval = refill_interval
+
+        self._closed = False
+        self._wakeup = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self, wait: bool = False) -> "K8sPodPool":
+        """启动后台补充线程，wait=True 时先同步补充一次"""
+        if wait:
+            self._refill()
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._refill_loop,
+                name=f"sandbox-k8s-pool-{self.language}",
+                daemon=True,
+            )
+            self._thread.start()
+        return self
+
+    def acquire(self, timeout: float | None = 120.0) -> Any:
+        """
+        认领一个就绪的空闲 Pod
+
+        认领冲突时换下一个候选 Pod；没有就绪的空闲 Pod 时直接创建一个已认领的 Pod 并等待其就绪。
+        """
+        if self._closed:
+            raise BackendError("pod pool is closed")
+        session_id = uuid.uuid4().hex[:8]
+        for pod in self.backend.list_pool_pods(self.language, state="idle"):
+            if not self.backend._is_pod_ready(pod):
+                continue
+            claimed = self.backend.claim_pod(pod, session_id)
+            if claimed is not None:
+                self._wakeup.set()
+                self.backend.prime_manifest(claimed, self.language)
+                return claimed
+            logger.info(f"Pod {pod.metadata.name} claimed by another worker, trying next")
+
+        logger.info(f"No idle pod for language={self.language}, creating one")
+        self._wakeup.set()
+        pod = self.backend.create_pool_pod(self.language, state="claimed", session_id=session_id)
+        try:
+            pod = self.backend._wait_for_pod_running(
+                session_id, timeout=int(timeout) if timeout is not None else 100
+            )
+        except Exception:
+            self.backend.delete_pod(pod)
+            raise
+        self.backend.prime_manifest(pod, self.language)
+        return pod
+
+    def release(self, pod: Any, discard: bool = False) -> None:
+        """归还 Pod：recycle 模式下清理后重新标记为空闲，否则删除并由后台补充"""
+        keep = self.recycle and not discard and not self._closed
+        if keep:
+            try:
+                keep = self.backend.scrub_workspace(pod)
+                if keep:
+                    self.backend.return_pod(pod)
+            except Exception as e:
+                logger.error(f"Failed to recycle pod {pod.metadata.name}: {e}")
+                keep = False
+        if not keep:
+            try:
+                self.backend.delete_pod(pod)
+            except Exception as e:
+                logger.error(f"Failed to delete pod {pod.metadata.name}: {e}")
+            self._wakeup.set()
+
+    def close(self, drain: bool = False) -> None:
+        """停止后台补充；drain=True 时同时删除池中所有空闲 Pod"""
+        self._closed = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.refill_interval + 5)
+            self._thread = None
+        if drain:
+            for pod in self.backend.list_pool_pods(self.language, state="idle"):
+                self.backend.delete_pod(pod)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _refill_loop(self) -> None:
+        while not self._closed:
+            try:
+                self._refill()
+            except Exception as e:
+                logger.error(f"Pod pool refill failed: {e}")
+            self._wakeup.wait(self.refill_interval)
+            self._wakeup.clear()
+
+    def _refill(self) -> None:
+        """补足空闲（含启动中）Pod 到 target_size"""
+        idle = self.backend.list_pool_pods(self.language, state="idle")
+        for _ in range(self.target_size - len(idle)):
+            if self._closed:
+                return
+            self.backend.create_pool_pod(self.language)
@@ -0,0 +1,88 @@
+import atexit
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Any
+from sandbox.util import logger
+
+
+class Reaper:
+    """
+    后台回收容器的线程池
+
+    SandboxSession 退出时把容器交给 Reaper 后立即返回，删除在后台线程中进行，失败时按指数退避重试。
+    进程退出前会等待已提交的删除完成，避免遗留容器。
+
+    :param max_workers: 并发删除的线程数
+    :param retries: 单个容器删除失败后的最大重试次数
+    :param retry_delay: 首次重试前的等待时间（秒），之后每次翻倍
+    """
+
+    def __init__(self, max_workers: int = 4, retries: int = 3, retry_delay: float = 1.0):
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="sandbox-reaper")
+        self._lock = threading.Lock()
+        self._pending: set[Future] = set()
+        self.reaped = 0
+        self.failed = 0
+        atexit.register(self.shutdown)
+
+    @property
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def submit(self, backend: Any, container: Any) -> Future:
+        """提交一个待回收的容器，立即返回"""
+        future = self._executor.submit(self._reap, backend, container)
+        with self._lock:
+            self._pending.add(future)
+        future.add_done_callback(self._done)
+        return future
+
+    def drain(self, timeout: float | None = None) -> bool:
+        """等待已提交的回收全部完成，返回是否在超时前完成"""
+        with self._lock:
+            pending = list(self._pending)
+        _, not_done = wait(pending, timeout=timeout)
+        return not not_done
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
+
+    def _done(self, future: Future) -> None:
+        with self._lock:
+            self._pending.discard(future)
+
+    def _reap(self, backend: Any, container: Any) -> bool:
+        delay = self.retry_delay
+        for attempt in range(self.retries + 1):
+            try:
+                backend.teardown(container)
+                with self._lock:
+                    self.reaped += 1
+                return True
+            except Exception as e:
+                if attempt == self.retries:
+                    logger.error(f"Failed to reap container after {attempt + 1} attempts: {e}")
+                    break
+                logger.warning(f"Failed to reap container (attempt {attempt + 1}), retry in {delay}s: {e}")
+                time.sleep(delay)
+                delay *= 2
+        with self._lock:
+            self.failed += 1
+        return False
+
+
+_default_reaper: Reaper | None = None
+_default_lock = threading.Lock()
+
+
+def default_reaper() -> Reaper:
+    """进程内共享的 Reaper"""
+    global _default_reaper
+    with _default_lock:
+        if _default_reaper is None:
+            _default_reaper = Reaper()
+        return _default_reaper
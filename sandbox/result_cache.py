@@ -0,0 +1,173 @@
+import dataclasses
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any
+from sandbox.const import SupportedLanguage
+from sandbox.data import CommandResult, ExecutionResult, RunStatus
+from sandbox.util import logger
+from sandbox.wire import from_wire, to_wire
+
+
+class ResultCache:
+    """
+    内容寻址的执行结果缓存
+
+    键为 (语言, 镜像 digest, 代码哈希, 排序后的依赖, 输入文件哈希)，命中时直接返回保存的
+    CommandResult / ExecutionResult，不再访问容器。内存层按 LRU 保留 max_entries 条，
+    可选的磁盘层按最近访问时间淘汰，总大小不超过 disk_budget。
+
+    :param max_entries: 内存层最多保留的条目数
+    :param cache_dir: 磁盘层目录，为 None 时只使用内存层
+    :param disk_budget: 磁盘层总大小上限（字节）
+    :param deterministic_only: 为 True 时只缓存调用方标记为 deterministic 的执行
+    """
+
+    def __init__(
+            self,
+            max_entries: int = 1024,
+            cache_dir: str | os.PathLike | None = None,
+            disk_budget: int = 256 * 1024 ** 2,
+            deterministic_only: bool = False,
+    ):
+        self.max_entries = max_entries
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else None
+        self.disk_budget = disk_budget
+        self.deterministic_only = deterministic_only
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, CommandResult | ExecutionResult] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+
+    @staticmethod
+    def make_key(
+            language: SupportedLanguage,
+            image_digest: str,
+            code: str,
+            dependencies: list[str] | None = None,
+            files: dict[str, bytes | str] | None = None,
+            options: dict[str, Any] | None = None) -> str:
+        """
+        计算执行的内容地址
+
+        :param options: 其余会影响输出的请求参数（编译参数、超时、资源限制、输出上限等），值为 None 的项忽略
+        """
+        files_hash = hashlib.sha256()
+        for path, content in sorted((files or {}).items()):
+            data = content.encode("utf-8") if isinstance(content, str) else content
+            files_hash.update(f"{path}\0{hashlib.sha256(data).hexdigest()}\n".encode())
+        payload = json.dumps([
+            str(language),
+            image_digest,
+            hashlib.sha256(code.encode("utf-8")).hexdigest(),
+            sorted(set(dependencies or [])),
+            files_hash.hexdigest(),
+            {name: value for name, value in sorted((options or {}).items()) if value is not None},
+        ], default=_option_value)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def cacheable(self, result: CommandResult | ExecutionResult, deterministic: bool = False) -> bool:
+        """超时、输出超限或被信号结束（如被 kill）的执行结果不缓存"""
+        if self.deterministic_only and not deterministic:
+            return False
+        if getattr(result, "status", RunStatus.COMPLETED) != RunStatus.COMPLETED:
+            return False
+        return 0 <= result.exit_code < 128
+
+    def get(self, key: str) -> CommandResult | ExecutionResult | None:
+        with self._lock:
+            result = self._entries.get(key)
+            if result is not None:
+                self._entries.move_to_end(key)
+            else:
+                result = self._load(key)
+                if result is not None:
+                    self.disk_hits += 1
+                    self._remember(key, result)
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return result
+
+    def put(self, key: str, result: CommandResult | ExecutionResult) -> None:
+        with self._lock:
+            self._remember(key, result)
+            self._save(key, result)
+
+    def stats(self) -> dict[str, int]:
+        """命中/未命中计数"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "disk_hits": self.disk_hits,
+                "entries": len(self._entries),
+            }
+
+    def clear(self) -> None:
+        """清空内存层与磁盘层"""
+        with self._lock:
+            self._entries.clear()
+            if self.cache_dir is not None and self.cache_dir.is_dir():
+                for path in self.cache_dir.glob("*.json"):
+                    path.unlink(missing_ok=True)
+
+    def _remember(self, key: str, result: CommandResult | ExecutionResult) -> None:
+        self._entries[key] = result
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _load(self, key: str) -> CommandResult | ExecutionResult | None:
+        if self.cache_dir is None:
+            return None
+        path = self.cache_dir / f"{key}.json"
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            # 更新访问时间，磁盘层按 mtime 做 LRU 淘汰
+            os.utime(path)
+        except (OSError, json.JSONDecodeError):
+            return None
+        return from_wire(data)
+
+    def _save(self, key: str, result: CommandResult | ExecutionResult) -> None:
+        if self.cache_dir is None:
+            return
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            path = self.cache_dir / f"{key}.json"
+            tmp = path.with_suffix(".tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(to_wire(result), f, separators=(",", ":"), ensure_ascii=False)
+            os.replace(tmp, path)
+            self._evict()
+        except OSError as e:
+            logger.warning(f"Failed to save execution result: {e}")
+
+    def _evict(self) -> None:
+        entries = []
+        for path in self.cache_dir.glob("*.json"):
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries, key=lambda entry: entry[0]):
+            if total <= self.disk_budget:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+
+def _option_value(value: Any) -> Any:
+    """OutputCapture 等 dataclass 按字段参与键的计算"""
+    if dataclasses.is_dataclass(value):
+        return dataclasses.asdict(value)
+    raise TypeError(f"unsupported cache key option: {value!r}")
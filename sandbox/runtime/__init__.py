@@ -0,0 +1,12 @@
+# 在容器内运行的常驻进程脚本（只依赖标准库），以及宿主机与其通信的通道
+from pathlib import Path
+from sandbox.runtime.channel import ExecChannel, DockerExecChannel, K8sExecChannel, FrameChannel
+
+
+def load_script(name: str) -> str:
+    """读取容器内脚本源码，通过 python -c 启动，无需事先上传文件"""
+    return (Path(__file__).parent / f"{name}.py").read_text(encoding="utf-8")
+
+
+def script_command(name: str) -> list[str]:
+    return ["python", "-u", "-c", load_script(name)]
@@ -0,0 +1,159 @@
+# 容器内的执行代理，只依赖标准库
+# 每个容器只附着一次，之后通过长度前缀的 JSON 消息在一次往返内完成 写文件 -> 安装依赖 -> 运行 -> 收集文件
+import base64
+import glob
+import io
+import json
+import os
+import struct
+import subprocess
+import sys
+import tarfile
+import threading
+
+HEADER = struct.Struct(">I")
+READ_SIZE = 64 * 1024
+# 与 sandbox.capture 一致
+TRUNCATION_MARKER = "\n[... {dropped} bytes truncated ...]\n"
+# 每个输出流保留的 (开头, 结尾) 字节数，请求中未指定时使用
+DEFAULT_CAPTURE = (4 * 1024 * 1024, 1024 * 1024)
+
+
+def read_message(stream):
+    header = stream.read(HEADER.size)
+    if len(header) < HEADER.size:
+        return None
+    (size,) = HEADER.unpack(header)
+    return json.loads(stream.read(size))
+
+
+def write_message(stream, message):
+    payload = json.dumps(message).encode("utf-8")
+    stream.write(HEADER.pack(len(payload)) + payload)
+    stream.flush()
+
+
+def write_files(files):
+    for path, content in (files or {}).items():
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(base64.b64decode(content))
+
+
+def read_bounded(pipe, head_bytes, tail_bytes):
+    """读到 EOF，只保留开头 head_bytes 与结尾 tail_bytes 字节，返回 (文本, 丢弃的字节数)"""
+    head, tail, dropped = bytearray(), bytearray(), 0
+    while True:
+        chunk = pipe.read1(READ_SIZE)
+        if not chunk:
+            break
+        room = head_bytes - len(head)
+        if room > 0:
+            head += chunk[:room]
+            chunk = chunk[room:]
+        tail += chunk
+        if len(tail) > tail_bytes:
+            dropped += len(tail) - tail_bytes
+            del tail[:len(tail) - tail_bytes]
+    if not dropped:
+        return (bytes(head) + bytes(tail)).decode("utf-8", errors="replace"), 0
+    text = head.decode("utf-8", errors="replace") + TRUNCATION_MARKER.format(dropped=dropped) \
+        + tail.decode("utf-8", errors="replace")
+    return text, dropped
+
+
+def execute(command, workdir, capture):
+    head_bytes, tail_bytes = capture
+    proc = subprocess.Popen(command, cwd=workdir, stdin=subprocess.DEVNULL,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    outputs = {}
+
+    def drain(name, pipe):
+        with pipe:
+            outputs[name] = read_bounded(pipe, head_bytes, tail_bytes)
+
+    readers = [threading.Thread(target=drain, args=(name, pipe), daemon=True)
+               for name, pipe in (("stdout", proc.stdout), ("stderr", proc.stderr))]
+    for reader in readers:
+        reader.start()
+    for reader in readers:
+        reader.join()
+    return {
+        "exit_code": proc.wait(),
+        "stdout": outputs["stdout"][0],
+        "stderr": outputs["stderr"][0],
+        "stdout_dropped": outputs["stdout"][1],
+        "stderr_dropped": outputs["stderr"][1],
+    }
+
+
+def collect(path, st):
+    """与 docker get_archive 相同：返回只包含该文件的 tar 以及文件元信息（st 为读取前 stat 的结果）"""
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w") as tar:
+        tar.add(path, arcname=os.path.basename(path))
+    return {
+        "path": path,
+        "archive": base64.b64encode(buf.getvalue()).decode("ascii"),
+        "stat": {"name": os.path.basename(path), "size": st.st_size, "mode": st.st_mode, "mtime": st.st_mtime},
+    }
+
+
+def handle_run(message):
+    reply = {"install": None, "files": []}
+    write_files(message.get("files"))
+    workdir = message.get("workdir") or os.getcwd()
+    capture = message.get("capture") or DEFAULT_CAPTURE
+    if message.get("install"):
+        reply["install"] = execute(message["install"], workdir, capture)
+    reply.update(execute(message["command"], workdir, capture))
+    # collect 中可以包含通配符，没有匹配时按原路径收集（记录错误）
+    paths = [path for pattern in message.get("collect") or [] for path in sorted(glob.glob(pattern)) or [pattern]]
+    # 读取前先 stat，累计大小超过 max_bytes 时不再读取任何文件，回复大小不超过上限
+    budget = message.get("max_bytes")
+    for path in paths:
+        try:
+            st = os.stat(path)
+            if budget is not None:
+                if st.st_size > budget:
+                    reply["files"] = []
+                    reply["too_large"] = True
+                    break
+                budget -= st.st_size
+            reply["files"].append(collect(path, st))
+        except OSError as e:
+            reply["files"].append({"path": path, "error": str(e)})
+    return reply
+
+
+def main():
+    proto_in = os.fdopen(os.dup(0), "rb")
+    proto_out = os.fdopen(os.dup(1), "wb")
+    devnull = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(devnull, 0)
+    os.close(devnull)
+
+    workdir = os.environ.get("SANDBOX_WORKDIR", "/sandbox")
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+    write_message(proto_out, {"op": "ready", "pid": os.getpid()})
+
+    while True:
+        message = read_message(proto_in)
+        if message is None or message.get("op") == "shutdown":
+            break
+        try:
+            if message.get("op") == "run":
+                reply = handle_run(message)
+            elif message.get("op") == "ping":
+                reply = {}
+            else:
+                reply = {"error": f"unknown op {message.get('op')}"}
+        except Exception as e:
+            reply = {"error": f"{type(e).__name__}: {e}"}
+        reply["id"] = message.get("id")
+        write_message(proto_out, reply)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
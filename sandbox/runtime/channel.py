@@ -0,0 +1,153 @@
+import json
+import select
+import struct
+import time
+from typing import Any
+from sandbox.errors import BackendError
+
+# 帧格式：4 字节大端长度 + utf-8 JSON
+HEADER = struct.Struct(">I")
+# docker 非 tty 模式下的多路复用帧头：流类型(1B) + 3B 填充 + 4B 大端长度
+DOCKER_HEADER = struct.Struct(">BxxxI")
+
+
+class ExecChannel:
+    """容器内常驻进程的 stdin/stdout 字节通道"""
+
+    def send(self, data: bytes) -> None:
+        ...
+
+    def recv(self, timeout: float | None = None) -> bytes:
+        """读取一段 stdout 数据，进程退出时返回 b""，超时抛出 TimeoutError"""
+        ...
+
+    def stderr(self) -> str:
+        """进程迄今写入 stderr 的内容（用于排查进程异常退出）"""
+        ...
+
+    def close(self) -> None:
+        ...
+
+
+class DockerExecChannel(ExecChannel):
+    """基于 docker exec 附着 socket 的通道，需自行解析 stdout/stderr 多路复用帧"""
+
+    def __init__(self, client: Any, container: Any, command: list[str], environment: dict | None = None):
+        api = client.api
+        self.exec_id = api.exec_create(
+            container.id, cmd=command, stdin=True, stdout=True, stderr=True, tty=False,
+            environment=environment,
+        )["Id"]
+        self._io = api.exec_start(self.exec_id, socket=True)
+        self._sock = getattr(self._io, "_sock", self._io)
+        self._buf = bytearray()
+        self._stderr = bytearray()
+
+    def send(self, data: bytes) -> None:
+        self._sock.sendall(data)
+
+    def recv(self, timeout: float | None = None) -> bytes:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            if not self._fill(DOCKER_HEADER.size, deadline):
+                return b""
+            stream, size = DOCKER_HEADER.unpack_from(self._buf)
+            if not self._fill(DOCKER_HEADER.size + size, deadline):
+                return b""
+            payload = bytes(self._buf[DOCKER_HEADER.size:DOCKER_HEADER.size + size])
+            del self._buf[:DOCKER_HEADER.size + size]
+            if stream == 2:
+                self._stderr.extend(payload)
+            elif payload:
+                return payload
+
+    def _fill(self, n: int, deadline: float | None) -> bool:
+        while len(self._buf) < n:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            ready, _, _ = select.select([self._sock], [], [], remaining)
+            if not ready:
+                raise TimeoutError("timed out waiting for runtime output")
+            chunk = self._sock.recv(65536)
+            if not chunk:
+                return False
+            self._buf.extend(chunk)
+        return True
+
+    def stderr(self) -> str:
+        return self._stderr.decode("utf-8", errors="replace")
+
+    def close(self) -> None:
+        try:
+            self._io.close()
+        except Exception:
+            pass
+
+
+class K8sExecChannel(ExecChannel):
+    """基于 Kubernetes exec websocket 的通道，stdout/stderr 天然分属不同 channel"""
+
+    def __init__(self, resp: Any):
+        self._resp = resp
+        self._stderr = bytearray()
+
+    def send(self, data: bytes) -> None:
+        self._resp.write_stdin(data)
+
+    def recv(self, timeout: float | None = None) -> bytes:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            if self._resp.peek_stderr():
+                self._stderr.extend(self._resp.read_stderr())
+            if self._resp.peek_stdout():
+                return self._resp.read_stdout()
+            if not self._resp.is_open():
+                return b""
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                raise TimeoutError("timed out waiting for runtime output")
+            self._resp.update(timeout=remaining if remaining is not None else 1)
+
+    def stderr(self) -> str:
+        return self._stderr.decode("utf-8", errors="replace")
+
+    def close(self) -> None:
+        try:
+            self._resp.close()
+        except Exception:
+            pass
+
+
+class FrameChannel:
+    """在字节通道上收发长度前缀的 JSON 消息"""
+
+    def __init__(self, channel: ExecChannel):
+        self.channel = channel
+        self._buf = bytearray()
+
+    def send(self, message: dict) -> None:
+        payload = json.dumps(message).encode("utf-8")
+        self.channel.send(HEADER.pack(len(payload)) + payload)
+
+    def recv(self, timeout: float | None = None) -> dict:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        self._fill(HEADER.size, deadline)
+        (size,) = HEADER.unpack_from(self._buf)
+        self._fill(HEADER.size + size, deadline)
+        payload = bytes(self._buf[HEADER.size:HEADER.size + size])
+        del self._buf[:HEADER.size + size]
+        return json.loads(payload)
+
+    def request(self, message: dict, timeout: float | None = None) -> dict:
+        self.send(message)
+        return self.recv(timeout)
+
+    def _fill(self, n: int, deadline: float | None) -> None:
+        while len(self._buf) < n:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            chunk = self.channel.recv(remaining)
+            if not chunk:
+                raise BackendError(f"sandbox runtime exited: {self.channel.stderr()[-2000:]}")
+            self._buf.extend(chunk)
+
+    def close(self) -> None:
+        self.channel.close()
@@ -0,0 +1,172 @@
+# 容器内的 fork server（zygote），只依赖标准库
+# 父进程预先导入常用模块，每次运行 fork 出一个子进程执行代码文件，子进程之间写时复制共享内存
+import importlib
+import json
+import os
+import signal
+import struct
+import sys
+import tempfile
+import threading
+import traceback
+
+HEADER = struct.Struct(">I")
+# 与 sandbox.capture 一致
+TRUNCATION_MARKER = "\n[... {dropped} bytes truncated ...]\n"
+# 每个输出流保留的 (开头, 结尾) 字节数，请求中未指定时使用
+DEFAULT_CAPTURE = (4 * 1024 * 1024, 1024 * 1024)
+
+
+def read_bounded(f, head_bytes, tail_bytes):
+    """
+    与执行代理相同的开头/结尾截断：只读取临时文件的开头 head_bytes 与结尾 tail_bytes 字节
+
+    返回 (文本, 丢弃的字节数)；按位置读取，不论输出多大，内存与回复大小都有上限。
+    """
+    size = f.seek(0, os.SEEK_END)
+    f.seek(0)
+    if size <= head_bytes + tail_bytes:
+        return f.read().decode("utf-8", errors="replace"), 0
+    head = f.read(head_bytes)
+    f.seek(size - tail_bytes)
+    tail = f.read(tail_bytes) if tail_bytes else b""
+    dropped = size - head_bytes - tail_bytes
+    text = head.decode("utf-8", errors="replace") + TRUNCATION_MARKER.format(dropped=dropped) \
+        + tail.decode("utf-8", errors="replace")
+    return text, dropped
+
+
+def read_message(stream):
+    header = stream.read(HEADER.size)
+    if len(header) < HEADER.size:
+        return None
+    (size,) = HEADER.unpack(header)
+    return json.loads(stream.read(size))
+
+
+class Writer:
+    """多个等待子进程的线程共用同一个输出流"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.lock = threading.Lock()
+
+    def write(self, message):
+        payload = json.dumps(message).encode("utf-8")
+        with self.lock:
+            self.stream.write(HEADER.pack(len(payload)) + payload)
+            self.stream.flush()
+
+
+def preload(modules):
+    loaded = []
+    for name in modules:
+        try:
+            importlib.import_module(name)
+            loaded.append(name)
+        except Exception:
+            pass
+    return loaded
+
+
+def child(path, out, err, proto_fds):
+    """子进程：重定向输出后以 __main__ 身份运行代码文件，永不返回"""
+    exit_code = 0
+    try:
+        for fd in proto_fds:
+            os.close(fd)
+        os.setsid()
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        os.dup2(out.fileno(), 1)
+        os.dup2(err.fileno(), 2)
+        # fork 出来的子进程继承了父进程的随机数状态，重新播种
+        import random
+        random.seed()
+        if "numpy" in sys.modules:
+            sys.modules["numpy"].random.seed()
+        import runpy
+        sys.argv = [path]
+        try:
+            runpy.run_path(path, run_name="__main__")
+        except SystemExit as e:
+            exit_code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+        except BaseException:
+            traceback.print_exc()
+            exit_code = 1
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        finally:
+            os._exit(exit_code)
+
+
+def wait_child(pid, message_id, path, out, err, limits, running, writer):
+    _, status = os.waitpid(pid, 0)
+    running.pop(message_id, None)
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+    exit_code = os.waitstatus_to_exitcode(status)
+    if exit_code < 0:
+        exit_code = 128 - exit_code
+    outputs = []
+    for f in (out, err):
+        with f:
+            outputs.append(read_bounded(f, *limits))
+    (stdout, stdout_dropped), (stderr, stderr_dropped) = outputs
+    writer.write({"id": message_id, "exit_code": exit_code, "stdout": stdout, "stderr": stderr,
+                  "stdout_dropped": stdout_dropped, "stderr_dropped": stderr_dropped})
+
+
+def main():
+    proto_in = os.fdopen(os.dup(0), "rb")
+    proto_out = os.fdopen(os.dup(1), "wb")
+    devnull = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(devnull, 0)
+    os.close(devnull)
+    writer = Writer(proto_out)
+
+    workdir = os.environ.get("SANDBOX_WORKDIR", "/sandbox")
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+    sys.path.insert(0, workdir)
+    modules = [m for m in os.environ.get("SANDBOX_PRELOAD", "").split(",") if m]
+    loaded = preload(modules)
+    writer.write({"op": "ready", "pid": os.getpid(), "preloaded": loaded})
+
+    running = {}
+    while True:
+        message = read_message(proto_in)
+        if message is None or message.get("op") == "shutdown":
+            break
+        op, message_id = message.get("op"), message.get("id")
+        if op == "run":
+            out, err = tempfile.TemporaryFile(), tempfile.TemporaryFile()
+            pid = os.fork()
+            if pid == 0:
+                child(message["path"], out, err, (proto_in.fileno(), proto_out.fileno()))
+            running[message_id] = pid
+            limits = message.get("capture") or DEFAULT_CAPTURE
+            threading.Thread(
+                target=wait_child, args=(pid, message_id, message["path"], out, err, limits, running, writer),
+                daemon=True,
+            ).start()
+        elif op == "kill":
+            pid = running.get(message.get("target"))
+            if pid is not None:
+                try:
+                    os.killpg(pid, signal.SIGKILL)
+                except OSError:
+                    pass
+    for pid in list(running.values()):
+        try:
+            os.killpg(pid, signal.SIGKILL)
+        except OSError:
+            pass
+
+
+if __name__ == "__main__":
+    main()
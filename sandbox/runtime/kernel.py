@@ -0,0 +1,133 @@
+# 容器内常驻的 Python kernel，只依赖标准库
+# 通过 stdin/stdout 收发长度前缀的 JSON 消息，代码单元在同一个命名空间中依次执行
+import json
+import os
+import signal
+import struct
+import sys
+import tempfile
+import traceback
+
+HEADER = struct.Struct(">I")
+# 与 sandbox.capture 一致
+TRUNCATION_MARKER = "\n[... {dropped} bytes truncated ...]\n"
+# 每个输出流保留的 (开头, 结尾) 字节数，请求中未指定时使用
+DEFAULT_CAPTURE = (4 * 1024 * 1024, 1024 * 1024)
+
+
+def read_bounded(f, head_bytes, tail_bytes):
+    """
+    与执行代理相同的开头/结尾截断：只读取临时文件的开头 head_bytes 与结尾 tail_bytes 字节
+
+    返回 (文本, 丢弃的字节数)；按位置读取，不论输出多大，内存与回复大小都有上限。
+    """
+    size = f.seek(0, os.SEEK_END)
+    f.seek(0)
+    if size <= head_bytes + tail_bytes:
+        return f.read().decode("utf-8", errors="replace"), 0
+    head = f.read(head_bytes)
+    f.seek(size - tail_bytes)
+    tail = f.read(tail_bytes) if tail_bytes else b""
+    dropped = size - head_bytes - tail_bytes
+    text = head.decode("utf-8", errors="replace") + TRUNCATION_MARKER.format(dropped=dropped) \
+        + tail.decode("utf-8", errors="replace")
+    return text, dropped
+
+
+def read_message(stream):
+    header = stream.read(HEADER.size)
+    if len(header) < HEADER.size:
+        return None
+    (size,) = HEADER.unpack(header)
+    payload = stream.read(size)
+    return json.loads(payload)
+
+
+def write_message(stream, message):
+    payload = json.dumps(message).encode("utf-8")
+    stream.write(HEADER.pack(len(payload)) + payload)
+    stream.flush()
+
+
+def capture(func, limits=DEFAULT_CAPTURE):
+    """在 fd 级别重定向 stdout/stderr，子进程与 C 扩展的输出同样会被捕获，每个流只保留开头与结尾"""
+    out, err = tempfile.TemporaryFile(), tempfile.TemporaryFile()
+    sys.stdout.flush()
+    sys.stderr.flush()
+    saved = os.dup(1), os.dup(2)
+    os.dup2(out.fileno(), 1)
+    os.dup2(err.fileno(), 2)
+    try:
+        result = func()
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os.dup2(saved[0], 1)
+        os.dup2(saved[1], 2)
+        os.close(saved[0])
+        os.close(saved[1])
+    outputs = []
+    for f in (out, err):
+        with f:
+            outputs.append(read_bounded(f, *limits))
+    return result, outputs[0], outputs[1]
+
+
+def run_cell(code, namespace, limits=DEFAULT_CAPTURE):
+    def execute():
+        try:
+            exec(compile(code, "<cell>", "exec"), namespace)
+            return "ok", 0
+        except KeyboardInterrupt:
+            traceback.print_exc()
+            return "interrupted", 130
+        except SystemExit as e:
+            code_ = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+            return "ok" if code_ == 0 else "error", code_
+        except BaseException:
+            traceback.print_exc()
+            return "error", 1
+
+    (status, exit_code), (stdout, stdout_dropped), (stderr, stderr_dropped) = capture(execute, limits)
+    return {"status": status, "exit_code": exit_code, "stdout": stdout, "stderr": stderr,
+            "stdout_dropped": stdout_dropped, "stderr_dropped": stderr_dropped}
+
+
+def main():
+    # 协议独占原始的 stdin/stdout，用户代码的 input()/print() 不会干扰消息流
+    proto_in = os.fdopen(os.dup(0), "rb")
+    proto_out = os.fdopen(os.dup(1), "wb")
+    devnull = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(devnull, 0)
+    os.close(devnull)
+
+    workdir = os.environ.get("SANDBOX_WORKDIR", "/sandbox")
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+    sys.path.insert(0, os.getcwd())
+    namespace = {"__name__": "__main__", "__builtins__": __builtins__}
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    write_message(proto_out, {"op": "ready", "pid": os.getpid()})
+
+    while True:
+        try:
+            message = read_message(proto_in)
+        except KeyboardInterrupt:
+            # 中断信号在两次执行之间到达，忽略
+            continue
+        if message is None or message.get("op") == "shutdown":
+            break
+        if message.get("op") == "execute":
+            reply = run_cell(message.get("code", ""), namespace, message.get("capture") or DEFAULT_CAPTURE)
+        elif message.get("op") == "reset":
+            namespace.clear()
+            namespace.update({"__name__": "__main__", "__builtins__": __builtins__})
+            reply = {"status": "ok"}
+        else:
+            reply = {"status": "error", "stderr": f"unknown op {message.get('op')}"}
+        reply["id"] = message.get("id")
+        write_message(proto_out, reply)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# 运行 Python 代码文件并在结束时捕获未关闭的图表，只依赖标准库
+# 用法：python -c <本脚本> <JSON 配置> <代码文件> [参数...]
+# 图片与清单 manifest.json 写入 directory，由宿主机取回；不经过 stdout/stderr，不受输出上限与截断影响
+import io
+import json
+import os
+import runpy
+import shutil
+import sys
+
+MANIFEST = "manifest.json"
+
+
+def figure_dpi(fig, config):
+    """DPI 不超过上限，且输出的宽高不超过 max_width / max_height 像素"""
+    width, height = fig.get_size_inches()
+    dpi = min(fig.dpi, config["dpi"])
+    if width > 0:
+        dpi = min(dpi, config["max_width"] / width)
+    if height > 0:
+        dpi = min(dpi, config["max_height"] / height)
+    return dpi, int(width * dpi), int(height * dpi)
+
+
+def capture_matplotlib(config):
+    # 只处理用户代码已经导入的 pyplot，未使用 matplotlib 时不额外导入
+    plt = sys.modules.get("matplotlib.pyplot")
+    if plt is None:
+        return []
+    figures = []
+    for num in plt.get_fignums():
+        fig = plt.figure(num)
+        dpi, width, height = figure_dpi(fig, config)
+        buf = io.BytesIO()
+        fig.savefig(buf, format=config["format"], dpi=dpi)
+        figures.append((buf.getvalue(), width, height))
+    plt.close("all")
+    return figures
+
+
+# 其他绘图库可在此追加捕获函数，返回 [(图片数据, 宽, 高)]
+CAPTURES = [capture_matplotlib]
+
+
+def emit(config):
+    entries = []
+    for capture in CAPTURES:
+        try:
+            figures = capture(config)
+        except Exception as e:
+            sys.stderr.write(f"plot capture failed: {type(e).__name__}: {e}\n")
+            continue
+        for data, width, height in figures:
+            os.makedirs(config["directory"], exist_ok=True)
+            name = f"plot_{len(entries)}.{config['format']}"
+            with open(os.path.join(config["directory"], name), "wb") as f:
+                f.write(data)
+            entries.append({"file": name, "format": config["format"], "width": width, "height": height,
+                            "size": len(data)})
+    if entries:
+        with open(os.path.join(config["directory"], MANIFEST), "w", encoding="utf-8") as f:
+            json.dump(entries, f)
+
+
+def main():
+    config = json.loads(sys.argv[1])
+    sys.argv = sys.argv[2:]
+    sys.path.insert(0, os.path.dirname(os.path.abspath(sys.argv[0])))
+    os.environ.setdefault("MPLBACKEND", "Agg")
+    # 只清理本次运行的目录，同一容器中其他运行的图表目录可能尚未取回
+    shutil.rmtree(config["directory"], ignore_errors=True)
+    try:
+        runpy.run_path(sys.argv[0], run_name="__main__")
+    finally:
+        emit(config)
+
+
+main()
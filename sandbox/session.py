@@ -1,39 +1,106 @@
 import docker
-import os
 from sandbox.const import BackendType,SupportedLanguage
 from sandbox.backend.base import Backend, BackendFactory
 from sandbox.backend.docker import DockerBackend
 from sandbox.backend.k8s import K8sBackend
 from sandbox.errors import  BackendError,BackendNotAvailable
 from sandbox.util import logger
-from sandbox.data import ExecutionRequest, ExeGenFileRequest
-from typing import Any
-import io, tarfile
+from sandbox.data import Artifact, CommandResult, ExecutionRequest, ExecutionResult, ExeGenFileRequest, PlotCapture, StreamEvent
+from sandbox.pool import ContainerPool, K8sPodPool
+from sandbox.kernel import PythonKernel
+from sandbox.forkserver import ForkServer
+from sandbox.result_cache import ResultCache
+from sandbox.reaper import Reaper
+from sandbox import metrics
+from sandbox.artifacts import ArtifactStore, default_artifact_store
+from sandbox.plots import plot_directory, read_plots
+from sandbox.transfer import ChunkReader
+from typing import Any, Iterator
+import dataclasses
+import threading
+import uuid
 
 class SandboxSession:
     def __init__(
             self,
             backend_type:BackendType = BackendType.DOCKER,
-            language:SupportedLanguage = SupportedLanguage.PYTHON):
+            language:SupportedLanguage = SupportedLanguage.PYTHON,
+            pool: ContainerPool | K8sPodPool | None = None,
+            dependencies: list[str] | None = None,
+            stateful: bool = False,
+            forkserver: bool = False,
+            preload: list[str] | None = None,
+            agent: bool = False,
+            result_cache: ResultCache | None = None,
+            reaper: Reaper | None = None,
+            artifact_store: ArtifactStore | None = None):
+        """
+        :param pool: 可选的预热容器池（Docker 为 ContainerPool，K8s 为 K8sPodPool），
+            提供时从池中租用容器，退出时归还而不是销毁
+        :param dependencies: 会话预期使用的依赖，后端配置了快照仓库时据此选择依赖快照镜像
+        :param stateful: 仅 Python 可用，为 True 时 run_code 在容器内常驻的 kernel 中执行，
+            变量与已导入的模块在多次调用之间保留
+        :param forkserver: 仅 Python 可用，为 True 时 run_code 由容器内预先导入了 preload 模块的
+            fork server 为每次运行 fork 一个隔离的子进程执行
+        :param preload: fork server 预先导入的模块，默认见 DEFAULT_PRELOAD_MODULES
+        :param agent: 为 True 时后端通过容器内常驻的执行代理运行代码，写文件、安装依赖、运行与
+            收集生成文件在一次往返中完成（使用 pool 时由池的后端决定）
+        :param result_cache: 可选的执行结果缓存，相同语言、镜像、代码、依赖与输入文件的执行
+            直接返回缓存结果，不访问容器（有状态模式与生成文件模式不使用缓存）
+        :param reaper: 提供时退出会话把容器交给后台 Reaper 删除并立即返回（可用 default_reaper()）
+        :param artifact_store: 生成文件模式下保存文件的本地仓库，默认为进程内共享的 ./output 仓库；
+            每个会话的文件在仓库中有独立的目录
+        """
+        if (stateful or forkserver) and language != SupportedLanguage.PYTHON:
+            raise ValueError(f"stateful/forkserver mode only supports python, got {language}")
+        if stateful and forkserver:
+            raise ValueError("stateful and forkserver modes are mutually exclusive")
         self.backend_type = backend_type
         self.language = language
+        self.pool = pool
+        self.dependencies = dependencies
+        self.stateful = stateful
+        self.kernel: PythonKernel | None = None
+        self.forkserver = forkserver
+        self.preload = preload
+        self._forkserver: ForkServer | None = None
+        # kernel 中正在执行的代码单元的 run_id；_cancelled_runs 为运行启动前收到的取消（kernel 或 fork server 尚未启动），
+        # 以该 run_id 启动时直接返回
+        self._kernel_run_id: str | None = None
+        self._cancelled_runs: set[str] = set()
+        self._runs_lock = threading.Lock()
+        self.agent = agent
+        self.result_cache = result_cache
+        self.reaper = reaper
+        self.artifact_store = artifact_store or default_artifact_store()
+        # 会话在文件仓库中的命名空间
+        self.session_id = uuid.uuid4().hex[:12]
         self.backend = None
         self.container = None
 
     def __enter__(self):
         """进入上下文时启动 backend"""
+        if self.pool is not None:
+            if self.pool.language != self.language:
+                raise BackendError(f"pool language {self.pool.language} does not match session language {self.language}")
+            self.backend = self.pool.backend
+            with metrics.phase("acquire", self._backend_name(), self.language):
+                self.container = self.pool.acquire()
+            logger.info(f"Leased pooled container for language={self.language}")
+            return self
+
         # 使用工厂模式创建后端实例
         if self.backend_type in BackendFactory.get_available_backends():
             if self.backend_type == BackendType.DOCKER:
                 client = docker.from_env()
-                self.backend = BackendFactory.create_backend(self.backend_type, client=client)
+                self.backend = BackendFactory.create_backend(self.backend_type, client=client, agent=self.agent)
             elif self.backend_type == BackendType.KUBERNETES:
-                self.backend = BackendFactory.create_backend(self.backend_type)
+                self.backend = BackendFactory.create_backend(self.backend_type, agent=self.agent)
         else:
             raise BackendNotAvailable(f"Backend {self.backend_type} not implemented")
 
         logger.info(f"Creating container for language={self.language} and backend = {self.backend_type}")
-        self.container = self.backend.create_container(lang=self.language)
+        self.container = self.backend.create_container(lang=self.language, dependencies=self.dependencies)
 
         logger.info("Starting container...")
         self.backend.start_container(self.container)
@@ -42,96 +109,278 @@ class SandboxSession:
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         """退出上下文时释放资源"""
+        if self.kernel is not None:
+            self.kernel.shutdown(force=True)
+            self.kernel = None
+        if self._forkserver is not None:
+            self._forkserver.shutdown()
+            self._forkserver = None
+        if self.pool is not None:
+            if self.container is not None:
+                with metrics.phase("release", self._backend_name(), self.language):
+                    self.pool.release(self.container)
+                self.container = None
+            return
         if self.backend and self.container:
-            try:
-                logger.info("Stopping container...")
-                self.backend.stop_container(self.container)
-            except Exception as e:
-                logger.error(f"Failed to stop container: {e}")
-            finally:
+            if self.reaper is not None:
+                logger.info("Handing container to reaper...")
+                self.reaper.submit(self.backend, self.container)
+            else:
                 try:
                     logger.info("Removing container...")
-                    self.backend.remove_container(self.container)
+                    self.backend.teardown(self.container)
                 except Exception as e:
                     logger.error(f"Failed to remove container: {e}")
+            self.container = None
 
     def exe_command(self,command:str,**kwargs:Any) -> 'CommandResult':
         return self.backend.execute_command(self.container,command,**kwargs)
 
-    def run_code(self, code: str, dependencies: list[str] | None = None, file_path: list[str] | str = None):
+    def run_code(
+            self,
+            code: str,
+            dependencies: list[str] | None = None,
+            file_path: list[str] | str = None,
+            files: dict[str, bytes | str] | None = None,
+            cache: bool = True,
+            deterministic: bool = False,
+            timeout: float | None = None,
+            compression: str | None = None,
+            max_file_bytes: int | None = None,
+            plots: bool | PlotCapture = False,
+            run_id: str | None = None,
+            **limits: Any):
         """
         执行代码，支持普通执行和生成文件两种模式
 
         Args:
             code: 要执行的代码
             dependencies: 依赖列表
-            file_path: 当需要生成文件时，指定文件路径列表，为None时执行普通模式
+            file_path: 当需要生成文件时，指定文件路径列表（支持通配符，如 /sandbox/*.png），为None时执行普通模式，
+                否则返回保存到本地仓库的文件句柄（Artifact）列表
+            files: 随代码一起上传的辅助文件 {容器内路径: 内容}，相对路径放到 /sandbox 下
+            cache: 为 False 时本次调用绕过结果缓存（既不读取也不写入）
+            deterministic: 标记代码的输出是确定的，缓存配置为 deterministic_only 时只缓存这类执行
+            timeout: 墙钟超时（秒），超时后结束进程，结果 status 为 TIMED_OUT
+            compression: 生成文件模式下取回文件时的压缩方式（None / gzip / zstd）
+            max_file_bytes: 生成文件模式下取回文件的总大小上限，超出时抛出 ArtifactTooLargeError
+            plots: 仅普通模式下的 Python 可用，为 True（或指定 PlotCapture 配置）时在代码结束后捕获未关闭的
+                matplotlib 图表，返回 ExecutionResult，图表在其 plots 中；超过内联大小的图表保存到本地仓库
+            run_id: 运行标识，可在其他线程中通过 kill_run(run_id) 结束本次运行（任意执行模式）
+            limits: 其余资源限制（cpus、memory、pids、max_output_bytes）与输出保留上限 capture，见 ExecutionRequest
         """
         if file_path is not None:
+            self._reject_unenforced("file generation", limits, plots, supported=("max_output_bytes",))
             # 生成文件模式
             request = ExeGenFileRequest(
                 code=code,
                 language=self.language,
                 dependencies=dependencies,
                 file_path=file_path,
+                files=files,
+                compression=compression,
+                max_bytes=max_file_bytes,
+                run_id=run_id,
+                timeout=timeout,
+                max_output_bytes=limits.get("max_output_bytes"),
             )
-            files_content , files_stat  = self.backend.run_code_get_file(self.container, request)
+            archives, files_stat = self.backend.run_code_get_file(self.container, request)
             logger.info(f"Return code: {files_stat}")
-            return self._creat_local_file(files_content,files_stat)
+            return self._save_artifacts(archives)
+        elif self.stateful:
+            self._reject_unenforced("stateful", limits, plots, supported=("capture",))
+            # 有状态模式：在常驻 kernel 中执行
+            if dependencies:
+                self.backend.install_dependencies(self.container, self.language, dependencies)
+            if files:
+                self.backend.upload_files(self.container, files)
+            kernel = self._get_kernel()
+            with self._runs_lock:
+                if self._take_cancelled(run_id):
+                    return CommandResult(exit_code=137)
+                self._kernel_run_id = run_id
+            try:
+                return kernel.execute(code, timeout=timeout, capture=limits.get("capture"))
+            finally:
+                with self._runs_lock:
+                    self._kernel_run_id = None
+
+        capture = PlotCapture() if plots is True else plots or None
+        if capture is not None:
+            capture = dataclasses.replace(capture, directory=plot_directory())
+        # 捕获图表的结果包含本地文件路径，不进入结果缓存
+        if self.forkserver:
+            self._reject_unenforced("fork server", limits, plots, supported=("capture",))
+        key = self._cache_key(code, dependencies, files, {"timeout": timeout, **limits}) \
+            if cache and capture is None else None
+        if key is not None:
+            cached = self.result_cache.get(key)
+            if cached is not None:
+                logger.info(f"Result cache hit: {key[:12]}")
+                return cached
+        # run_code 阶段为一次执行的端到端耗时（含安装依赖、上传与执行）
+        with metrics.phase("run_code", self._backend_name(), self.language):
+            if self.forkserver:
+                # fork server 模式：在预导入了常用模块的父进程 fork 出的子进程中执行
+                if dependencies:
+                    self.backend.install_dependencies(self.container, self.language, dependencies)
+                server = self._get_forkserver()
+                with self._runs_lock:
+                    cancelled = self._take_cancelled(run_id)
+                result = CommandResult(exit_code=137) if cancelled else \
+                    server.run(code, files=files, timeout=timeout, run_id=run_id, capture=limits.get("capture"))
+            else:
+                # 普通执行模式
+                request = ExecutionRequest(
+                    code=code,
+                    language=self.language,
+                    dependencies=dependencies,
+                    files=files,
+                    timeout=timeout,
+                    plots=capture,
+                    run_id=run_id,
+                    **limits,
+                )
+                result = self.backend.run_code(self.container, request)
+                if capture is not None:
+                    result = self._collect_plots(result, capture)
+        if key is not None and self.result_cache.cacheable(result, deterministic):
+            self.result_cache.put(key, result)
+        return result
+
+    @staticmethod
+    def _reject_unenforced(mode: str, limits: dict[str, Any], plots: bool | PlotCapture,
+                           supported: tuple[str, ...] = ()) -> None:
+        """该模式无法施加的限制不能被静默忽略，否则无限制运行的结果看起来与受限运行一样；supported 为该模式支持的项"""
+        unsupported = sorted(name for name, value in limits.items() if value is not None and name not in supported)
+        if plots:
+            unsupported.append("plots")
+        if unsupported:
+            raise ValueError(f"{', '.join(unsupported)} not supported in {mode} mode")
+
+    def _collect_plots(self, result, capture: PlotCapture) -> ExecutionResult:
+        """一次取回容器内的图表目录，图片与清单不经过 stdout/stderr，不受输出上限与截断影响"""
+        archive = ChunkReader(self.backend.stream_artifacts(self.container, [capture.directory]))
+        plots = read_plots(archive, capture, self.artifact_store, self.session_id)
+        if plots:
+            # 已取回，删除本次运行的图表目录，避免在长时间使用的容器中堆积（没有图表时目录不会创建）
+            try:
+                self.backend.execute_command(self.container, f"rm -rf {capture.directory}")
+            except Exception as e:
+                logger.warning(f"Failed to remove plot directory {capture.directory}: {e}")
+        return ExecutionResult(exit_code=result.exit_code, stderr=result.stderr, stdout=result.stdout,
+                               plots=plots, status=result.status, usage=result.usage,
+                               stdout_dropped=result.stdout_dropped, stderr_dropped=result.stderr_dropped)
+
+    def _cache_key(self, code: str, dependencies: list[str] | None, files: dict[str, bytes | str] | None,
+                   options: dict[str, Any] | None = None) -> str | None:
+        """结果缓存的键，未配置缓存或无法确定镜像 digest 时返回 None"""
+        if self.result_cache is None:
+            return None
+        digest = self.backend.image_digest(self.container)
+        if not digest:
+            return None
+        return ResultCache.make_key(self.language, digest, code, dependencies, files, options)
+
+    def _backend_name(self) -> str:
+        # 使用预热池时后端由池决定
+        return getattr(self.backend, "name", None) or self.backend_type
+
+    def _get_kernel(self) -> PythonKernel:
+        if self.kernel is None:
+            self.kernel = PythonKernel(self.backend, self.container)
+        return self.kernel.start()
+
+    def _get_forkserver(self) -> ForkServer:
+        if self._forkserver is None:
+            self._forkserver = ForkServer(self.backend, self.container, preload=self.preload)
+        return self._forkserver.start()
+
+    def kill_run(self, run_id: str) -> None:
+        """
+        结束以 run_id 运行的代码（可在其他线程中调用）
+
+        有状态模式下中断 kernel 中正在执行的代码单元（命名空间保留），fork server 模式下结束对应的子进程，
+        其余模式在容器内结束进程；运行尚未启动时（如仍在安装依赖）启动后立即退出。
+        """
+        if self.stateful:
+            with self._runs_lock:
+                running = self._kernel_run_id == run_id
+                if not running:
+                    self._cancelled_runs.add(run_id)
+            if running:
+                self.interrupt_kernel()
+        elif self.forkserver:
+            with self._runs_lock:
+                server = self._forkserver
+                if server is None:
+                    self._cancelled_runs.add(run_id)
+            if server is not None:
+                server.kill(run_id)
         else:
-            # 普通执行模式
-            request = ExecutionRequest(
-                code=code,
-                language=self.language,
-                dependencies=dependencies,
-            )
-            return self.backend.run_code(self.container, request)
+            self.backend.kill_run(self.container, run_id)
+
+    def _take_cancelled(self, run_id: str | None) -> bool:
+        """run_id 是否在启动前已被取消（调用方持有 _runs_lock），取消只生效一次"""
+        if run_id is None or run_id not in self._cancelled_runs:
+            return False
+        self._cancelled_runs.discard(run_id)
+        logger.info(f"Run {run_id} cancelled before start")
+        return True
 
-    def _creat_local_file(self,files_content:list[bytes] | None = None,files_stat:list[dict] | None = None)-> list[str] | None:
+    def interrupt_kernel(self) -> None:
+        """中断 kernel 中正在执行的代码单元（可在其他线程中调用）"""
+        if self.kernel is not None:
+            self.kernel.interrupt()
+
+    def restart_kernel(self) -> None:
+        """重启 kernel，清空命名空间"""
+        self._get_kernel().restart()
+
+    def run_code_stream(
+            self,
+            code: str,
+            dependencies: list[str] | None = None,
+            files: dict[str, bytes | str] | None = None,
+            timeout: float | None = None,
+            **limits: Any) -> Iterator[StreamEvent]:
         """
-            将从容器中获取的文件内容保存到本地
-            Args:
-                files_content: 文件的二进制内容列表
-                files_stat: 每个文件的元信息
-            Returns:
-                保存到本地的文件路径列表
-            """
-        local_output = "./output"
-        os.makedirs(local_output, exist_ok=True)
-        logger.info(f"文件将保存到本地目录: {local_output}")
-
-        if not files_content or not files_stat:
-            logger.warning("没有提供文件内容或文件元信息，跳过保存")
-            return None
+        执行代码并以流的形式返回输出
 
-        local_files: list[str] = []
-        for tar_bytes, stat in zip(files_content, files_stat):
-            try:
-                file_name, content = self._extract_from_tar(tar_bytes)
-                local_path = os.path.join(local_output, file_name)
-                #如果已存在则避免覆盖
-                base, ext = os.path.splitext(local_path)
-                counter = 1
-                while os.path.exists(local_path):
-                    logger.info(f"{local_path} had exist")
-                    local_path = f"{base}_{counter}{ext}"
-                    counter += 1
-                with open(local_path, "wb") as f:
-                    f.write(content)
-                logger.info(f"文件已保存: {local_path} (大小: {stat.get('size', '未知')} bytes)")
-                local_files.append(local_path)
+        按到达顺序产出 stdout/stderr 的 StreamEvent，最后产出一个携带退出码的 EXIT 事件，
+        长时间运行的任务无需等待结束即可拿到首批输出，也不必在内存中保留完整输出。
 
-            except Exception as e:
-                logger.error(f"保存文件失败: {e}")
-
-        return local_files if local_files else None
-
-    def _extract_from_tar(self, tar_bytes: bytes) -> tuple[str, bytes]:
-        """解出tar流中的第一个文件，返回 (文件名, 内容)"""
-        file_like = io.BytesIO(tar_bytes)
-        with tarfile.open(fileobj=file_like, mode="r:") as tar:
-            member = tar.getmembers()[0]
-            f = tar.extractfile(member)
-            if f is None:
-                raise IOError("无法从tar中提取文件")
-            return member.name, f.read()
+        Args:
+            code: 要执行的代码
+            dependencies: 依赖列表
+            files: 随代码一起上传的辅助文件
+            timeout: 墙钟超时（秒）
+            limits: 其余资源限制，见 ExecutionRequest
+        """
+        request = ExecutionRequest(
+            code=code,
+            language=self.language,
+            dependencies=dependencies,
+            files=files,
+            timeout=timeout,
+            **limits,
+        )
+        yield from self.backend.run_code_stream(self.container, request)
+
+    def _save_artifacts(self, archives: list | None) -> list[Artifact] | None:
+        """
+        把从容器取回的 tar 流逐个文件写入本地仓库的会话目录
+
+        Args:
+            archives: 只读 tar 流列表
+        Returns:
+            保存的文件句柄列表（携带本地路径、大小与 sha256）
+        """
+        if not archives:
+            logger.warning("没有取回任何文件，跳过保存")
+            return None
+        artifacts: list[Artifact] = []
+        for archive in archives:
+            artifacts.extend(self.artifact_store.save(self.session_id, archive))
+        logger.info(f"{len(artifacts)} 个文件已保存到 {self.artifact_store.session_dir(self.session_id)}")
+        return artifacts or None
@@ -0,0 +1,251 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any
+import docker
+from sandbox.const import SupportedLanguage
+from sandbox.manifest import normalize_requirement
+from sandbox.util import logger
+
+# 快照镜像上的标签，用于识别与淘汰
+SNAPSHOT_LABEL = "sandbox.snapshot"
+DEPS_LABEL = "sandbox.dependencies"
+# 构建快照的临时容器上的标签
+BUILD_LABEL = "sandbox.snapshot.build"
+
+
+class SnapshotStore:
+    """
+    依赖层快照镜像仓库
+
+    会话中依赖安装成功后，在由基础镜像新建的临时容器中安装同一组依赖并 docker commit 为派生镜像，标签由
+    (基础镜像 digest, 语言, 排序后的依赖列表) 的哈希决定。之后依赖集合相同的会话
+    直接从该镜像启动，完全跳过安装。快照按最近使用时间做 LRU 淘汰，总大小不超过 disk_budget。
+
+    :param client: docker client
+    :param repository: 快照镜像的仓库名
+    :param disk_budget: 快照镜像总大小上限（字节）
+    :param registry: 可选的镜像仓库地址，设置后快照会被推送，K8sBackend 可直接引用
+    :param index_path: 记录最近使用时间与推送状态的索引文件
+    """
+
+    def __init__(
+            self,
+            client: docker.DockerClient,
+            repository: str = "sandbox-snapshot",
+            disk_budget: int = 10 * 1024 ** 3,
+            registry: str | None = None,
+            index_path: str | os.PathLike | None = None,
+    ):
+        self.client = client
+        self.repository = repository
+        self.disk_budget = disk_budget
+        self.registry = registry.rstrip("/") if registry else None
+        self.index_path = Path(index_path or Path.home() / ".cache" / "sandbox" / "snapshots.json")
+        self._lock = threading.Lock()
+        self._digests: dict[str, str] = {}
+        # 正在构建的快照标签，避免并发会话重复构建
+        self._building: set[str] = set()
+        self._index = self._load_index()
+
+    @staticmethod
+    def make_tag(base_digest: str, language: SupportedLanguage, dependencies: list[str]) -> str:
+        """根据基础镜像 digest、语言和规范化后的依赖集合计算快照标签，构建与查找使用同一个键"""
+        deps = sorted({normalize_requirement(language, dep) for dep in dependencies})
+        payload = "\n".join([base_digest, str(language), *deps])
+        return f"{str(language).lower()}-{hashlib.sha256(payload.encode()).hexdigest()[:16]}"
+
+    def base_digest(self, image: str) -> str:
+        """获取基础镜像的 digest（本地镜像 id），结果在进程内缓存"""
+        digest = self._digests.get(image)
+        if digest is None:
+            digest = self.client.images.get(image).id
+            self._digests[image] = digest
+        return digest
+
+    def reference(self, tag: str, remote: bool = False) -> str:
+        name = f"{self.repository}:{tag}"
+        if remote and self.registry:
+            return f"{self.registry}/{name}"
+        return name
+
+    def lookup(self, image: str, language: SupportedLanguage, dependencies: list[str], remote: bool = False) -> str | None:
+        """
+        查找依赖集合对应的快照镜像
+
+        :param remote: 为 True 时只返回已推送到 registry 的完整引用（供 K8sBackend 使用）
+        :return: 镜像引用，不存在时返回 None
+        """
+        if not dependencies:
+            return None
+        try:
+            tag = self.make_tag(self.base_digest(image), language, dependencies)
+        except docker.errors.ImageNotFound:
+            return None
+        with self._lock:
+            entry = self._index.get(tag)
+            if remote:
+                if entry is None or not entry.get("pushed"):
+                    return None
+            else:
+                try:
+                    self.client.images.get(self.reference(tag))
+                except docker.errors.ImageNotFound:
+                    self._index.pop(tag, None)
+                    self._save_index()
+                    return None
+            entry = self._index.setdefault(tag, {})
+            entry["last_used"] = time.time()
+            self._save_index()
+        logger.info(f"Snapshot hit for dependencies={sorted(set(dependencies))}: {tag}")
+        return self.reference(tag, remote=remote)
+
+    def build(self, image: str, language: SupportedLanguage, dependencies: list[str],
+              install_command: list[str]) -> str | None:
+        """
+        在由基础镜像新建的临时容器中只执行依赖安装并提交为快照镜像，返回镜像引用
+
+        快照与所有会话共享，不能从会话容器提交：会话容器中有用户代码、上传的文件与运行产物。
+        临时容器中除安装命令外不执行任何命令，提交后立即删除；配置了 registry 时在后台推送。
+        """
+        if not dependencies:
+            return None
+        try:
+            tag = self.make_tag(self.base_digest(image), language, dependencies)
+        except docker.errors.ImageNotFound:
+            return None
+        try:
+            self.client.images.get(self.reference(tag))
+            return self.reference(tag)
+        except docker.errors.ImageNotFound:
+            pass
+        with self._lock:
+            if tag in self._building:
+                return None
+            self._building.add(tag)
+        try:
+            snapshot = self._install_and_commit(image, tag, dependencies, install_command)
+        finally:
+            with self._lock:
+                self._building.discard(tag)
+        if snapshot is None:
+            return None
+
+        with self._lock:
+            self._index[tag] = {
+                "last_used": time.time(),
+                "size": snapshot.attrs.get("Size", 0),
+                "pushed": False,
+            }
+            self._save_index()
+        logger.info(f"Committed snapshot {self.reference(tag)}")
+        if self.registry:
+            threading.Thread(target=self._push, args=(tag, snapshot), daemon=True).start()
+        self.evict()
+        return self.reference(tag)
+
+    def build_async(self, image: str, language: SupportedLanguage, dependencies: list[str],
+                    install_command: list[str]) -> threading.Thread:
+        """在后台线程中 build，不阻塞会话的安装流程"""
+        thread = threading.Thread(target=self.build, args=(image, language, dependencies, install_command), daemon=True)
+        thread.start()
+        return thread
+
+    def _install_and_commit(self, image: str, tag: str, dependencies: list[str], install_command: list[str]) -> Any:
+        container = None
+        try:
+            container = self.client.containers.create(
+                image=image, command="tail -f /dev/null", init=True, labels={BUILD_LABEL: tag})
+            container.start()
+            result = container.exec_run(install_command)
+            if result.exit_code:
+                logger.error(f"Snapshot {tag} install failed: {result.output[-1000:]!r}")
+                return None
+            return container.commit(
+                repository=self.repository,
+                tag=tag,
+                conf={"Labels": {
+                    SNAPSHOT_LABEL: "1",
+                    DEPS_LABEL: ",".join(sorted(set(dependencies))),
+                }},
+            )
+        except Exception as e:
+            logger.error(f"Failed to build snapshot {tag}: {e}")
+            return None
+        finally:
+            if container is not None:
+                try:
+                    container.remove(force=True)
+                except Exception as e:
+                    logger.warning(f"Failed to remove snapshot build container: {e}")
+
+    def _push(self, tag: str, snapshot: Any) -> None:
+        try:
+            remote = self.reference(tag, remote=True)
+            snapshot.tag(remote)
+            self.client.images.push(remote.rsplit(":", 1)[0], tag=tag)
+        except Exception as e:
+            logger.error(f"Failed to push snapshot {tag}: {e}")
+            return
+        with self._lock:
+            if tag in self._index:
+                self._index[tag]["pushed"] = True
+                self._save_index()
+        logger.info(f"Pushed snapshot {tag}")
+
+    def evict(self) -> list[str]:
+        """按最近使用时间淘汰快照镜像，直到总大小不超过 disk_budget"""
+        images = self.client.images.list(filters={"label": SNAPSHOT_LABEL})
+        candidates = []
+        total = 0
+        with self._lock:
+            for img in images:
+                tags = [t for t in img.tags if t.startswith(f"{self.repository}:")]
+                if not tags:
+                    continue
+                tag = tags[0].split(":", 1)[1]
+                size = img.attrs.get("Size", 0)
+                total += size
+                candidates.append((self._index.get(tag, {}).get("last_used", 0), tag, size, img))
+        candidates.sort(key=lambda c: c[0])
+
+        removed = []
+        for _, tag, size, img in candidates:
+            if total <= self.disk_budget:
+                break
+            try:
+                # 推送过的快照同时带有 registry 标签，需要 force 才能一并删除；
+                # 正在被运行中容器使用的镜像即使 force 也无法删除，跳过即可
+                self.client.images.remove(img.id, force=True)
+            except Exception as e:
+                logger.warning(f"Failed to evict snapshot {tag}: {e}")
+                continue
+            total -= size
+            removed.append(tag)
+            with self._lock:
+                self._index.pop(tag, None)
+        if removed:
+            with self._lock:
+                self._save_index()
+            logger.info(f"Evicted snapshots: {removed}")
+        return removed
+
+    def _load_index(self) -> dict:
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {}
+
+    def _save_index(self) -> None:
+        try:
+            self.index_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.index_path.with_suffix(".tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self._index, f)
+            os.replace(tmp, self.index_path)
+        except OSError as e:
+            logger.warning(f"Failed to save snapshot index: {e}")
@@ -0,0 +1,184 @@
+import io
+import posixpath
+import tarfile
+import time
+import zlib
+from typing import Iterable, Iterator
+from sandbox.errors import ArtifactTooLargeError, BackendError
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# 辅助文件的默认目录（相对路径都放在该目录下）
+SANDBOX_DIR = "/sandbox"
+# 通过 exec stdin 传输 tar 时每次写入的块大小
+CHUNK_SIZE = 64 * 1024
+# 取回生成文件时可选的压缩方式（容器内缺少对应命令时退回不压缩）
+COMPRESSIONS = ("gzip", "zstd")
+
+_GZIP_MAGIC = b"\x1f\x8b"
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+# 在容器内展开通配符，把匹配到的文件打成一个 tar 写到 stdout，$1 为压缩命令（可为空）
+_COLLECT_SCRIPT = r"""
+c=$1; shift
+n=$#
+IFS='
+'
+for p in "$@"; do
+  for f in $p; do
+    [ -e "$f" ] && set -- "$@" "${f#/}"
+  done
+done
+shift $n
+[ $# -eq 0 ] && exit 0
+if [ -n "$c" ] && command -v "$c" >/dev/null 2>&1; then
+  tar cf - -C / "$@" | "$c" -c
+else
+  exec tar cf - -C / "$@"
+fi
+"""
+
+
+def resolve_path(path: str, base: str = SANDBOX_DIR) -> str:
+    """将相对路径解析为容器内的绝对路径"""
+    if not path.startswith("/"):
+        path = posixpath.join(base, path)
+    return posixpath.normpath(path)
+
+
+def artifact_path(path: str) -> str:
+    """生成文件的路径：都在 /sandbox 下，不以 /sandbox/ 开头的绝对路径同样按相对路径处理"""
+    return path if path.startswith(SANDBOX_DIR + "/") else resolve_path(path.lstrip("/"))
+
+
+def build_tar(files: dict[str, bytes | str], mode: int = 0o644) -> bytes:
+    """
+    将多个文件打包为一个 tar
+
+    :param files: {容器内路径: 内容}，相对路径放到 /sandbox 下，str 内容按 utf-8 编码
+    :return: 以容器根目录为基准的 tar 数据，缺失的父目录在解包时自动创建
+    """
+    buf = io.BytesIO()
+    now = time.time()
+    with tarfile.open(fileobj=buf, mode="w") as tar:
+        for path, content in files.items():
+            data = content.encode("utf-8") if isinstance(content, str) else content
+            info = tarfile.TarInfo(name=resolve_path(path).lstrip("/"))
+            info.size = len(data)
+            info.mode = mode
+            info.mtime = now
+            tar.addfile(info, io.BytesIO(data))
+    return buf.getvalue()
+
+
+def iter_chunks(data: bytes, size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    view = memoryview(data)
+    for offset in range(0, len(data), size):
+        yield bytes(view[offset:offset + size])
+
+
+def collect_command(patterns: list[str], compression: str | None = None) -> list[str]:
+    """
+    一次 exec 取回多个文件的命令
+
+    :param patterns: 文件、目录或通配符（如 /sandbox/*.png），相对路径放到 /sandbox 下
+    :param compression: None、gzip 或 zstd；宿主机没有 zstandard 时改用 gzip
+    """
+    if compression not in (None, *COMPRESSIONS):
+        raise ValueError(f"unsupported compression: {compression}, supported: {COMPRESSIONS}")
+    if compression == "zstd" and zstandard is None:
+        compression = "gzip"
+    return ["sh", "-c", _COLLECT_SCRIPT, "sh", compression or "", *[resolve_path(p) for p in patterns]]
+
+
+class ArchiveDecoder:
+    """
+    增量解码 collect_command 的输出，按魔数识别压缩格式并解压为 tar 数据块
+
+    :param max_bytes: 解压后 tar 的总大小上限，超出时抛出 ArtifactTooLargeError，不再继续接收
+    """
+
+    def __init__(self, max_bytes: int | None = None):
+        self.max_bytes = max_bytes
+        self.received = 0
+        self.decoded = 0
+        self._head = b""
+        self._decompress = None
+
+    def decode(self, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        """逐块解压，产出 tar 数据块"""
+        for chunk in chunks:
+            data = self.feed(chunk)
+            if data:
+                yield data
+        data = self.flush()
+        if data:
+            yield data
+
+    def feed(self, chunk: bytes) -> bytes:
+        self.received += len(chunk)
+        if self._decompress is None:
+            self._head += chunk
+            if len(self._head) < len(_ZSTD_MAGIC):
+                return b""
+            chunk, self._head = self._head, b""
+            self._decompress = self._decompressor(chunk)
+        return self._count(self._decompress(chunk))
+
+    def flush(self) -> bytes:
+        """输出不足魔数长度时（如空输出）按未压缩处理"""
+        if self._decompress is None and self._head:
+            self._decompress = self._decompressor(self._head)
+            return self._count(self._decompress(self._head))
+        return b""
+
+    def _count(self, data: bytes) -> bytes:
+        self.decoded += len(data)
+        if self.max_bytes is not None and self.decoded > self.max_bytes:
+            raise ArtifactTooLargeError(self.max_bytes)
+        return data
+
+    @staticmethod
+    def _decompressor(head: bytes):
+        if head.startswith(_GZIP_MAGIC):
+            return zlib.decompressobj(wbits=31).decompress
+        if head.startswith(_ZSTD_MAGIC):
+            if zstandard is None:
+                raise BackendError("zstd archive received but zstandard is not installed")
+            return zstandard.ZstdDecompressor().decompressobj().decompress
+        return bytes
+
+
+class ChunkReader(io.RawIOBase):
+    """把数据块迭代器包装为只读流，供 tarfile 以流模式（r|）边接收边读取成员"""
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks = iter(chunks)
+        self._buf = memoryview(b"")
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        while not self._buf:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            self._buf = memoryview(chunk)
+        size = min(len(b), len(self._buf))
+        b[:size] = self._buf[:size]
+        self._buf = self._buf[size:]
+        return size
+
+
+def iter_tar_files(archive: bytes) -> Iterator[tuple[str, bytes]]:
+    """依次产出 tar 中的普通文件 (成员路径, 内容)"""
+    if not archive:
+        return
+    with tarfile.open(fileobj=io.BytesIO(archive), mode="r:") as tar:
+        for member in tar:
+            if member.isfile():
+                yield member.name, tar.extractfile(member).read()
@@ -0,0 +1,49 @@
+from dataclasses import dataclass, field
+from sandbox.const import SupportedLanguage
+
+
+@dataclass(frozen=True)
+class CacheVolume:
+    """
+    跨容器共享的包管理器 / 工具链缓存卷
+
+    name: 卷名（Docker 命名卷 / K8s PVC 名称 / hostPath 子目录）
+    mount_path: 容器内挂载路径
+    env: 让工具链使用该目录所需的环境变量
+    """
+
+    name: str
+    mount_path: str
+    env: dict[str, str] = field(default_factory=dict)
+
+
+# 各语言默认挂载的缓存卷。pip、npm(cacache)、Go 模块/构建缓存、gem 下载缓存和 ccache
+# 都以原子重命名或文件锁写入，多个容器并发读写同一个卷是安全的
+LANGUAGE_CACHE_VOLUMES: dict[SupportedLanguage, list[CacheVolume]] = {
+    SupportedLanguage.PYTHON: [
+        CacheVolume("sandbox-cache-pip", "/cache/pip", {"PIP_CACHE_DIR": "/cache/pip"}),
+    ],
+    SupportedLanguage.JAVASCRIPT: [
+        CacheVolume("sandbox-cache-npm", "/cache/npm", {"npm_config_cache": "/cache/npm"}),
+    ],
+    SupportedLanguage.GO: [
+        CacheVolume("sandbox-cache-gomod", "/cache/go/mod", {"GOMODCACHE": "/cache/go/mod"}),
+        CacheVolume("sandbox-cache-gobuild", "/cache/go/build", {"GOCACHE": "/cache/go/build"}),
+    ],
+    SupportedLanguage.RUBY: [
+        # gem install 会优先使用 $GEM_HOME/cache 中已下载的 .gem 文件
+        CacheVolume("sandbox-cache-gem", "/usr/local/bundle/cache"),
+    ],
+}
+
+CCACHE_VOLUME = CacheVolume(
+    "sandbox-cache-ccache", "/cache/ccache", {"CCACHE_DIR": "/cache/ccache"}
+)
+
+
+def cache_volumes_for(language: SupportedLanguage, ccache: bool = False) -> list[CacheVolume]:
+    """获取语言对应的缓存卷，ccache=True 时额外挂载 ccache 目录"""
+    volumes = list(LANGUAGE_CACHE_VOLUMES.get(language, []))
+    if ccache and language == SupportedLanguage.CPP:
+        volumes.append(CCACHE_VOLUME)
+    return volumes
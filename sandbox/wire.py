@@ -0,0 +1,139 @@
+import base64
+import dataclasses
+import io
+import json
+import uuid
+from enum import StrEnum
+from sandbox.artifacts import ArtifactStore
+from sandbox.data import (Artifact, CommandResult, CompiledResult, ConsoleOutput, ExecutionResult, FileType,
+                          PlotOutput, ResourceUsage, RunStatus)
+from sandbox.errors import SandboxError
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# 支持的传输格式：紧凑 JSON 与二进制 msgpack（需要安装 msgpack）
+WIRE_FORMATS = ("json", "msgpack")
+# 配置了文件仓库时，超过该大小（字节）的 stdout/stderr 与图片以句柄代替内容
+INLINE_BYTES = 64 * 1024
+# 大字段在会话命名空间下的保存目录
+REFS_DIR = "refs"
+
+_RESULT_TYPES = {cls.__name__: cls for cls in (ConsoleOutput, ExecutionResult, CommandResult, CompiledResult)}
+
+
+def to_wire(result: ConsoleOutput | CommandResult, store: ArtifactStore | None = None, namespace: str = "results",
+            inline_bytes: int = INLINE_BYTES, binary: bool = False) -> dict:
+    """
+    结果 -> 可直接序列化的 dict
+
+    提供 store 时，超过 inline_bytes 的 stdout/stderr 写入文件仓库，原字段置空，句柄（name、size、digest）放在 refs 中；
+    超过 inline_bytes 的内联图片同样写入仓库，已保存在仓库中的图片只返回句柄（artifact 字段）。
+    调用方只在需要时通过 ArtifactStore.open(digest) 读取内容。
+
+    :param store: 文件仓库，为 None 时所有内容内联
+    :param namespace: 大字段保存到的会话命名空间
+    :param binary: 为 True 时内联图片以原始字节放在 img 字段（供 msgpack 使用），否则为 img_base64
+    """
+    # 每次调用使用独立目录，避免同一会话中后一次结果覆盖前一次的同名文件
+    prefix = f"{REFS_DIR}/{uuid.uuid4().hex[:12]}"
+    data: dict = {"type": type(result).__name__}
+    refs = {}
+    for f in dataclasses.fields(result):
+        value = getattr(result, f.name)
+        if f.name in ("stdout", "stderr"):
+            raw = value.encode("utf-8")
+            if store is not None and len(raw) > inline_bytes:
+                refs[f.name] = store.put(namespace, f"{prefix}/{f.name}.txt", io.BytesIO(raw)).handle()
+                value = ""
+        elif f.name == "plots":
+            value = [_plot_to_wire(plot, f"{prefix}/plot_{i}.{plot.format}", store, namespace, inline_bytes, binary)
+                     for i, plot in enumerate(value)]
+        elif isinstance(value, ResourceUsage):
+            value = dataclasses.asdict(value)
+        elif isinstance(value, StrEnum):
+            value = str(value)
+        data[f.name] = value
+    if refs:
+        data["refs"] = refs
+    return data
+
+
+def _plot_to_wire(plot: PlotOutput, name: str, store: ArtifactStore | None, namespace: str,
+                  inline_bytes: int, binary: bool) -> dict:
+    data = {"format": str(plot.format), "width": plot.width, "height": plot.height}
+    artifact = plot.artifact
+    if artifact is None and store is not None and len(plot.img_base64) * 3 // 4 > inline_bytes:
+        artifact = store.put(namespace, name, io.BytesIO(base64.b64decode(plot.img_base64)))
+    if artifact is not None:
+        data["artifact"] = artifact.handle()
+    elif binary:
+        data["img"] = base64.b64decode(plot.img_base64)
+    else:
+        data["img_base64"] = plot.img_base64
+    return data
+
+
+def from_wire(data: dict, store: ArtifactStore | None = None) -> ConsoleOutput | CommandResult:
+    """
+    to_wire 的逆过程
+
+    提供 store 时读取 refs 中的 stdout/stderr，图片句柄还原为指向仓库内容文件的 Artifact（内容在 read 时才读取）；
+    不提供时引用的字段保持为空，图片句柄的 path 为空字符串。
+    """
+    data = dict(data)
+    cls = _RESULT_TYPES.get(data.pop("type", None)) or (ExecutionResult if "plots" in data else CommandResult)
+    for name, handle in data.pop("refs", {}).items():
+        if store is not None:
+            with store.open(handle["digest"]) as f:
+                data[name] = f.read().decode("utf-8")
+    if data.get("usage") is not None:
+        data["usage"] = ResourceUsage(**data["usage"])
+    if "status" in data:
+        data["status"] = RunStatus(data["status"])
+    if "plots" in data:
+        data["plots"] = [_plot_from_wire(plot, store) for plot in data["plots"]]
+    return cls(**data)
+
+
+def _plot_from_wire(data: dict, store: ArtifactStore | None) -> PlotOutput:
+    artifact = None
+    if data.get("artifact") is not None:
+        handle = data["artifact"]
+        path = str(store.object_path(handle["digest"])) if store is not None else ""
+        artifact = Artifact(name=handle["name"], path=path, size=handle["size"], digest=handle["digest"])
+    img = data.get("img")
+    img_base64 = base64.b64encode(img).decode("ascii") if img is not None else data.get("img_base64", "")
+    return PlotOutput(format=FileType(data["format"]), img_base64=img_base64,
+                      width=data.get("width"), height=data.get("height"), artifact=artifact)
+
+
+def dumps(result: ConsoleOutput | CommandResult, format: str = "json", **kwargs) -> bytes:
+    """
+    按传输格式序列化结果
+
+    :param format: json（紧凑，无缩进与多余空白）或 msgpack（二进制，图片不经 base64）
+    :param kwargs: 传给 to_wire 的 store、namespace、inline_bytes
+    """
+    if format == "json":
+        return json.dumps(to_wire(result, **kwargs), separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    if format == "msgpack":
+        return _msgpack().packb(to_wire(result, binary=True, **kwargs), use_bin_type=True)
+    raise ValueError(f"unsupported wire format: {format}, supported: {WIRE_FORMATS}")
+
+
+def loads(payload: bytes, format: str = "json", store: ArtifactStore | None = None) -> ConsoleOutput | CommandResult:
+    """dumps 的逆过程"""
+    if format == "json":
+        return from_wire(json.loads(payload), store)
+    if format == "msgpack":
+        return from_wire(_msgpack().unpackb(payload, raw=False), store)
+    raise ValueError(f"unsupported wire format: {format}, supported: {WIRE_FORMATS}")
+
+
+def _msgpack():
+    if msgpack is None:
+        raise SandboxError("msgpack wire format requires the msgpack package")
+    return msgpack
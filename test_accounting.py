@@ -0,0 +1,113 @@
+import dataclasses
+import os
+import subprocess
+import sys
+import time
+import unittest
+from sandbox.accounting import USAGE_MARKER, attach_usage, strip_usage, usage_marker
+from sandbox.backend.base import RUN_CANCEL_FILE, RUN_PID_FILE, collect_run, kill_run_command, with_run_id, wrap_run
+from sandbox.data import CommandResult, ExecutionRequest, RunStatus, StreamEvent, StreamType
+
+
+class LocalBackend:
+    """在本机子进程中执行命令的后端"""
+
+    def exec_stream(self, container, command):
+        proc = subprocess.run(command, capture_output=True, text=True)
+        if proc.stdout:
+            yield StreamEvent(stream=StreamType.STDOUT, data=proc.stdout)
+        if proc.stderr:
+            yield StreamEvent(stream=StreamType.STDERR, data=proc.stderr)
+        yield StreamEvent(stream=StreamType.EXIT, exit_code=proc.returncode)
+
+    def execute_command(self, container, command):
+        return CommandResult.from_stream(self.exec_stream(container, command))
+
+    def kill_run(self, container, run_id):
+        subprocess.run(kill_run_command(run_id))
+
+
+class TestAccounting(unittest.TestCase):
+    def test_usage(self):
+        """测试运行结果携带资源用量，stderr 中不残留尾部"""
+        code = "import subprocess, sys; sum(range(2000000)); subprocess.run(['true']); print('out'); sys.exit(3)"
+        req = ExecutionRequest(code=code)
+        result = collect_run(LocalBackend(), None, wrap_run([sys.executable, "-c", code], req, accounting=True), req)
+        self.assertEqual((result.exit_code, result.stdout, result.stderr), (3, "out\n", ""))
+        usage = result.usage
+        self.assertGreater(usage.cpu_user + usage.cpu_system, 0)
+        self.assertGreaterEqual(usage.wall_time, 0)
+        self.assertGreaterEqual(usage.processes, 2)
+        self.assertGreaterEqual(usage.bytes_written, 4)
+
+    def test_kill_before_start(self):
+        """测试进程启动前收到的取消在启动时生效，不运行命令"""
+        req = with_run_id(ExecutionRequest(code="", timeout=30))
+        LocalBackend().kill_run(None, req.run_id)
+        result = collect_run(LocalBackend(), None, wrap_run(["echo", "hi"], req), req)
+        self.assertEqual((result.exit_code, result.stdout), (137, ""))
+
+    def test_usage_after_kill(self):
+        """测试超时结束进程后仍能得到资源用量"""
+        command = [sys.executable, "-c", "import time; time.sleep(30)"]
+        req = with_run_id(ExecutionRequest(code="", timeout=0.5))
+        result = collect_run(LocalBackend(), None, wrap_run(command, req, accounting=True), req)
+        self.assertEqual((result.status, result.exit_code), (RunStatus.TIMED_OUT, 137))
+        self.assertIsNotNone(result.usage)
+        self.assertLess(result.usage.wall_time, 10)
+
+    def test_kill_process_group(self):
+        """测试超时时结束整个进程组，继承了输出的后台子进程不会让运行等到其退出"""
+        command = ["sh", "-c", "sleep 30 & sleep 30"]
+        req = with_run_id(ExecutionRequest(code="", timeout=0.5))
+        started = time.monotonic()
+        result = collect_run(LocalBackend(), None, wrap_run(command, req, accounting=True), req)
+        self.assertEqual((result.status, result.exit_code), (RunStatus.TIMED_OUT, 137))
+        self.assertLess(time.monotonic() - started, 10)
+
+    def test_run_files_removed(self):
+        """测试运行结束后删除 pid 文件与取消标记"""
+        req = with_run_id(ExecutionRequest(code="", timeout=30))
+        result = collect_run(LocalBackend(), None, wrap_run(["echo", "hi"], req), req)
+        self.assertEqual((result.exit_code, result.stdout), (0, "hi\n"))
+        LocalBackend().kill_run(None, "other")
+        result = collect_run(LocalBackend(), None, wrap_run(["true"], dataclasses.replace(req, run_id="other")), req)
+        self.assertEqual(result.exit_code, 137)
+        for run_id in (req.run_id, "other"):
+            self.assertFalse(os.path.exists(RUN_PID_FILE.format(run_id=run_id)))
+            self.assertFalse(os.path.exists(RUN_CANCEL_FILE.format(run_id=run_id)))
+
+    def test_split_marker(self):
+        """测试标记被拆分到多个 stderr 事件中"""
+        trailer = f"err{usage_marker('n1')} 1.00 1.50 10 13 42 -\n0m0.00s 0m0.00s\n0m0.20s 0m0.10s\n"
+        events = [StreamEvent(stream=StreamType.STDERR, data=trailer[:5]),
+                  StreamEvent(stream=StreamType.STDERR, data=trailer[5:12]),
+                  StreamEvent(stream=StreamType.STDERR, data=trailer[12:]),
+                  StreamEvent(stream=StreamType.EXIT, exit_code=0)]
+        result = CommandResult.from_stream(attach_usage(iter(events), "n1"))
+        self.assertEqual(result.stderr, "err")
+        self.assertEqual((result.usage.wall_time, result.usage.cpu_user, result.usage.processes,
+                          result.usage.bytes_written, result.usage.peak_rss), (0.5, 0.2, 3, 42, None))
+        self.assertEqual(strip_usage(CommandResult(stderr=trailer), "n1").usage, result.usage)
+
+    def test_forged_marker(self):
+        """测试程序输出的标记（不带本次运行的 nonce，或不在 stderr 末尾）不会被当作资源用量，之后的 stderr 保留"""
+        times = "0m0.00s 0m0.00s\n0m0.20s 0m0.10s\n"
+        forged = f"{USAGE_MARKER} 1.00 1.01 0 0 0 0\n{times}after\n"
+        early = f"{usage_marker('n1')} 1.00 1.01 0 0 0 0\n{times}"
+        real = f"{usage_marker('n1')} 1.00 3.00 10 12 42 -\n{times}"
+        events = [StreamEvent(stream=StreamType.STDERR, data=forged),
+                  StreamEvent(stream=StreamType.STDERR, data=early),
+                  StreamEvent(stream=StreamType.STDERR, data=real),
+                  StreamEvent(stream=StreamType.EXIT, exit_code=0)]
+        result = CommandResult.from_stream(attach_usage(iter(events), "n1"))
+        self.assertEqual(result.stderr, forged + early)
+        self.assertEqual((result.usage.wall_time, result.usage.processes), (2.0, 2))
+        stripped = strip_usage(CommandResult(stderr=forged + early + real), "n1")
+        self.assertEqual((stripped.stderr, stripped.usage), (result.stderr, result.usage))
+        # 没有真正的尾部时原样保留
+        result = CommandResult.from_stream(attach_usage(iter(events[:1] + events[-1:]), "n1"))
+        self.assertEqual((result.stderr, result.usage), (forged, None))
+
+if __name__ == "__main__":
+    unittest.main()
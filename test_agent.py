@@ -0,0 +1,78 @@
+import io
+import os
+import tarfile
+import tempfile
+import unittest
+from sandbox.agent import ExecAgent
+from sandbox.data import OutputCapture
+from test_kernel import LocalChannel
+
+
+class LocalBackend:
+    def __init__(self, workdir):
+        self.workdir = workdir
+
+    def open_channel(self, container, command, environment=None):
+        return LocalChannel(command, self.workdir, environment)
+
+
+class TestExecAgent(unittest.TestCase):
+    def test_single_round_trip(self):
+        """测试一个请求内完成写文件、安装、运行与文件收集"""
+        with tempfile.TemporaryDirectory() as workdir:
+            agent = ExecAgent(LocalBackend(workdir), container=None).start()
+            try:
+                code = os.path.join(workdir, "main.py")
+                data = os.path.join(workdir, "data", "in.txt")
+                out = os.path.join(workdir, "out.txt")
+                result = agent.run(
+                    ["python", code],
+                    files={code: "open('out.txt', 'w').write(open('data/in.txt').read() * 2)\nprint('done')",
+                           data: b"ab"},
+                    install=["python", "-c", "print('installed')"],
+                    collect=[out, os.path.join(workdir, "missing.txt")],
+                )
+                self.assertEqual((result.result.exit_code, result.result.stdout), (0, "done\n"))
+                self.assertEqual(result.install.stdout, "installed\n")
+                self.assertEqual(len(result.files), 1)
+                archive, stat = result.files[0]
+                self.assertEqual(stat["size"], 4)
+                with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+                    self.assertEqual(tar.extractfile("out.txt").read(), b"abab")
+                # 同一个代理可以继续处理后续请求
+                self.assertEqual(agent.run(["python", "-c", "raise SystemExit(2)"]).result.exit_code, 2)
+            finally:
+                agent.shutdown()
+
+    def test_collect_max_bytes(self):
+        """测试收集的文件总大小超过 max_bytes 时代理不读取文件，回复中不含文件内容"""
+        with tempfile.TemporaryDirectory() as workdir:
+            agent = ExecAgent(LocalBackend(workdir), container=None).start()
+            try:
+                for name, size in (("a.bin", 600), ("b.bin", 600)):
+                    with open(os.path.join(workdir, name), "wb") as f:
+                        f.write(b"x" * size)
+                pattern = os.path.join(workdir, "*.bin")
+                result = agent.run(["true"], collect=[pattern], max_bytes=1000)
+                self.assertEqual((result.too_large, result.files), (True, []))
+                result = agent.run(["true"], collect=[pattern], max_bytes=1200)
+                self.assertFalse(result.too_large)
+                self.assertEqual([stat["size"] for _, stat in result.files], [600, 600])
+            finally:
+                agent.shutdown()
+
+    def test_bounded_output(self):
+        """测试容器内只保留输出的开头与结尾"""
+        with tempfile.TemporaryDirectory() as workdir:
+            agent = ExecAgent(LocalBackend(workdir), container=None).start()
+            try:
+                code = "import sys; sys.stdout.write('a' * 10 + 'b' * 100000 + 'c' * 10); sys.stderr.write('e')"
+                result = agent.run(["python", "-c", code], capture=OutputCapture(head_bytes=10, tail_bytes=10)).result
+                self.assertEqual(result.stdout, "a" * 10 + "\n[... 100000 bytes truncated ...]\n" + "c" * 10)
+                self.assertEqual((result.stdout_dropped, result.stderr, result.stderr_dropped), (100000, "e", 0))
+            finally:
+                agent.shutdown()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+import io
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+from pathlib import Path
+from sandbox.artifacts import ArtifactStore, default_artifact_store
+from sandbox.transfer import ChunkReader, build_tar
+
+
+def stream(files, chunk=100):
+    """模拟从容器分块接收的 tar 流"""
+    data = build_tar(files)
+    return ChunkReader(data[offset:offset + chunk] for offset in range(0, len(data), chunk))
+
+
+class TestArtifactStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_save_and_dedup(self):
+        """测试流式保存，相同内容只保存一份"""
+        store = ArtifactStore(self.root)
+        big = os.urandom(3 * 1024 * 1024)
+        artifacts = store.save("s1", stream({"out/a.bin": big, "b.bin": big, "c.txt": "hello"}, chunk=4096))
+        self.assertEqual([a.name for a in artifacts], ["out/a.bin", "b.bin", "c.txt"])
+        a, b, c = artifacts
+        self.assertEqual((a.size, a.digest), (b.size, b.digest))
+        self.assertEqual(Path(a).read_bytes(), big)
+        self.assertEqual(os.stat(a).st_ino, os.stat(b).st_ino)
+        # 共享的内容文件只读
+        self.assertEqual(os.stat(a).st_mode & 0o777, 0o444)
+        self.assertEqual(Path(c.path), self.root / "sessions" / "s1" / "c.txt")
+        self.assertEqual(len(list((self.root / "objects").glob("*/*"))), 2)
+        self.assertEqual(store.save("s2", stream({"c.txt": "hello"}))[0].digest, c.digest)
+        self.assertEqual(len(list((self.root / "objects").glob("*/*"))), 2)
+
+    def test_empty_and_unsafe_names(self):
+        """测试空 tar 与越界路径"""
+        store = ArtifactStore(self.root)
+        self.assertEqual(store.save("s1", io.BytesIO(b"")), [])
+        artifact = store.put("s1", "../../etc/passwd", io.BytesIO(b"x"))
+        self.assertEqual(Path(artifact.path), self.root / "sessions" / "s1" / "passwd")
+
+    @mock.patch("sandbox.artifacts.COLLECT_GRACE", 0)
+    def test_evict(self):
+        """测试按时间与大小淘汰旧会话及不再被引用的内容"""
+        store = ArtifactStore(self.root, max_bytes=2500, max_age=100, evict_interval=0)
+        store.save("old", stream({"a": b"a" * 1000}))
+        os.utime(self.root / "sessions" / "old", (0, 0))
+        store.save("s1", stream({"b": b"b" * 1000}))
+        self.assertFalse((self.root / "sessions" / "old").exists())
+        store.save("s2", stream({"c": b"c" * 1000, "b": b"b" * 1000}))
+        self.assertTrue((self.root / "sessions" / "s1").exists())
+        store.save("s3", stream({"d": b"d" * 1000}))
+        # 超出预算时从最旧的会话开始删除：s1 的内容仍被 s2 引用，删除 s1 后仍超出预算
+        self.assertEqual(sorted(p.name for p in (self.root / "sessions").iterdir()), ["s3"])
+        self.assertEqual(len(list((self.root / "objects").glob("*/*"))), 1)
+        # 刚写入的会话即使单独超出预算也保留
+        store.save("s4", stream({"e": b"e" * 5000}))
+        self.assertTrue((self.root / "sessions" / "s4" / "e").exists())
+
+
+    def test_evict_trigger(self):
+        """测试只在超出预算或到了淘汰间隔时扫描仓库"""
+        store = ArtifactStore(self.root, max_bytes=2500, max_age=100, evict_interval=3600)
+        store.save("old", stream({"a": b"a" * 1000}))
+        os.utime(self.root / "sessions" / "old", (0, 0))
+        with mock.patch.object(store, "evict", wraps=store.evict) as evict:
+            store.save("s1", stream({"b": b"b" * 1000}))
+            store.save("s2", stream({"b": b"b" * 1000}))
+            # 未超出预算且未到间隔：过期的会话暂时保留
+            self.assertEqual(evict.call_count, 0)
+            self.assertTrue((self.root / "sessions" / "old").exists())
+            store.save("s3", stream({"c": b"c" * 1000}))
+            self.assertEqual(evict.call_count, 1)
+            self.assertFalse((self.root / "sessions" / "old").exists())
+            store._maybe_evict("s3", now=time.time() + 3600)
+            self.assertEqual(evict.call_count, 2)
+
+    def test_collect_keeps_unlinked(self):
+        """测试刚写入尚未链接的内容与以复制方式引用的内容不被回收；默认仓库与锁按根目录共享"""
+        store = ArtifactStore(self.root, max_bytes=0, evict_interval=0)
+        fresh = self.root / "objects" / "ab" / ("ab" * 32)
+        fresh.parent.mkdir(parents=True)
+        fresh.write_bytes(b"x")
+        with mock.patch("sandbox.artifacts.os.link", side_effect=OSError):
+            copied = store.put("s1", "a", io.BytesIO(b"copied"))
+        store.evict(keep="s1")
+        self.assertTrue(fresh.exists())
+        with mock.patch("sandbox.artifacts.COLLECT_GRACE", 0):
+            store.evict(keep="s1")
+            self.assertTrue(Path(store.object_path(copied.digest)).exists())
+            self.assertFalse(fresh.exists())
+            os.utime(self.root / "sessions" / "s1", (0, 0))
+            store.evict()
+            self.assertFalse(Path(store.object_path(copied.digest)).exists())
+            self.assertFalse((self.root / "copies" / "s1").exists())
+        self.assertIs(ArtifactStore(self.root)._lock, store._lock)
+        self.assertIs(default_artifact_store(self.root), default_artifact_store(str(self.root) + "/"))
+
+
+if __name__ == "__main__":
+    unittest.main()
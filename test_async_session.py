@@ -0,0 +1,110 @@
+import asyncio
+import threading
+import time
+import unittest
+from unittest import mock
+from sandbox.async_session import AsyncSandboxSession
+from sandbox.data import CommandResult
+
+
+class FakeBackend:
+    def __init__(self):
+        self.killed = threading.Event()
+        self.requests = []
+
+    def run_code(self, container, req):
+        # 模拟长时间运行，直到被 kill_run 结束
+        self.requests.append(req)
+        self.killed.wait(5)
+        return CommandResult(exit_code=137)
+
+    def run_code_get_file(self, container, req):
+        self.requests.append(req)
+        return None, None
+
+    def kill_run(self, container, run_id):
+        if any(req.run_id == run_id for req in self.requests):
+            self.killed.set()
+
+
+class FakeKernel:
+    def __init__(self):
+        self.interrupted = threading.Event()
+        self.executed = False
+
+    def start(self):
+        return self
+
+    def execute(self, code, timeout=None, capture=None):
+        self.executed = True
+        self.interrupted.wait(5)
+        return CommandResult(exit_code=1, stderr="KeyboardInterrupt")
+
+    def interrupt(self):
+        self.interrupted.set()
+
+    def shutdown(self, force=False):
+        pass
+
+
+def fake_session(**kwargs):
+    """委托给真实的 SandboxSession，只替换后端与容器"""
+    session = AsyncSandboxSession(**kwargs)
+    session._session.backend = FakeBackend()
+    session._session.container = object()
+    return session
+
+
+async def cancel_after(coro, delay=0.05):
+    task = asyncio.create_task(coro)
+    await asyncio.sleep(delay)
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        return True
+    return False
+
+
+class TestAsyncSandboxSession(unittest.TestCase):
+    def test_cancel_kills_process(self):
+        """测试取消任务时以本次运行的 run_id 结束容器内进程"""
+        session = fake_session()
+        self.assertTrue(asyncio.run(cancel_after(session.run_code("while True: pass"))))
+        self.assertTrue(session.backend.killed.is_set())
+        self.assertIsNotNone(session.backend.requests[0].run_id)
+
+    def test_cancel_stateful(self):
+        """测试有状态模式下取消任务时中断 kernel 中的代码单元"""
+        session = fake_session(stateful=True)
+        session._session.kernel = FakeKernel()
+        self.assertTrue(asyncio.run(cancel_after(session.run_code("while True: pass"))))
+        self.assertTrue(session._session.kernel.interrupted.is_set())
+        self.assertFalse(session.backend.killed.is_set())
+
+    def test_cancel_during_install(self):
+        """测试有状态与 fork server 模式下，安装依赖期间取消任务时不再启动运行，任务很快结束"""
+        for kwargs in ({"stateful": True}, {"forkserver": True}):
+            session = fake_session(**kwargs)
+            session.backend.install_dependencies = lambda container, language, libraries: time.sleep(0.3)
+            kernel = session._session.kernel = FakeKernel()
+            server = mock.Mock()
+            session._session._get_forkserver = lambda: server
+            started = time.monotonic()
+            self.assertTrue(asyncio.run(cancel_after(session.run_code("while True: pass", dependencies=["x"]))))
+            self.assertLess(time.monotonic() - started, 3)
+            self.assertFalse(kernel.executed)
+            server.run.assert_not_called()
+            self.assertEqual(session._session._cancelled_runs, set())
+
+    def test_file_path_mode(self):
+        """测试生成文件模式委托给 SandboxSession，请求携带 run_id"""
+        session = fake_session()
+        self.assertIsNone(asyncio.run(session.run_code("open('a.txt', 'w')", file_path="a.txt")))
+        req = session.backend.requests[0]
+        self.assertEqual(req.file_path, "a.txt")
+        self.assertIsNotNone(req.run_id)
+
+
+if __name__ == '__main__':
+    unittest.main()
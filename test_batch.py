@@ -0,0 +1,121 @@
+import threading
+import time
+import unittest
+from unittest import mock
+from sandbox.batch import run_batch, run_batch_as_completed
+from sandbox.data import CommandResult, ExecutionRequest
+
+
+class Abort(BaseException):
+    pass
+
+
+class FakeBackend:
+    scrubs = []
+
+    def run_code(self, container, req):
+        if req.code == "boom":
+            raise RuntimeError("backend failure")
+        if req.code == "abort":
+            raise Abort()
+        return CommandResult(stdout=req.code)
+
+    def scrub_workspace(self, container, keep_build=False):
+        FakeBackend.scrubs.append(keep_build)
+        return True
+
+
+class FakeSession:
+    opened = []
+
+    def __init__(self, backend_type=None, language=None, dependencies=None, **kwargs):
+        self.backend = FakeBackend()
+        self.container = object()
+        FakeSession.opened.append((language, tuple(dependencies or ())))
+
+    def run_code(self, code, run_id=None, **kwargs):
+        return self.backend.run_code(self.container, ExecutionRequest(code=code, run_id=run_id))
+
+    def kill_run(self, run_id):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+class BlockingSession(FakeSession):
+    """除第一个请求外一直阻塞，直到被 kill_run 结束"""
+    killed = []
+    started = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.released = threading.Event()
+
+    def run_code(self, code, run_id=None, **kwargs):
+        if code != "fast":
+            BlockingSession.started.set()
+            self.released.wait(5)
+        return CommandResult(stdout=code)
+
+    def kill_run(self, run_id):
+        BlockingSession.killed.append(run_id)
+        self.released.set()
+
+
+class TestRunBatch(unittest.TestCase):
+    def test_ordered_results_and_error_isolation(self):
+        """测试结果按输入顺序返回，单个请求出错不影响其他请求"""
+        FakeSession.opened = []
+        requests = [
+            ExecutionRequest(code="a", dependencies=["numpy"]),
+            ExecutionRequest(code="boom"),
+            ExecutionRequest(code="c", dependencies=["numpy"]),
+            ExecutionRequest(code="d"),
+        ]
+        with mock.patch("sandbox.batch.SandboxSession", FakeSession):
+            batch = run_batch(requests, concurrency=1)
+
+        self.assertEqual([item.index for item in batch.items], [0, 1, 2, 3])
+        self.assertEqual(batch.items[0].result.stdout, "a")
+        self.assertIn("backend failure", batch.items[1].error)
+        self.assertEqual(batch.stats.total, 4)
+        self.assertEqual(batch.stats.errors, 1)
+        # 按 (语言, 依赖集合) 分组，每组只打开一个会话
+        self.assertEqual(len(FakeSession.opened), 2)
+
+    def test_scrub_keeps_build(self):
+        """测试同一会话中的请求之间清理工作目录时保留编译产物"""
+        FakeBackend.scrubs = []
+        with mock.patch("sandbox.batch.SandboxSession", FakeSession):
+            run_batch([ExecutionRequest(code=str(i)) for i in range(3)], concurrency=1)
+        self.assertEqual(FakeBackend.scrubs, [True, True])
+
+    def test_worker_base_exception(self):
+        """测试工作线程因 BaseException 退出时抛出异常，而不是一直等待结果"""
+        requests = [ExecutionRequest(code="a"), ExecutionRequest(code="abort"), ExecutionRequest(code="c")]
+        with mock.patch("sandbox.batch.SandboxSession", FakeSession):
+            with self.assertRaises(Abort):
+                run_batch(requests, concurrency=1)
+
+    def test_early_exit(self):
+        """测试调用方提前结束迭代时立即返回，正在执行的请求被结束，未开始的请求被丢弃"""
+        BlockingSession.killed, BlockingSession.started = [], threading.Event()
+        requests = [ExecutionRequest(code="fast", language="python"),
+                    ExecutionRequest(code="slow", language="javascript", run_id="slow-run"),
+                    ExecutionRequest(code="later", language="javascript")]
+        with mock.patch("sandbox.batch.SandboxSession", BlockingSession):
+            results = run_batch_as_completed(requests, concurrency=2)
+            self.assertEqual(next(results).result.stdout, "fast")
+            self.assertTrue(BlockingSession.started.wait(5))
+            start = time.perf_counter()
+            results.close()
+            self.assertLess(time.perf_counter() - start, 1)
+        self.assertIn("slow-run", BlockingSession.killed)
+
+
+if __name__ == '__main__':
+    unittest.main()
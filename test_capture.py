@@ -0,0 +1,52 @@
+import sys
+import unittest
+from sandbox.backend.base import collect_run, wrap_run
+from sandbox.capture import OutputBuffer
+from sandbox.data import CommandResult, ExecutionRequest, OutputCapture, StreamEvent, StreamType
+from test_accounting import LocalBackend
+
+
+class TestCapture(unittest.TestCase):
+    def test_head_and_tail(self):
+        """测试只保留开头与结尾，中间的字节计数并以标记代替"""
+        buf = OutputBuffer(head_bytes=4, tail_bytes=3)
+        for chunk in ["ab", "cdef", "x" * 1000, "gh", "ij"]:
+            buf.write(chunk)
+        self.assertEqual(buf.dropped, 1003)
+        self.assertEqual(buf.getvalue(), "abcd\n[... 1003 bytes truncated ...]\nhij")
+        buf = OutputBuffer(head_bytes=4, tail_bytes=0)
+        buf.write("abcdef")
+        self.assertEqual((buf.getvalue(), buf.dropped), ("abcd\n[... 2 bytes truncated ...]\n", 2))
+
+    def test_multibyte_boundaries(self):
+        """测试不超过上限时原样返回，截断处被切开的字符被丢弃而不报错"""
+        buf = OutputBuffer(head_bytes=4, tail_bytes=5)
+        buf.write("中文")
+        buf.write("字")
+        self.assertEqual((buf.getvalue(), buf.dropped), ("中文字", 0))
+        buf.write("符号" * 10)
+        self.assertTrue(buf.getvalue().startswith("中\n[... "))
+        self.assertTrue(buf.getvalue().endswith("号"))
+
+    def test_from_stream(self):
+        """测试按流分别截断，结果携带丢弃的字节数"""
+        events = [StreamEvent(stream=StreamType.STDOUT, data="o" * 100),
+                  StreamEvent(stream=StreamType.STDERR, data="err"),
+                  StreamEvent(stream=StreamType.EXIT, exit_code=0)]
+        result = CommandResult.from_stream(events, OutputCapture(head_bytes=10, tail_bytes=10))
+        self.assertEqual((result.stdout_dropped, result.stderr_dropped, result.stderr), (80, 0, "err"))
+        self.assertTrue(result.truncated)
+
+    def test_collect_run_keeps_usage(self):
+        """测试截断 stderr 后仍能从结尾剥离资源用量"""
+        code = "import sys; sys.stderr.write('x' * 200000); print('done')"
+        req = ExecutionRequest(code=code, capture=OutputCapture(head_bytes=16, tail_bytes=4096))
+        result = collect_run(LocalBackend(), None, wrap_run([sys.executable, "-c", code], req, accounting=True), req)
+        self.assertEqual(result.stdout, "done\n")
+        self.assertIsNotNone(result.usage)
+        self.assertGreater(result.stderr_dropped, 190000)
+        self.assertLess(len(result.stderr), 4096 + 100)
+
+
+if __name__ == "__main__":
+    unittest.main()
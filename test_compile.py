@@ -0,0 +1,104 @@
+import io
+import os
+import subprocess
+import tarfile
+import tempfile
+import unittest
+from types import SimpleNamespace
+from sandbox.compile import ArtifactCache, Compiler
+from sandbox.const import SupportedLanguage
+from sandbox.data import CommandResult, ExecutionRequest, RunStatus
+
+
+class LocalBackend:
+    """在本地执行命令，容器内的绝对路径映射到 root 之下"""
+
+    def __init__(self, root):
+        self.root = root
+        self.commands = []
+
+    def _map(self, arg):
+        return arg.replace("/sandbox", f"{self.root}/sandbox")
+
+    def image_digest(self, container):
+        return "sha256:local"
+
+    def install_dependencies(self, container, language, libraries):
+        pass
+
+    def upload_files(self, container, files):
+        for path, content in files.items():
+            local = self._map(path)
+            os.makedirs(os.path.dirname(local), exist_ok=True)
+            with open(local, "w") as f:
+                f.write(content)
+
+    def upload_archive(self, container, data):
+        with tarfile.open(fileobj=io.BytesIO(data)) as tar:
+            tar.extractall(self.root, filter="tar")
+
+    def download_archive(self, container, path):
+        buf = io.BytesIO()
+        with tarfile.open(fileobj=buf, mode="w") as tar:
+            tar.add(self._map(path), arcname=os.path.basename(path))
+        return buf.getvalue()
+
+    def execute_with_limits(self, container, command, req, phase="execute"):
+        self.commands.append((phase, req.timeout))
+        try:
+            proc = subprocess.run([self._map(arg) for arg in command], capture_output=True, text=True,
+                                  timeout=req.timeout)
+        except subprocess.TimeoutExpired:
+            return CommandResult(exit_code=137, status=RunStatus.TIMED_OUT)
+        return CommandResult(exit_code=proc.returncode, stdout=proc.stdout, stderr=proc.stderr)
+
+
+class TestCompiler(unittest.TestCase):
+    def test_compile_once_and_reuse_artifact(self):
+        """测试编译产物缓存：新容器命中缓存时跳过编译，直接运行产物"""
+        code = '#include <cstdio>\nint main() { std::puts("hi"); return 3; }\n'
+        req = ExecutionRequest(code=code, language=SupportedLanguage.CPP, compile_flags=["-O0"])
+        with tempfile.TemporaryDirectory() as cache_dir, tempfile.TemporaryDirectory() as first, \
+                tempfile.TemporaryDirectory() as second:
+            cache = ArtifactCache(cache_dir)
+            result = Compiler(LocalBackend(first), cache).run(SimpleNamespace(id="c1"), req)
+            self.assertEqual((result.exit_code, result.stdout, result.compile_cached), (3, "hi\n", False))
+            self.assertGreater(result.compile_time, 0)
+
+            backend = LocalBackend(second)
+            compiler = Compiler(backend, cache)
+            container = SimpleNamespace(id="c2")
+            for _ in range(2):
+                cached = compiler.run(container, req)
+                self.assertEqual((cached.exit_code, cached.stdout, cached.compile_cached), (3, "hi\n", True))
+                self.assertEqual(cached.compile_time, 0)
+            self.assertEqual(len(backend.commands), 2)
+
+    def test_compile_error(self):
+        """测试编译失败时返回编译器输出"""
+        req = ExecutionRequest(code="int main( {", language=SupportedLanguage.CPP)
+        with tempfile.TemporaryDirectory() as root:
+            result = Compiler(LocalBackend(root)).run(SimpleNamespace(id="c1"), req)
+            self.assertNotEqual(result.exit_code, 0)
+            self.assertIn("error", result.stderr)
+            self.assertEqual(result.run_time, 0)
+
+    def test_compile_with_request_limits(self):
+        """测试编译与运行都按请求的超时执行，编译超时时不运行并返回超时状态"""
+        code = '#include <cstdio>\nint main() { std::puts("hi"); }\n'
+        req = ExecutionRequest(code=code, language=SupportedLanguage.CPP, compile_flags=["-O0"], timeout=60)
+        with tempfile.TemporaryDirectory() as root:
+            backend = LocalBackend(root)
+            result = Compiler(backend).run(SimpleNamespace(id="c1"), req)
+            self.assertEqual(result.stdout, "hi\n")
+            self.assertEqual(backend.commands, [("compile", 60), ("execute", 60)])
+        with tempfile.TemporaryDirectory() as root:
+            backend = LocalBackend(root)
+            req = ExecutionRequest(code=code, language=SupportedLanguage.CPP, compile_flags=["-O0"], timeout=0.001)
+            result = Compiler(backend).run(SimpleNamespace(id="c1"), req)
+            self.assertEqual((result.exit_code, result.status, result.run_time), (137, RunStatus.TIMED_OUT, 0))
+            self.assertEqual(backend.commands, [("compile", 0.001)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import os
+import tempfile
+import threading
+import unittest
+from sandbox.capture import TRUNCATION_MARKER
+from sandbox.data import OutputCapture
+from sandbox.forkserver import ForkServer
+from test_kernel import LocalChannel
+
+
+class LocalBackend:
+    def __init__(self, workdir):
+        self.workdir = workdir
+
+    def open_channel(self, container, command, environment=None):
+        return LocalChannel(command, self.workdir, environment)
+
+    def upload_files(self, container, files):
+        for path, content in files.items():
+            with open(os.path.join(self.workdir, path), "w") as f:
+                f.write(content)
+
+
+class TestForkServer(unittest.TestCase):
+    def test_fork_per_run(self):
+        """测试每次运行 fork 独立子进程，输出分别捕获，超时后 kill 子进程"""
+        with tempfile.TemporaryDirectory() as workdir:
+            server = ForkServer(LocalBackend(workdir), container=None, preload=["json", "not_a_module"]).start()
+            try:
+                self.assertEqual(server.preloaded, ["json"])
+                ok = server.run("import sys\nprint('out')\nprint('err', file=sys.stderr)")
+                self.assertEqual((ok.exit_code, ok.stdout, ok.stderr), (0, "out\n", "err\n"))
+                self.assertEqual(server.run("x = 1\nraise SystemExit(3)").exit_code, 3)
+                # 子进程之间互相隔离
+                self.assertIn("NameError", server.run("print(x)").stderr)
+                killed = server.run("while True: pass", timeout=0.5)
+                self.assertEqual((killed.exit_code, killed.timed_out), (137, True))
+            finally:
+                server.shutdown()
+
+
+    def test_bounded_output(self):
+        """测试子进程输出在 fork server 内只保留开头与结尾"""
+        with tempfile.TemporaryDirectory() as workdir:
+            server = ForkServer(LocalBackend(workdir), container=None, preload=[]).start()
+            try:
+                result = server.run("import sys\nsys.stderr.write('a' * 5 + 'b' * 100 + 'c' * 5)",
+                                    capture=OutputCapture(head_bytes=5, tail_bytes=5))
+                self.assertEqual(result.stderr, "a" * 5 + TRUNCATION_MARKER.format(dropped=100) + "c" * 5)
+                self.assertEqual((result.stdout, result.stdout_dropped, result.stderr_dropped), ("", 0, 100))
+            finally:
+                server.shutdown()
+
+
+    def test_kill_by_run_id(self):
+        """测试在其他线程中以 run_id 结束运行中的子进程"""
+        with tempfile.TemporaryDirectory() as workdir:
+            server = ForkServer(LocalBackend(workdir), container=None, preload=[]).start()
+            try:
+                timer = threading.Timer(0.5, server.kill, args=("run-1",))
+                timer.start()
+                killed = server.run("while True: pass", timeout=10, run_id="run-1")
+                timer.join()
+                self.assertEqual((killed.exit_code, killed.timed_out), (137, False))
+                self.assertEqual(server._runs, {})
+            finally:
+                server.shutdown()
+
+    def test_kill_before_start(self):
+        """测试子进程启动前收到的 kill 在以该 run_id 运行时生效，不再运行代码"""
+        with tempfile.TemporaryDirectory() as workdir:
+            server = ForkServer(LocalBackend(workdir), container=None, preload=[]).start()
+            try:
+                server.kill("run-1")
+                killed = server.run("while True: pass", timeout=10, run_id="run-1")
+                self.assertEqual((killed.exit_code, killed.stdout), (137, ""))
+                # 取消只生效一次
+                self.assertEqual(server.run("print(1)", run_id="run-1").stdout, "1\n")
+            finally:
+                server.shutdown()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+from sandbox.backend.k8s import DEPLOYMENT_LABEL, SESSION_LABEL, K8sBackend
+from sandbox.errors import BackendError
+
+
+def pod(name, phase, ready=False):
+    conditions = [SimpleNamespace(type="Ready", status="True" if ready else "False")]
+    return SimpleNamespace(metadata=SimpleNamespace(name=name, labels={}),
+                           status=SimpleNamespace(phase=phase, conditions=conditions))
+
+
+class FakeWatch:
+    """按顺序推送预先设定的事件，事件用完即视为 watch 超时结束"""
+
+    events = []
+    calls = []
+
+    def __init__(self):
+        self.stopped = False
+
+    def stream(self, func, **kwargs):
+        FakeWatch.calls.append((self, kwargs))
+        yield from FakeWatch.events
+
+    def stop(self):
+        self.stopped = True
+
+
+class FakeAppsApi:
+    def __init__(self):
+        self.created = []
+        self.deleted = []
+
+    def create_namespaced_deployment(self, namespace, body):
+        self.created.append(body)
+
+    def delete_namespaced_deployment(self, name, namespace, **kwargs):
+        self.deleted.append(name)
+
+
+def make_backend():
+    with mock.patch("sandbox.backend.k8s.config.load_kube_config"):
+        backend = K8sBackend(namespace="test")
+    backend.apps_v1_api = FakeAppsApi()
+    backend.core_v1_api = SimpleNamespace(list_namespaced_pod=None)
+    return backend
+
+
+class TestWaitForPod(unittest.TestCase):
+    def setUp(self):
+        FakeWatch.calls = []
+        patcher = mock.patch("sandbox.backend.k8s.watch.Watch", FakeWatch)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_ready_after_modified_events(self):
+        """测试按会话标签 watch，Pod 进入 Running 且 Ready 时立即返回"""
+        FakeWatch.events = [
+            {"type": "ADDED", "object": pod("p1", "Pending")},
+            {"type": "MODIFIED", "object": pod("p1", "Running")},
+            {"type": "MODIFIED", "object": pod("p1", "Running", ready=True)},
+            {"type": "MODIFIED", "object": pod("p1", "Failed")},
+        ]
+        result = make_backend()._wait_for_pod_running("abc", timeout=5)
+        self.assertEqual((result.metadata.name, result.status.phase), ("p1", "Running"))
+        watcher, kwargs = FakeWatch.calls[0]
+        self.assertEqual(kwargs["label_selector"], f"{SESSION_LABEL}=abc")
+        self.assertEqual((kwargs["namespace"], kwargs["timeout_seconds"]), ("test", 5))
+        self.assertTrue(watcher.stopped)
+
+    def test_timeout_and_deletion(self):
+        """测试 Pod 被删除后 watch 超时结束时报错，Pod 失败时立即报错"""
+        FakeWatch.events = [
+            {"type": "ADDED", "object": pod("p1", "Pending")},
+            {"type": "DELETED", "object": pod("p1", "Pending")},
+        ]
+        with self.assertRaisesRegex(BackendError, "did not start in time"):
+            make_backend()._wait_for_pod_running("abc", timeout=1)
+        self.assertTrue(FakeWatch.calls[0][0].stopped)
+        FakeWatch.events = [{"type": "MODIFIED", "object": pod("p1", "Failed")}]
+        with self.assertRaisesRegex(BackendError, "Failed"):
+            make_backend()._wait_for_pod_running("abc", timeout=1)
+
+    def test_create_deletes_deployment_on_timeout(self):
+        """测试 Deployment 与 Pod 带会话标签，等待超时后删除刚创建的 Deployment"""
+        FakeWatch.events = []
+        backend = make_backend()
+        with self.assertRaises(BackendError):
+            backend.create_container("python")
+        deployment = backend.apps_v1_api.created[0]
+        labels = deployment.spec.template.metadata.labels
+        session_id = labels[SESSION_LABEL]
+        self.assertEqual(deployment.spec.selector.match_labels[SESSION_LABEL], session_id)
+        self.assertEqual(FakeWatch.calls[0][1]["label_selector"], f"{SESSION_LABEL}={session_id}")
+        self.assertEqual(backend.apps_v1_api.deleted, [labels[DEPLOYMENT_LABEL]])
+
+
+if __name__ == "__main__":
+    unittest.main()
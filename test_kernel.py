@@ -0,0 +1,94 @@
+import os
+import select
+import subprocess
+import tempfile
+import unittest
+from sandbox.capture import TRUNCATION_MARKER
+from sandbox.data import OutputCapture
+from sandbox.kernel import PythonKernel
+from sandbox.runtime import ExecChannel
+
+
+class LocalChannel(ExecChannel):
+    """在本地子进程中运行容器内脚本，用于测试协议"""
+
+    def __init__(self, command, workdir, environment=None):
+        env = dict(os.environ, **(environment or {}), SANDBOX_WORKDIR=workdir)
+        self.proc = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                     stderr=subprocess.PIPE, env=env)
+
+    def send(self, data):
+        self.proc.stdin.write(data)
+        self.proc.stdin.flush()
+
+    def recv(self, timeout=None):
+        ready, _, _ = select.select([self.proc.stdout], [], [], timeout)
+        if not ready:
+            raise TimeoutError()
+        return os.read(self.proc.stdout.fileno(), 65536)
+
+    def stderr(self):
+        return ""
+
+    def close(self):
+        self.proc.kill()
+        self.proc.communicate()
+
+
+class LocalBackend:
+    def __init__(self, workdir):
+        self.workdir = workdir
+
+    def open_channel(self, container, command, environment=None):
+        return LocalChannel(command, self.workdir)
+
+    def execute_command(self, container, command, **kwargs):
+        subprocess.run(command)
+
+
+class TestPythonKernel(unittest.TestCase):
+    def test_state_persists_between_cells(self):
+        """测试代码单元之间共享命名空间，输出按单元分别捕获"""
+        with tempfile.TemporaryDirectory() as workdir:
+            kernel = PythonKernel(LocalBackend(workdir), container=None).start()
+            try:
+                first = kernel.execute("x = 40\nprint('first')")
+                self.assertEqual(first.stdout, "first\n")
+                second = kernel.execute("import sys\nprint(x + 2)\nprint('warn', file=sys.stderr)")
+                self.assertEqual(second.stdout, "42\n")
+                self.assertEqual(second.stderr, "warn\n")
+                error = kernel.execute("1 / 0")
+                self.assertEqual(error.exit_code, 1)
+                self.assertIn("ZeroDivisionError", error.stderr)
+            finally:
+                kernel.shutdown(force=True)
+
+    def test_interrupt_running_cell(self):
+        """测试超时后中断正在执行的代码单元，kernel 仍可继续使用"""
+        with tempfile.TemporaryDirectory() as workdir:
+            kernel = PythonKernel(LocalBackend(workdir), container=None).start()
+            try:
+                result = kernel.execute("y = 1\nwhile True: pass", timeout=0.5)
+                self.assertEqual(result.exit_code, 130)
+                self.assertIn("KeyboardInterrupt", result.stderr)
+                self.assertEqual(kernel.execute("print(y)").stdout, "1\n")
+            finally:
+                kernel.shutdown(force=True)
+
+
+    def test_bounded_output(self):
+        """测试输出在 kernel 内只保留开头与结尾，丢弃的字节数随结果返回"""
+        with tempfile.TemporaryDirectory() as workdir:
+            kernel = PythonKernel(LocalBackend(workdir), container=None).start()
+            try:
+                result = kernel.execute("print('a' * 10 + 'b' * 1000 + 'c' * 10, end='')",
+                                        capture=OutputCapture(head_bytes=10, tail_bytes=10))
+                self.assertEqual(result.stdout, "a" * 10 + TRUNCATION_MARKER.format(dropped=1000) + "c" * 10)
+                self.assertEqual((result.stdout_dropped, result.stderr_dropped), (1000, 0))
+                self.assertTrue(result.truncated)
+            finally:
+                kernel.shutdown(force=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
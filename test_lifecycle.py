@@ -0,0 +1,51 @@
+import subprocess
+import sys
+import time
+import unittest
+from sandbox.lifecycle import GarbageCollector, SandboxResource, owner_alive, owner_id
+
+
+class FakeBackend:
+    def __init__(self, resources):
+        self.resources = resources
+        self.removed = []
+
+    def list_sandbox_resources(self):
+        return self.resources
+
+    def remove_resources(self, resources):
+        self.removed.extend(r.name for r in resources)
+        return len(resources)
+
+
+class TestGarbageCollector(unittest.TestCase):
+    def test_owner_alive(self):
+        """测试本机所有者进程存活判断，其他主机无法判断"""
+        self.assertTrue(owner_alive(owner_id()))
+        proc = subprocess.Popen([sys.executable, "-c", "pass"])
+        proc.wait()
+        self.assertFalse(owner_alive(f"{owner_id().rpartition('-')[0]}-{proc.pid}"))
+        self.assertIsNone(owner_alive("otherhost-1"))
+
+    def test_sweep_expired_and_orphaned(self):
+        """测试回收所有者已退出的资源，以及无法判断所有者时超过 TTL 的资源"""
+        now = time.time()
+        proc = subprocess.Popen([sys.executable, "-c", "pass"])
+        proc.wait()
+        dead = f"{owner_id().rpartition('-')[0]}-{proc.pid}"
+        backend = FakeBackend([
+            SandboxResource(kind="container", name="fresh", owner=owner_id(), created=now),
+            SandboxResource(kind="container", name="expired", owner="otherhost-1", created=now - 120),
+            # 所有者仍存活的资源即使超过 TTL 也可能正在使用
+            SandboxResource(kind="container", name="in-use", owner=owner_id(), created=now - 120),
+            SandboxResource(kind="container", name="own-ttl", owner="otherhost-1", created=now - 20, ttl=10),
+            SandboxResource(kind="container", name="orphan", owner=dead, created=now),
+            SandboxResource(kind="container", name="remote", owner="otherhost-1", created=now - 20),
+        ])
+        gc = GarbageCollector([backend], ttl=60)
+        self.assertEqual(gc.sweep(), 3)
+        self.assertEqual(sorted(backend.removed), ["expired", "orphan", "own-ttl"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,157 @@
+import threading
+import time
+import unittest
+from unittest import mock
+from sandbox.backend.base import RunLimiter, with_run_id
+from sandbox.backend.docker import DockerBackend
+from sandbox.session import SandboxSession
+from sandbox.data import ExecutionRequest, OutputCapture, RunStatus, StreamEvent, StreamType
+
+
+class FakeBackend:
+    def __init__(self):
+        self.killed = threading.Event()
+
+    def kill_run(self, container, run_id):
+        self.killed.set()
+
+    def events(self, chunks, delay=0.0):
+        """模拟容器内进程的输出，被 kill 后以 137 退出"""
+        for _ in range(chunks):
+            if self.killed.is_set():
+                yield StreamEvent(stream=StreamType.EXIT, exit_code=137)
+                return
+            yield StreamEvent(stream=StreamType.STDOUT, data="x" * 10)
+            time.sleep(delay)
+        yield StreamEvent(stream=StreamType.EXIT, exit_code=0)
+
+
+class TestRunLimiter(unittest.TestCase):
+    def test_completed(self):
+        backend = FakeBackend()
+        req = with_run_id(ExecutionRequest(code="", timeout=5, max_output_bytes=100))
+        self.assertIsNotNone(req.run_id)
+        result = RunLimiter(backend, None, req).collect(backend.events(3))
+        self.assertEqual((result.exit_code, len(result.stdout), result.status), (0, 30, RunStatus.COMPLETED))
+
+    def test_output_limit(self):
+        """测试输出超过上限时截断并结束进程"""
+        backend = FakeBackend()
+        req = with_run_id(ExecutionRequest(code="", max_output_bytes=25))
+        result = RunLimiter(backend, None, req).collect(backend.events(1000))
+        self.assertEqual((result.exit_code, result.stdout, result.status),
+                         (137, "x" * 25, RunStatus.OUTPUT_LIMIT_EXCEEDED))
+
+    def test_timeout(self):
+        """测试超时后结束进程，结果标记为超时"""
+        backend = FakeBackend()
+        req = with_run_id(ExecutionRequest(code="", timeout=0.2))
+        result = RunLimiter(backend, None, req).collect(backend.events(1000, delay=0.02))
+        self.assertTrue(result.timed_out)
+        self.assertEqual(result.exit_code, 137)
+
+    def test_stream_left_open(self):
+        """测试结束进程后输出流仍未关闭时，等待 KILL_GRACE 秒后直接返回"""
+        def events():
+            yield StreamEvent(stream=StreamType.STDOUT, data="x")
+            threading.Event().wait()
+
+        req = with_run_id(ExecutionRequest(code="", timeout=0.2))
+        limiter = RunLimiter(FakeBackend(), None, req)
+        limiter.KILL_GRACE = 0.2
+        started = time.monotonic()
+        result = limiter.collect(events())
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertEqual((result.exit_code, result.stdout, result.status), (137, "x", RunStatus.TIMED_OUT))
+
+
+
+class FakeResponse:
+    def raise_for_status(self):
+        pass
+
+
+class FakeAPI:
+    base_url = "http://docker"
+    api_version = "1.41"
+
+    def __init__(self):
+        self.posts = []
+
+    def post(self, url, json):
+        self.posts.append(json)
+        return FakeResponse()
+
+
+class FakeClient:
+    def __init__(self):
+        self.api = FakeAPI()
+
+
+class FakeContainer:
+    id = "c1"
+
+    def __init__(self):
+        self.updates = []
+
+    def update(self, **kwargs):
+        self.updates.append(kwargs)
+
+    def exec_run(self, cmd):
+        return type("Result", (), {"exit_code": 0, "output": b""})()
+
+
+class TestDockerLimits(unittest.TestCase):
+    def test_limits_not_sticky(self):
+        """测试每次写入全部限制，未设置的项恢复为不限制，清理工作目录时也恢复"""
+        client = FakeClient()
+        backend = DockerBackend(client)
+        container = FakeContainer()
+        backend._apply_limits(container, ExecutionRequest(code="", memory=64 * 1024 ** 2))
+        backend._apply_limits(container, ExecutionRequest(code=""))
+        backend._apply_limits(container, ExecutionRequest(code="", cpus=2))
+        memory = [update["mem_limit"] for update in container.updates]
+        self.assertEqual(memory, [64 * 1024 ** 2, -1, -1])
+        self.assertEqual([update["cpu_quota"] for update in container.updates], [-1, -1, 200000])
+        self.assertEqual(client.api.posts, [{"PidsLimit": -1}] * 3)
+        # 与当前限制相同时不再调用
+        backend._apply_limits(container, ExecutionRequest(code="", cpus=2))
+        self.assertEqual(len(container.updates), 3)
+        self.assertTrue(backend.scrub_workspace(container))
+        self.assertEqual(container.updates[-1]["cpu_quota"], -1)
+
+    def test_unenforced_limits_rejected(self):
+        """测试 kernel / fork server / 生成文件模式下传入无法施加的限制时报错"""
+        for kwargs in ({"stateful": True}, {"forkserver": True}):
+            session = SandboxSession(**kwargs)
+            session.backend, session.container = object(), object()
+            with self.assertRaises(ValueError):
+                session.run_code("print(1)", memory=1024)
+            with self.assertRaises(ValueError):
+                session.run_code("print(1)", plots=True)
+        with self.assertRaises(ValueError):
+            session.run_code("print(1)", file_path=["out.txt"], memory=1024)
+
+    def test_file_generation_limits(self):
+        """测试生成文件模式把超时与输出上限传给后端"""
+        session = SandboxSession()
+        session.container = object()
+        session.backend = mock.Mock()
+        session.backend.run_code_get_file.return_value = (None, None)
+        session.run_code("print(1)", file_path=["out.txt"], timeout=3, max_output_bytes=10)
+        request = session.backend.run_code_get_file.call_args.args[1]
+        self.assertEqual((request.timeout, request.max_output_bytes), (3, 10))
+
+    def test_capture_in_kernel(self):
+        """测试有状态模式支持输出保留上限 capture，原样交给 kernel"""
+        session = SandboxSession(stateful=True)
+        session.backend, session.container = object(), object()
+        session.kernel = mock.Mock()
+        session.kernel.start.return_value = session.kernel
+        capture = OutputCapture(head_bytes=10, tail_bytes=10)
+        session.run_code("print(1)", capture=capture)
+        session.kernel.execute.assert_called_once_with("print(1)", timeout=None, capture=capture)
+
+
+if __name__ == '__main__':
+    unittest.main()
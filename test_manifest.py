@@ -0,0 +1,103 @@
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+from sandbox.backend.docker import DockerBackend
+from sandbox.backend.k8s import USED_LABEL, K8sBackend
+from sandbox.const import SupportedLanguage
+from sandbox.manifest import ManifestCache, missing_dependencies, parse_manifest
+
+
+class FakeContainer:
+    def __init__(self):
+        self.id = "c1"
+        self.attrs = {"Image": "sha256:base"}
+        self.commands = []
+
+    def start(self):
+        pass
+
+    def exec_run(self, cmd, **kwargs):
+        self.commands.append(cmd)
+        return SimpleNamespace(exit_code=0, output=b"numpy==1.26.4\n")
+
+
+class FakeContainers:
+    def __init__(self):
+        self.container = FakeContainer()
+
+    def create(self, **kwargs):
+        return self.container
+
+
+class TestManifest(unittest.TestCase):
+    def test_python_manifest(self):
+        """测试 pip 清单解析与缺失依赖比较"""
+        manifest = parse_manifest(SupportedLanguage.PYTHON, "numpy==1.26.4\nPyYAML==6.0.1\n")
+        self.assertEqual(manifest["pyyaml"], "6.0.1")
+        missing = missing_dependencies(
+            SupportedLanguage.PYTHON,
+            ["numpy", "pyyaml==6.0.1", "pandas", "numpy>=2"],
+            manifest,
+        )
+        self.assertEqual(missing, ["pandas", "numpy>=2"])
+
+    def test_npm_manifest(self):
+        """测试 npm 清单解析（含 scope 包）"""
+        output = (
+            "/usr/local/lib/node_modules/npm:npm@8.19.4:undefined\n"
+            "/sandbox/node_modules/@types/node:@types/node@20.1.0:undefined\n"
+        )
+        manifest = parse_manifest(SupportedLanguage.JAVASCRIPT, output)
+        missing = missing_dependencies(
+            SupportedLanguage.JAVASCRIPT,
+            ["npm", "@types/node@20.1.0", "lodash"],
+            manifest,
+        )
+        self.assertEqual(missing, ["lodash"])
+
+    def test_gem_manifest(self):
+        """测试 gem 清单解析"""
+        manifest = parse_manifest(SupportedLanguage.RUBY, "rake (13.0.3, 12.3.3)\njson (default: 2.5.1)\n")
+        self.assertEqual(manifest["json"], "2.5.1")
+        self.assertEqual(missing_dependencies(SupportedLanguage.RUBY, ["rake", "json:2.6.0"], manifest), ["json:2.6.0"])
+
+
+class TestPrimeManifest(unittest.TestCase):
+    def test_manifest_built_before_user_code(self):
+        """测试清单在容器启动时生成，之后运行期间只使用已缓存的清单，不再在容器中列包"""
+        with tempfile.TemporaryDirectory() as tmp:
+            client = SimpleNamespace(containers=FakeContainers())
+            backend = DockerBackend(client, manifest_cache=ManifestCache(tmp), accounting=False)
+            container = backend.create_container("python")
+            backend.start_container(container)
+            self.assertEqual(len(container.commands), 1)
+            missing = backend._dependencies_to_install(container, SupportedLanguage.PYTHON, ["numpy", "pandas"])
+            self.assertEqual((missing, len(container.commands)), (["pandas"], 1))
+            # 没有清单的镜像（未经 start_container 启动）安装全部依赖，不在容器中列包
+            container.attrs["Image"] = "sha256:other"
+            missing = backend._dependencies_to_install(container, SupportedLanguage.PYTHON, ["numpy"])
+            self.assertEqual((missing, len(container.commands)), (["numpy"], 1))
+
+    def test_k8s_skips_used_pod(self):
+        """测试曾被租用过的池 Pod 不生成清单，归还时打上标记"""
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        with mock.patch("sandbox.backend.k8s.config.load_kube_config"):
+            backend = K8sBackend(manifest_cache=ManifestCache(tmp.name))
+        backend.core_v1_api = mock.Mock()
+        backend.execute_command = mock.Mock(return_value=SimpleNamespace(stdout="numpy==1.26.4\n"))
+        status = SimpleNamespace(container_statuses=[SimpleNamespace(image_id="sha256:base")])
+        pod = SimpleNamespace(metadata=SimpleNamespace(name="p1", labels={USED_LABEL: "1"}), status=status)
+        backend.prime_manifest(pod, "python")
+        backend.execute_command.assert_not_called()
+        backend.return_pod(pod)
+        body = backend.core_v1_api.patch_namespaced_pod.call_args.kwargs["body"]
+        self.assertEqual(body["metadata"]["labels"][USED_LABEL], "1")
+        pod.metadata.labels = {}
+        backend.prime_manifest(pod, "python")
+        self.assertEqual(backend._image_manifest(pod, SupportedLanguage.PYTHON), {"numpy": "1.26.4"})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import tempfile
+import unittest
+import urllib.request
+from pathlib import Path
+from sandbox.metrics import MetricsRegistry
+
+
+class TestMetrics(unittest.TestCase):
+    def test_disabled_records_nothing(self):
+        """测试关闭时 phase 不记录"""
+        registry = MetricsRegistry()
+        with registry.phase("create", "docker", "python"):
+            pass
+        self.assertEqual(registry.phase_seconds.count("create", "docker", "python"), 0)
+
+    def test_phase_outcome(self):
+        """测试按阶段记录耗时与成功/失败计数"""
+        registry = MetricsRegistry(enabled=True)
+        with registry.phase("execute", "docker", "python"):
+            pass
+        with self.assertRaises(RuntimeError):
+            with registry.phase("execute", "docker", "python"):
+                raise RuntimeError("boom")
+        self.assertEqual(registry.phase_seconds.count("execute", "docker", "python"), 2)
+        self.assertEqual(registry.phase_total.get("execute", "docker", "python", "ok"), 1)
+        self.assertEqual(registry.phase_total.get("execute", "docker", "python", "error"), 1)
+
+    def test_exposition(self):
+        """测试 Prometheus 文本格式导出与写文件"""
+        registry = MetricsRegistry(enabled=True)
+        registry.phase_seconds.observe(0.3, "start", "kubernetes", "")
+        text = registry.expose()
+        self.assertIn("# TYPE sandbox_phase_duration_seconds histogram", text)
+        self.assertIn('sandbox_phase_duration_seconds_bucket{phase="start",backend="kubernetes",language="",le="0.25"} 0.0', text)
+        self.assertIn('sandbox_phase_duration_seconds_bucket{phase="start",backend="kubernetes",language="",le="0.5"} 1.0', text)
+        self.assertIn('sandbox_phase_duration_seconds_count{phase="start",backend="kubernetes",language=""} 1.0', text)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "sandbox.prom"
+            registry.dump(path)
+            self.assertEqual(path.read_text(encoding="utf-8"), text)
+
+    def test_serve(self):
+        """测试通过 HTTP 端点抓取"""
+        registry = MetricsRegistry(enabled=True)
+        with registry.phase("remove", "docker"):
+            pass
+        server = registry.serve(port=0)
+        try:
+            url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+            with urllib.request.urlopen(url, timeout=5) as resp:
+                body = resp.read().decode("utf-8")
+            self.assertIn('sandbox_phase_total{phase="remove",backend="docker",language="",outcome="ok"} 1.0', body)
+        finally:
+            registry.shutdown()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+import base64
+import io
+import json
+import os
+import subprocess
+import sys
+import tarfile
+import tempfile
+import textwrap
+import unittest
+from pathlib import Path
+from sandbox.data import CommandResult, FileType, PlotCapture
+from sandbox.artifacts import ArtifactStore
+from sandbox.plots import PLOTS_ROOT, plot_command, plot_directory, read_plots
+
+# 只实现捕获所需接口的 matplotlib.pyplot，savefig 按像素数写出字节
+FAKE_PYPLOT = textwrap.dedent("""
+    _figures = {}
+
+    class Figure:
+        def __init__(self, size):
+            self.dpi = 100
+            self.size = size
+
+        def get_size_inches(self):
+            return self.size
+
+        def savefig(self, buf, format, dpi):
+            w, h = self.size
+            buf.write(b"x" * int(w * dpi * h * dpi // 1000))
+
+    def figure(num=None, figsize=(6.4, 4.8)):
+        if num not in _figures:
+            num = num or len(_figures) + 1
+            _figures[num] = Figure(figsize)
+        return _figures[num]
+
+    def get_fignums():
+        return sorted(_figures)
+
+    def close(which):
+        _figures.clear()
+""")
+
+
+class TestPlots(unittest.TestCase):
+    def run_bootstrap(self, code, capture):
+        """在本地运行启动脚本，把图表目录打包为 tar（与 stream_artifacts 的成员路径一致）交给 read_plots"""
+        with tempfile.TemporaryDirectory() as tmp:
+            pkg = Path(tmp) / "lib" / "matplotlib"
+            pkg.mkdir(parents=True)
+            (pkg / "__init__.py").write_text("")
+            (pkg / "pyplot.py").write_text(FAKE_PYPLOT)
+            script = Path(tmp) / "main.py"
+            script.write_text(code)
+            command = plot_command(str(script), capture)
+            config = json.loads(command[3])
+            root = Path(tmp) / "plots"
+            (root / "other").mkdir(parents=True)
+            (root / "run").mkdir()
+            (root / "run" / "stale.png").write_bytes(b"stale")
+            config.update(directory=str(root / "run"))
+            command = [sys.executable, *command[1:3], json.dumps(config), *command[4:]]
+            env = {**os.environ, "PYTHONPATH": str(Path(tmp) / "lib")}
+            proc = subprocess.run(command, capture_output=True, text=True, env=env)
+            # 只清理本次运行的目录，其他运行的目录保留
+            self.assertTrue((root / "other").exists())
+            self.assertFalse((root / "run" / "stale.png").exists())
+            archive = io.BytesIO()
+            if (root / "run").exists():
+                with tarfile.open(fileobj=archive, mode="w") as tar:
+                    tar.add(root / "run", arcname="sandbox/.plots/run")
+            archive.seek(0)
+            store = ArtifactStore(Path(tmp) / "store")
+            plots = read_plots(archive, capture, store, "session")
+            result = CommandResult(exit_code=proc.returncode, stdout=proc.stdout, stderr=proc.stderr)
+            artifacts = [Path(p.artifact.path).read_bytes() for p in plots if p.artifact is not None]
+            return result, plots, artifacts
+
+    def test_inline_and_artifact(self):
+        """测试小图内联、大图保存到仓库，像素尺寸不超过上限，stderr 中没有清单"""
+        code = textwrap.dedent("""
+            import matplotlib.pyplot as plt
+            plt.figure(figsize=(2, 1))
+            plt.figure(figsize=(40, 10))
+            print("done")
+        """)
+        capture = PlotCapture(format=FileType.SVG, dpi=100, max_width=2000, inline_bytes=100)
+        result, plots, artifacts = self.run_bootstrap(code, capture)
+        self.assertEqual((result.exit_code, result.stdout, result.stderr), (0, "done\n", ""))
+        self.assertEqual(len(plots), 2)
+        small, large = plots
+        self.assertEqual((small.format, small.width, small.height), (FileType.SVG, 200, 100))
+        self.assertEqual(len(base64.b64decode(small.img_base64)), 20)
+        self.assertIsNone(small.artifact)
+        self.assertEqual((large.width, large.height, large.img_base64), (2000, 500, ""))
+        self.assertEqual(large.artifact.name, ".plots/run/plot_1.svg")
+        self.assertEqual(len(artifacts[0]), large.artifact.size)
+
+    def test_capture_after_error(self):
+        """测试代码抛出异常时仍捕获已创建的图表，不导入 matplotlib 时没有图表目录"""
+        code = "import matplotlib.pyplot as plt\nplt.figure(figsize=(1, 1))\nraise ValueError('bad')\n"
+        result, plots, _ = self.run_bootstrap(code, PlotCapture())
+        self.assertEqual(result.exit_code, 1)
+        self.assertIn("ValueError: bad", result.stderr)
+        self.assertEqual(len(plots), 1)
+        result, plots, _ = self.run_bootstrap("print('hi')\n", PlotCapture())
+        self.assertEqual((result.stdout, plots), ("hi\n", []))
+        self.assertNotIn("matplotlib", result.stderr)
+
+    def test_plot_directory(self):
+        """测试每次运行使用根目录下独立的图表目录"""
+        first, second = plot_directory(), plot_directory()
+        self.assertNotEqual(first, second)
+        self.assertTrue(first.startswith(PLOTS_ROOT + "/"))
+        config = json.loads(plot_command("main.py", PlotCapture(directory=first))[3])
+        self.assertEqual(config["directory"], first)
+
+
+if __name__ == "__main__":
+    unittest.main()
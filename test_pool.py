@@ -0,0 +1,110 @@
+import unittest
+from sandbox.backend.base import Backend
+from sandbox.const import SupportedLanguage
+from sandbox.errors import BackendError
+from sandbox.pool import ContainerPool, K8sPodPool
+from types import SimpleNamespace
+
+
+class FakeContainer:
+    def __init__(self, idx):
+        self.idx = idx
+        self.healthy = True
+        self.removed = False
+
+
+class FakeBackend(Backend):
+    def __init__(self):
+        self.created = 0
+        self.scrubbed = []
+
+    def create_container(self, lang: str, **kwargs):
+        self.created += 1
+        return FakeContainer(self.created)
+
+    def remove_container(self, container):
+        container.removed = True
+
+    def health_check(self, container) -> bool:
+        return container.healthy
+
+    def scrub_workspace(self, container) -> bool:
+        self.scrubbed.append(container)
+        return True
+
+
+class TestContainerPool(unittest.TestCase):
+    def test_warm_up_and_reuse(self):
+        """测试预热后租用的容器在归还时被清理并复用"""
+        backend = FakeBackend()
+        pool = ContainerPool(backend, SupportedLanguage.PYTHON, min_size=2, max_size=2)
+        pool._refill()
+        self.assertEqual(pool.idle_count, 2)
+
+        container = pool.acquire()
+        pool.release(container)
+        self.assertIn(container, backend.scrubbed)
+        self.assertEqual(backend.created, 2)
+        self.assertEqual(pool.idle_count, 2)
+        pool.close()
+        self.assertTrue(container.removed)
+
+    def test_unhealthy_container_discarded(self):
+        """测试健康检查失败的容器被丢弃"""
+        backend = FakeBackend()
+        pool = ContainerPool(backend, min_size=1, max_size=2)
+        pool._refill()
+        broken = pool._idle[0]
+        broken.healthy = False
+
+        container = pool.acquire()
+        self.assertIsNot(container, broken)
+        self.assertTrue(broken.removed)
+        pool.release(container)
+        pool.close()
+
+    def test_acquire_timeout_when_exhausted(self):
+        """测试达到上限后租用超时"""
+        pool = ContainerPool(FakeBackend(), min_size=0, max_size=1)
+        pool.acquire()
+        with self.assertRaises(BackendError):
+            pool.acquire(timeout=0.05)
+        pool.close()
+
+
+class FakeK8sBackend(Backend):
+    def __init__(self, pods, taken):
+        self.pods = pods
+        self.taken = taken
+        self.deleted = []
+
+    def list_pool_pods(self, lang, state=None):
+        return list(self.pods)
+
+    @staticmethod
+    def _is_pod_ready(pod):
+        return True
+
+    def claim_pod(self, pod, session_id):
+        # 模拟其他工作进程抢先认领导致的 409 冲突
+        if pod.metadata.name in self.taken:
+            return None
+        return pod
+
+    def delete_pod(self, pod):
+        self.deleted.append(pod)
+
+
+class TestK8sPodPool(unittest.TestCase):
+    def test_claim_skips_conflicting_pod(self):
+        """测试认领冲突时换下一个空闲 Pod"""
+        pods = [SimpleNamespace(metadata=SimpleNamespace(name=n)) for n in ("a", "b")]
+        pool = K8sPodPool(FakeK8sBackend(pods, taken={"a"}), recycle=False)
+        pod = pool.acquire()
+        self.assertEqual(pod.metadata.name, "b")
+        pool.release(pod)
+        self.assertIn(pod, pool.backend.deleted)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import threading
+import time
+import unittest
+from sandbox.backend.base import Backend
+from sandbox.reaper import Reaper
+from sandbox.session import SandboxSession
+
+
+class FlakyBackend(Backend):
+    def __init__(self, failures=0, release=None):
+        self.failures = failures
+        self.release = release
+        self.removed = []
+
+    def teardown(self, container):
+        if self.release is not None:
+            self.release.wait()
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("daemon busy")
+        self.removed.append(container)
+
+
+class TestReaper(unittest.TestCase):
+    def test_retry_until_removed(self):
+        """测试删除失败后重试"""
+        reaper = Reaper(retries=2, retry_delay=0.01)
+        backend = FlakyBackend(failures=2)
+        self.assertTrue(reaper.submit(backend, "c1").result(5))
+        self.assertEqual((backend.removed, reaper.reaped, reaper.failed), (["c1"], 1, 0))
+        reaper.shutdown()
+
+    def test_session_exit_does_not_wait(self):
+        """测试会话退出时把容器交给 Reaper 后立即返回"""
+        release = threading.Event()
+        backend = FlakyBackend(release=release)
+        reaper = Reaper()
+        session = SandboxSession(reaper=reaper)
+        session.backend, session.container = backend, "c1"
+        start = time.monotonic()
+        session.__exit__(None, None, None)
+        self.assertLess(time.monotonic() - start, 0.5)
+        self.assertEqual(reaper.pending, 1)
+        release.set()
+        self.assertTrue(reaper.drain(5))
+        self.assertEqual(backend.removed, ["c1"])
+        reaper.shutdown()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import tempfile
+import unittest
+from sandbox.const import SupportedLanguage
+from sandbox.data import CommandResult, ExecutionResult, OutputCapture, PlotOutput, FileType
+from sandbox.result_cache import ResultCache
+from sandbox.session import SandboxSession
+
+
+class CountingBackend:
+    def __init__(self):
+        self.runs = 0
+
+    def image_digest(self, container):
+        return "sha256:abc"
+
+    def run_code(self, container, req):
+        self.runs += 1
+        return CommandResult(stdout=f"run {self.runs}")
+
+
+class TestResultCache(unittest.TestCase):
+    def test_key_covers_inputs(self):
+        """测试依赖顺序不影响键，代码或输入文件变化时键不同"""
+        key = ResultCache.make_key(SupportedLanguage.PYTHON, "d", "print(1)", ["b", "a"], {"x.txt": "1"})
+        self.assertEqual(key, ResultCache.make_key(SupportedLanguage.PYTHON, "d", "print(1)", ["a", "b"], {"x.txt": b"1"}))
+        self.assertNotEqual(key, ResultCache.make_key(SupportedLanguage.PYTHON, "d", "print(1)", ["a", "b"], {"x.txt": "2"}))
+        self.assertNotEqual(key, ResultCache.make_key(SupportedLanguage.PYTHON, "e", "print(1)", ["a", "b"], {"x.txt": "1"}))
+
+    def test_memory_lru_and_disk_tier(self):
+        """测试内存层 LRU 淘汰后仍可从磁盘层命中"""
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = ResultCache(max_entries=1, cache_dir=cache_dir)
+            plot = PlotOutput(format=FileType.PNG, img_base64="aGk=")
+            cache.put("a", ExecutionResult(stdout="a", plots=[plot]))
+            cache.put("b", CommandResult(stdout="b"))
+            self.assertEqual(cache.stats()["entries"], 1)
+            self.assertEqual(cache.get("a"), ExecutionResult(stdout="a", plots=[plot]))
+            self.assertIsNone(cache.get("c"))
+            self.assertEqual(cache.stats(), {"hits": 1, "misses": 1, "disk_hits": 1, "entries": 1})
+            # 新实例直接读取磁盘层
+            self.assertEqual(ResultCache(cache_dir=cache_dir).get("b"), CommandResult(stdout="b"))
+
+    def test_session_bypass_and_deterministic_only(self):
+        """测试会话命中缓存时不再执行，bypass 与 deterministic_only 生效"""
+        backend = CountingBackend()
+        session = SandboxSession(result_cache=ResultCache(deterministic_only=True))
+        session.backend, session.container = backend, object()
+        session.run_code("print(1)")
+        session.run_code("print(1)")
+        self.assertEqual(backend.runs, 2)
+        self.assertEqual(session.run_code("print(1)", deterministic=True).stdout, "run 3")
+        self.assertEqual(session.run_code("print(1)", deterministic=True).stdout, "run 3")
+        self.assertEqual(session.run_code("print(1)", cache=False).stdout, "run 4")
+
+    def test_request_options_in_key(self):
+        """测试编译参数、超时与输出限制不同的请求不共享缓存"""
+        backend = CountingBackend()
+        session = SandboxSession(result_cache=ResultCache())
+        session.backend, session.container = backend, object()
+        self.assertEqual(session.run_code("main", compile_flags=["-DA"]).stdout, "run 1")
+        self.assertEqual(session.run_code("main", compile_flags=["-DB"], max_output_bytes=3).stdout, "run 2")
+        self.assertEqual(session.run_code("main", compile_flags=["-DB"], max_output_bytes=3).stdout, "run 2")
+        self.assertEqual(session.run_code("main", compile_flags=["-DA"], timeout=1).stdout, "run 3")
+        self.assertEqual(session.run_code("main", compile_flags=["-DA"], capture=OutputCapture(tail_bytes=1)).stdout,
+                         "run 4")
+        self.assertEqual(session.run_code("main", compile_flags=["-DA"]).stdout, "run 1")
+
+
+if __name__ == '__main__':
+    unittest.main()
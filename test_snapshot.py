@@ -0,0 +1,154 @@
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+import docker
+from sandbox.backend.docker import DockerBackend
+from sandbox.const import SupportedLanguage
+from sandbox.snapshot import DEPS_LABEL, SnapshotStore
+
+
+class FakeResult:
+    def __init__(self, exit_code=0, output=b""):
+        self.exit_code = exit_code
+        self.output = output
+
+
+class FakeImage:
+    def __init__(self, id, labels=None):
+        self.id = id
+        self.attrs = {"Size": 100, "Config": {"Labels": labels or {}}}
+        self.tags = []
+        self.pushed = threading.Event()
+
+    def tag(self, reference):
+        self.tags.append(reference)
+
+
+class FakeContainer:
+    def __init__(self, client, image, labels=None):
+        self.client = client
+        self.id = f"c{len(client.containers.created)}"
+        self.image = image
+        self.labels = labels or {}
+        self.commands = []
+        self.removed = False
+
+    def start(self):
+        pass
+
+    def exec_run(self, cmd, **kwargs):
+        self.commands.append(cmd)
+        return FakeResult()
+
+    def commit(self, repository, tag, conf):
+        image = FakeImage(f"sha256:{tag}", conf["Labels"])
+        self.client.images.store[f"{repository}:{tag}"] = image
+        self.client.committed.append(self)
+        return image
+
+    def remove(self, force=False):
+        self.removed = True
+
+
+class FakeContainers:
+    def __init__(self, client):
+        self.client = client
+        self.created = []
+
+    def create(self, image, command=None, **kwargs):
+        container = FakeContainer(self.client, image, kwargs.get("labels"))
+        self.created.append(container)
+        return container
+
+
+class FakeImages:
+    def __init__(self, client):
+        self.client = client
+        self.store = {"python:3.11-slim": FakeImage("sha256:base")}
+        self.push_started = threading.Event()
+        self.release_push = threading.Event()
+
+    def get(self, reference):
+        if reference not in self.store:
+            raise docker.errors.ImageNotFound(reference)
+        return self.store[reference]
+
+    def push(self, repository, tag):
+        self.push_started.set()
+        self.release_push.wait(5)
+
+    def list(self, filters=None):
+        return []
+
+
+class FakeClient:
+    def __init__(self):
+        self.containers = FakeContainers(self)
+        self.images = FakeImages(self)
+        self.committed = []
+
+
+class TestSnapshot(unittest.TestCase):
+    def test_build_in_scratch_container(self):
+        """测试快照在基础镜像的临时容器中只执行安装，推送在后台进行"""
+        client = FakeClient()
+        with tempfile.TemporaryDirectory() as tmp:
+            store = SnapshotStore(client, registry="registry.local", index_path=Path(tmp) / "index.json")
+            ref = store.build("python:3.11-slim", SupportedLanguage.PYTHON, ["numpy"], ["pip", "install", "numpy"])
+            # build 返回时推送仍在进行
+            self.assertTrue(client.images.push_started.wait(5))
+            self.assertFalse(store._index[ref.split(":", 1)[1]]["pushed"])
+            client.images.release_push.set()
+            tag = ref.split(":", 1)[1]
+            deadline = time.monotonic() + 5
+            while not store._index[tag]["pushed"] and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.assertTrue(store._index[tag]["pushed"])
+            (scratch,) = client.containers.created
+            self.assertEqual(scratch.image, "python:3.11-slim")
+            self.assertEqual(scratch.commands, [["pip", "install", "numpy"]])
+            self.assertTrue(scratch.removed)
+            self.assertEqual(client.images.get(ref).attrs["Config"]["Labels"][DEPS_LABEL], "numpy")
+            self.assertEqual(store.lookup("python:3.11-slim", SupportedLanguage.PYTHON, ["numpy"]), ref)
+            # 已存在的快照不重复构建
+            self.assertEqual(store.build("python:3.11-slim", SupportedLanguage.PYTHON, ["numpy"], ["true"]), ref)
+            self.assertEqual(len(client.containers.created), 1)
+
+    def test_session_container_never_committed(self):
+        """测试会话容器安装依赖后不被提交，快照包含启动时快照中的依赖且基于基础镜像"""
+        client = FakeClient()
+        with tempfile.TemporaryDirectory() as tmp:
+            store = SnapshotStore(client, index_path=Path(tmp) / "index.json")
+            backend = DockerBackend(client, snapshot_store=store, accounting=False)
+            backend._image_manifest = lambda container, language: {}
+            built = []
+            store.build_async = lambda *args: built.append(args)
+            session_container = client.containers.create("python:3.11-slim")
+            backend._snapshot_deps[session_container.id] = {"numpy"}
+            backend.install_dependencies(session_container, SupportedLanguage.PYTHON, ["pandas"])
+            self.assertEqual(client.committed, [])
+            (image, language, deps, command), = built
+            self.assertEqual((image, deps), (backend.lang_to_image[SupportedLanguage.PYTHON], ["numpy", "pandas"]))
+            self.assertEqual(command[-2:], ["numpy", "pandas"])
+
+    def test_key_includes_image_packages(self):
+        """测试快照以完整的请求集合为键：请求中含镜像已有的包时，按相同请求查找仍能命中"""
+        client = FakeClient()
+        with tempfile.TemporaryDirectory() as tmp:
+            store = SnapshotStore(client, index_path=Path(tmp) / "index.json")
+            backend = DockerBackend(client, snapshot_store=store, accounting=False)
+            backend._image_manifest = lambda container, language: {"numpy": "1.26.0"}
+            store.build_async = lambda *args: store.build(*args)
+            image = backend.lang_to_image[SupportedLanguage.PYTHON]
+            client.images.store[image] = FakeImage("sha256:base")
+            session_container = client.containers.create(image)
+            backend.install_dependencies(session_container, SupportedLanguage.PYTHON, ["numpy", "Pandas"])
+            self.assertEqual(session_container.commands[-1][-1:], ["Pandas"])
+            self.assertIsNotNone(store.lookup(image, SupportedLanguage.PYTHON, ["pandas", "numpy"]))
+            self.assertIsNone(store.lookup(image, SupportedLanguage.PYTHON, ["pandas"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+from sandbox.backend.docker import DockerBackend
+from sandbox.backend.k8s import K8sBackend
+from sandbox.data import CommandResult, StreamType
+
+
+class FakeDockerAPI:
+    """exec_start 按顺序产出 (stdout, stderr) 数据块，与 demux=True 的格式一致"""
+
+    def __init__(self, chunks, exit_code):
+        self.chunks = chunks
+        self.exit_code = exit_code
+
+    def exec_create(self, container_id, cmd, **kwargs):
+        return {"Id": "e1"}
+
+    def exec_start(self, exec_id, stream, demux):
+        yield from self.chunks
+
+    def exec_inspect(self, exec_id):
+        return {"ExitCode": self.exit_code}
+
+
+class FakeWSClient:
+    """每次 update 后返回一帧 (stdout, stderr)，帧用完后连接关闭"""
+
+    def __init__(self, frames, returncode):
+        self.frames = list(frames)
+        self.frame = (None, None)
+        self.returncode = returncode
+        self.closed = False
+
+    def update(self, timeout):
+        self.frame = self.frames.pop(0) if self.frames else (None, None)
+
+    def read_stdout(self, timeout):
+        return self.frame[0]
+
+    def read_stderr(self, timeout):
+        return self.frame[1]
+
+    def is_open(self):
+        return bool(self.frames)
+
+    def close(self):
+        self.closed = True
+
+
+def events_of(stream):
+    return [(event.stream, event.data, event.exit_code) for event in stream]
+
+
+# "你" 的 utf-8 编码为 e4 bd a0，拆在两个数据块中
+CHUNKS = [(b"a\xe4\xbd", None), (None, b"err"), (b"\xa0b", None)]
+EXPECTED = [
+    (StreamType.STDOUT, "a", None),
+    (StreamType.STDERR, "err", None),
+    (StreamType.STDOUT, "你b", None),
+    (StreamType.EXIT, "", 3),
+]
+
+
+class TestDockerStream(unittest.TestCase):
+    def stream(self, chunks, exit_code):
+        backend = DockerBackend(SimpleNamespace(api=FakeDockerAPI(chunks, exit_code)))
+        return events_of(backend.exec_stream(SimpleNamespace(id="c1"), ["python", "main.py"]))
+
+    def test_order_and_exit(self):
+        """测试按到达顺序分别产出 stdout/stderr，跨块的多字节字符完整，最后是携带退出码的 EXIT 事件"""
+        self.assertEqual(self.stream(CHUNKS, 3), EXPECTED)
+
+    def test_incomplete_tail_before_exit(self):
+        """测试结尾不完整的多字节字符在 EXIT 之前以替换字符产出"""
+        events = self.stream([(b"ok\xe4", None)], 0)
+        self.assertEqual(events, [
+            (StreamType.STDOUT, "ok", None),
+            (StreamType.STDOUT, "\ufffd", None),
+            (StreamType.EXIT, "", 0),
+        ])
+
+    def test_collect(self):
+        """测试流式事件汇总为 CommandResult"""
+        backend = DockerBackend(SimpleNamespace(api=FakeDockerAPI(CHUNKS, 3)))
+        result = CommandResult.from_stream(backend.exec_stream(SimpleNamespace(id="c1"), ["true"]))
+        self.assertEqual((result.exit_code, result.stdout, result.stderr), (3, "a你b", "err"))
+
+
+class TestK8sStream(unittest.TestCase):
+    def test_order_and_exit(self):
+        """测试 websocket 各 channel 的输出按到达顺序产出，连接关闭后产出 EXIT 事件并关闭连接"""
+        with mock.patch("sandbox.backend.k8s.config.load_kube_config"):
+            backend = K8sBackend()
+        resp = FakeWSClient(CHUNKS, 3)
+        pod = SimpleNamespace(metadata=SimpleNamespace(name="p1"))
+        with mock.patch("kubernetes.stream.stream", return_value=resp) as stream:
+            events = events_of(backend.exec_stream(pod, "echo hi"))
+        self.assertEqual(events, EXPECTED)
+        self.assertTrue(resp.closed)
+        self.assertEqual(stream.call_args.kwargs["command"], ["/bin/sh", "-c", "echo hi"])
+        self.assertTrue(stream.call_args.kwargs["binary"])
+
+
+if __name__ == "__main__":
+    unittest.main()
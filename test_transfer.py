@@ -0,0 +1,50 @@
+import io
+import subprocess
+import tarfile
+import tempfile
+import unittest
+from pathlib import Path
+from sandbox.errors import ArtifactTooLargeError
+from sandbox.transfer import ArchiveDecoder, build_tar, collect_command, iter_tar_files
+
+
+class TestTransfer(unittest.TestCase):
+    def test_build_tar(self):
+        """测试多个文件打包为一个 tar，相对路径放到 /sandbox 下"""
+        big = b"x" * (3 * 1024 * 1024)
+        data = build_tar({"/sandbox/code.py": "print('hi')", "data/input.bin": big})
+        with tarfile.open(fileobj=io.BytesIO(data), mode="r:") as tar:
+            names = tar.getnames()
+            self.assertEqual(names, ["sandbox/code.py", "sandbox/data/input.bin"])
+            self.assertEqual(tar.extractfile("sandbox/data/input.bin").read(), big)
+
+
+    def collect(self, patterns, compression=None, max_bytes=None, chunk=7):
+        """在本机执行 collect_command，按小块喂给 ArchiveDecoder"""
+        out = subprocess.run(collect_command(patterns, compression), capture_output=True, check=True).stdout
+        decoder = ArchiveDecoder(max_bytes)
+        archive = b"".join(decoder.decode(out[offset:offset + chunk] for offset in range(0, len(out), chunk)))
+        return out, dict(iter_tar_files(archive))
+
+    def test_collect_glob(self):
+        """测试通配符、目录与不存在的路径在一次请求中打包取回"""
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            (root / "sub").mkdir()
+            (root / "a.png").write_bytes(b"a")
+            (root / "b.png").write_bytes(b"b")
+            (root / "sub" / "c d.txt").write_text("c" * 10000)
+            prefix = tmp.lstrip("/")
+            for compression in (None, "gzip"):
+                out, files = self.collect([f"{tmp}/*.png", f"{tmp}/sub", f"{tmp}/missing*"], compression)
+                self.assertEqual(files, {f"{prefix}/a.png": b"a", f"{prefix}/b.png": b"b",
+                                         f"{prefix}/sub/c d.txt": b"c" * 10000})
+                if compression == "gzip":
+                    self.assertTrue(out.startswith(b"\x1f\x8b"))
+            self.assertEqual(self.collect([f"{tmp}/missing*"])[1], {})
+            with self.assertRaises(ArtifactTooLargeError):
+                self.collect([f"{tmp}/sub"], "gzip", max_bytes=4096)
+
+
+if __name__ == '__main__':
+    unittest.main()
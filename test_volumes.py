@@ -0,0 +1,90 @@
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+from sandbox.backend.docker import DockerBackend
+from sandbox.backend.k8s import K8sBackend
+from sandbox.const import SupportedLanguage
+from sandbox.volumes import CCACHE_VOLUME, cache_volumes_for
+
+
+class FakeContainers:
+    def __init__(self):
+        self.created = []
+
+    def create(self, **kwargs):
+        self.created.append(kwargs)
+        return SimpleNamespace(id="c1")
+
+
+class FakeCoreApi:
+    def __init__(self):
+        self.pods = []
+
+    def create_namespaced_pod(self, namespace, body):
+        self.pods.append(body)
+        return body
+
+
+def make_k8s_backend(cache_volumes=True, **kwargs):
+    with mock.patch("sandbox.backend.k8s.config.load_kube_config"):
+        backend = K8sBackend(cache_volumes=cache_volumes, **kwargs)
+    backend.core_v1_api = FakeCoreApi()
+    return backend
+
+
+class TestCacheVolumes(unittest.TestCase):
+    def test_language_volumes(self):
+        """测试语言对应的缓存卷，ccache 只对 C++ 生效"""
+        self.assertEqual([v.env for v in cache_volumes_for(SupportedLanguage.PYTHON)],
+                         [{"PIP_CACHE_DIR": "/cache/pip"}])
+        self.assertEqual(cache_volumes_for(SupportedLanguage.CPP), [])
+        self.assertEqual(cache_volumes_for(SupportedLanguage.CPP, ccache=True), [CCACHE_VOLUME])
+        self.assertEqual(cache_volumes_for(SupportedLanguage.PYTHON, ccache=True),
+                         cache_volumes_for(SupportedLanguage.PYTHON))
+
+    def test_docker_named_volumes(self):
+        """测试 Docker 以命名卷挂载缓存，调用方传入的卷与环境变量优先"""
+        client = SimpleNamespace(containers=FakeContainers())
+        backend = DockerBackend(client, cache_volumes=True)
+        backend.create_container("go", environment=["GOCACHE=/mine", "A=1"],
+                                 volumes={"data": {"bind": "/data", "mode": "ro"}})
+        kwargs = client.containers.created[0]
+        self.assertEqual(kwargs["volumes"], {
+            "data": {"bind": "/data", "mode": "ro"},
+            "sandbox-cache-gomod": {"bind": "/cache/go/mod", "mode": "rw"},
+            "sandbox-cache-gobuild": {"bind": "/cache/go/build", "mode": "rw"},
+        })
+        self.assertEqual(kwargs["environment"], {"GOCACHE": "/mine", "A": "1", "GOMODCACHE": "/cache/go/mod"})
+
+    def test_docker_disabled(self):
+        """测试未开启缓存卷时不传 volumes / environment"""
+        client = SimpleNamespace(containers=FakeContainers())
+        DockerBackend(client).create_container("python")
+        self.assertNotIn("volumes", client.containers.created[0])
+        self.assertNotIn("environment", client.containers.created[0])
+
+    def test_k8s_pvc(self):
+        """测试 K8s 默认挂载与卷同名的 PVC，预热池 Pod 同样挂载"""
+        backend = make_k8s_backend()
+        pod = backend.create_pool_pod("python")
+        volume = pod.spec.volumes[0]
+        self.assertEqual((volume.name, volume.persistent_volume_claim.claim_name, volume.host_path),
+                         ("sandbox-cache-pip", "sandbox-cache-pip", None))
+        container = pod.spec.containers[0]
+        self.assertEqual([(m.name, m.mount_path) for m in container.volume_mounts],
+                         [("sandbox-cache-pip", "/cache/pip")])
+        self.assertEqual([(e.name, e.value) for e in container.env], [("PIP_CACHE_DIR", "/cache/pip")])
+
+    def test_k8s_host_path(self):
+        """测试设置 cache_host_root 时使用节点目录，C++ 开启 ccache 时挂载 ccache 目录"""
+        backend = make_k8s_backend(cache_host_root="/var/cache/sandbox/", ccache=True)
+        volumes, mounts, env = backend._cache_volume_specs("cpp")
+        self.assertEqual([(v.host_path.path, v.host_path.type, v.persistent_volume_claim) for v in volumes],
+                         [("/var/cache/sandbox/sandbox-cache-ccache", "DirectoryOrCreate", None)])
+        self.assertEqual([m.mount_path for m in mounts], ["/cache/ccache"])
+        self.assertEqual([(e.name, e.value) for e in env], [("CCACHE_DIR", "/cache/ccache")])
+        self.assertEqual(make_k8s_backend(cache_volumes=False)._cache_volume_specs("python"), ([], [], []))
+
+
+if __name__ == "__main__":
+    unittest.main()
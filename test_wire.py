@@ -0,0 +1,57 @@
+import base64
+import json
+import tempfile
+import unittest
+from sandbox.artifacts import ArtifactStore
+from sandbox.data import CommandResult, ExecutionResult, FileType, PlotOutput, ResourceUsage, RunStatus
+from sandbox.wire import dumps, from_wire, loads, msgpack, to_wire
+
+
+class TestWire(unittest.TestCase):
+    def test_compact_json_roundtrip(self):
+        """测试紧凑 JSON 无多余空白，且能还原为原结果"""
+        result = CommandResult(exit_code=1, stdout="输出", status=RunStatus.TIMED_OUT,
+                               usage=ResourceUsage(wall_time=1.5, cpu_user=0.2, cpu_system=0.1))
+        payload = dumps(result)
+        self.assertNotIn(b" ", payload)
+        self.assertIn("输出".encode("utf-8"), payload)
+        self.assertEqual(loads(payload), result)
+        self.assertNotIn("\n", ExecutionResult(stdout="a").to_json())
+
+    def test_large_fields_by_handle(self):
+        """测试超过内联大小的输出与图片以句柄返回，按需从仓库读取"""
+        image = b"\x89PNG" + bytes(range(256)) * 8
+        small = PlotOutput(format=FileType.PNG, img_base64=base64.b64encode(b"tiny").decode(), width=1, height=1)
+        large = PlotOutput(format=FileType.PNG, img_base64=base64.b64encode(image).decode(), width=10, height=10)
+        result = ExecutionResult(stdout="x" * 5000, stderr="warn", plots=[small, large])
+        with tempfile.TemporaryDirectory() as root:
+            store = ArtifactStore(root)
+            data = to_wire(result, store=store, namespace="s1", inline_bytes=1024)
+            self.assertEqual((data["stdout"], data["stderr"]), ("", "warn"))
+            self.assertEqual(data["refs"]["stdout"]["size"], 5000)
+            self.assertEqual(data["plots"][0]["img_base64"], small.img_base64)
+            handle = data["plots"][1]["artifact"]
+            self.assertEqual(set(handle), {"name", "size", "digest"})
+            with store.open(handle["digest"]) as f:
+                self.assertEqual(f.read(), image)
+            # 不带仓库时引用的字段为空，带仓库时按需读取
+            self.assertEqual(from_wire(json.loads(json.dumps(data))).stdout, "")
+            restored = from_wire(data, store)
+            self.assertEqual(restored.stdout, result.stdout)
+            self.assertEqual(restored.plots[1].read(), image)
+            self.assertEqual(restored.plots[0].read(), b"tiny")
+            with self.assertRaises(ValueError):
+                store.open("../secret")
+
+    @unittest.skipIf(msgpack is None, "msgpack is not installed")
+    def test_msgpack(self):
+        """测试 msgpack 中内联图片为原始字节"""
+        plot = PlotOutput(format=FileType.SVG, img_base64=base64.b64encode(b"<svg/>").decode())
+        result = ExecutionResult(stdout="ok", plots=[plot])
+        payload = dumps(result, format="msgpack")
+        self.assertEqual(msgpack.unpackb(payload)["plots"][0]["img"], b"<svg/>")
+        self.assertEqual(loads(payload, format="msgpack"), result)
+
+
+if __name__ == "__main__":
+    unittest.main()